@@ -0,0 +1,318 @@
+# agendador.py
+# Tarefas periódicas rodando dentro do próprio app (sem cron no servidor)
+#
+# - Cada módulo registra a sua com @tarefa("nome", diaria="00:05") ou @tarefa("nome", intervalo_s=600).
+# - Uma thread daemon por worker acorda a cada AGENDADOR_TICK_S. Só o LÍDER executa:
+#   a liderança é uma linha em agendador_lider (dono + expira_em) que o líder renova a
+#   cada volta; se ele morrer, outro worker assume quando o prazo (AGENDADOR_LEASE_S) vence.
+# - Para cada tarefa vencida o líder ainda RESERVA a execução com um UPDATE condicional em
+#   agendador_tarefas (WHERE proxima_em <= agora): numa troca de líder no meio de uma
+#   tarefa longa, a mesma execução não roda duas vezes.
+# - Tarefa nova (ou servidor que ficou desligado no horário) roda na primeira volta.
+# - agendador_tarefas guarda início, duração e erro da última execução, e os totais
+#   de execuções/falhas: GET /agendador/status (moderador) ou a CLI.
+# - RFA_AGENDADOR=0 desliga a thread (scripts, testes).
+#       flask --app app agendador status              (líder e tempos de cada tarefa)
+#       flask --app app agendador executar <nome>     (roda agora, fora do horário)
+
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, jsonify, session
+
+import banco
+from migracoes import migracao
+
+AGENDADOR_ATIVO = os.environ.get("RFA_AGENDADOR", "1") != "0"
+AGENDADOR_TICK_S = int(os.environ.get("RFA_AGENDADOR_TICK_S", "30"))
+# sem renovação por esse tempo, a liderança fica livre para outro worker
+AGENDADOR_LEASE_S = int(os.environ.get("RFA_AGENDADOR_LEASE_S", str(AGENDADOR_TICK_S * 3)))
+
+FMT = "%Y-%m-%d %H:%M:%S"
+
+# nome -> (fn(conn), diaria "HH:MM" ou None, intervalo_s ou None)
+TAREFAS = {}
+
+bp_agendador = Blueprint("agendador", __name__)
+
+_app = None
+_thread = None
+_thread_pid = None
+_lock = threading.Lock()
+
+
+def tarefa(nome: str, diaria: str = None, intervalo_s: int = None):
+    """Decorator: registra fn(conn) para rodar todo dia em `diaria` ("HH:MM") ou a cada `intervalo_s`."""
+    if (diaria is None) == (intervalo_s is None):
+        raise ValueError(f"Tarefa {nome}: informe diaria OU intervalo_s")
+
+    def decorator(fn):
+        TAREFAS[nome] = (fn, diaria, intervalo_s)
+        return fn
+    return decorator
+
+
+@migracao(9, "Tabela agendador_tarefas (tarefas periódicas entre workers)")
+def _migracao_agendador(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS agendador_tarefas (
+            tarefa TEXT PRIMARY KEY,
+            proxima_em TEXT NOT NULL,
+            ultima_em TEXT,
+            duracao_ms INTEGER,
+            erro TEXT
+        )
+    """)
+    conn.commit()
+
+
+@migracao(13, "Liderança do agendador (lease entre workers) e totais por tarefa")
+def _migracao_agendador_lider(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS agendador_lider (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            dono TEXT NOT NULL,
+            desde TEXT NOT NULL,
+            expira_em TEXT NOT NULL
+        )
+    """)
+    colunas = {r[1] for r in conn.execute("PRAGMA table_info(agendador_tarefas)").fetchall()}
+    for coluna, definicao in (
+        ("execucoes", "INTEGER NOT NULL DEFAULT 0"),
+        ("falhas", "INTEGER NOT NULL DEFAULT 0"),
+        ("ultimo_ok_em", "TEXT"),
+    ):
+        if coluna not in colunas:
+            conn.execute(f"ALTER TABLE agendador_tarefas ADD COLUMN {coluna} {definicao}")
+    conn.commit()
+
+
+def _proxima(nome: str, agora: datetime) -> datetime:
+    _fn, diaria, intervalo_s = TAREFAS[nome]
+    if intervalo_s:
+        return agora + timedelta(seconds=intervalo_s)
+    hora, minuto = (int(x) for x in diaria.split(":"))
+    alvo = agora.replace(hour=hora, minute=minuto, second=0, microsecond=0)
+    return alvo if alvo > agora else alvo + timedelta(days=1)
+
+
+def _dono() -> str:
+    # pid muda no fork do gunicorn: cada worker tem a sua identidade
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _liderar(conn, agora: datetime) -> bool:
+    """Assume ou renova a liderança. True se este worker é o líder até agora + LEASE."""
+    agora_s = agora.strftime(FMT)
+    cur = conn.execute(
+        """
+        INSERT INTO agendador_lider (id, dono, desde, expira_em) VALUES (1, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            dono = excluded.dono,
+            desde = CASE WHEN dono = excluded.dono THEN desde ELSE excluded.desde END,
+            expira_em = excluded.expira_em
+        WHERE dono = excluded.dono OR expira_em <= ?
+        """,
+        (_dono(), agora_s, (agora + timedelta(seconds=AGENDADOR_LEASE_S)).strftime(FMT), agora_s),
+    )
+    conn.commit()
+    return cur.rowcount == 1
+
+
+def _reservar(conn, nome: str, agora: datetime) -> bool:
+    """Adianta proxima_em se a tarefa venceu. True só para o worker que conseguiu."""
+    agora_s = agora.strftime(FMT)
+    conn.execute(
+        "INSERT OR IGNORE INTO agendador_tarefas (tarefa, proxima_em) VALUES (?, ?)",
+        (nome, agora_s),
+    )
+    cur = conn.execute(
+        "UPDATE agendador_tarefas SET proxima_em = ?, ultima_em = ? WHERE tarefa = ? AND proxima_em <= ?",
+        (_proxima(nome, agora).strftime(FMT), agora_s, nome, agora_s),
+    )
+    conn.commit()
+    return cur.rowcount == 1
+
+
+def _rodar(conn, nome: str):
+    fn = TAREFAS[nome][0]
+    inicio = time.perf_counter()
+    erro = None
+    try:
+        fn(conn)
+    except Exception as e:
+        traceback.print_exc()
+        if conn.in_transaction:
+            conn.rollback()
+        erro = str(e) or e.__class__.__name__
+    duracao_ms = int((time.perf_counter() - inicio) * 1000)
+    conn.execute(
+        """
+        UPDATE agendador_tarefas
+        SET duracao_ms = ?, erro = ?,
+            execucoes = execucoes + 1,
+            falhas = falhas + (? IS NOT NULL),
+            ultimo_ok_em = CASE WHEN ? IS NULL THEN ? ELSE ultimo_ok_em END
+        WHERE tarefa = ?
+        """,
+        (duracao_ms, erro, erro, erro, datetime.now().strftime(FMT), nome),
+    )
+    conn.commit()
+    print(f"[AGENDADOR] {nome}: {'erro' if erro else 'ok'} em {duracao_ms} ms")
+
+
+def executar_pendentes() -> list:
+    """Uma volta do agendador: se este worker for o líder, roda as tarefas vencidas."""
+    executadas = []
+    with _app.app_context():
+        conn = banco.conectar_bd()
+        try:
+            if not _liderar(conn, datetime.now()):
+                return executadas
+            for nome in list(TAREFAS):
+                if _reservar(conn, nome, datetime.now()):
+                    _rodar(conn, nome)
+                    executadas.append(nome)
+                    # tarefa demorada: renova antes da próxima (ou para, se perdeu a vez)
+                    if not _liderar(conn, datetime.now()):
+                        break
+        finally:
+            conn.close()
+    return executadas
+
+
+def situacao(conn) -> dict:
+    """Líder atual e, por tarefa, agenda, próxima execução e tempos da última."""
+    lider = conn.execute("SELECT dono, desde, expira_em FROM agendador_lider WHERE id = 1").fetchone()
+    linhas = {
+        r["tarefa"]: dict(r)
+        for r in conn.execute(
+            "SELECT tarefa, proxima_em, ultima_em, duracao_ms, erro, execucoes, falhas, ultimo_ok_em "
+            "FROM agendador_tarefas"
+        ).fetchall()
+    }
+    tarefas = []
+    for nome in sorted(TAREFAS):
+        _fn, diaria, intervalo_s = TAREFAS[nome]
+        item = linhas.get(nome) or {"tarefa": nome}
+        item["agenda"] = f"diária {diaria}" if diaria else f"a cada {intervalo_s} s"
+        tarefas.append(item)
+    return {"lider": dict(lider) if lider else None, "tarefas": tarefas}
+
+
+def iniciar():
+    """Thread daemon (uma por worker); pode ser chamada várias vezes."""
+    global _thread, _thread_pid
+    if not AGENDADOR_ATIVO or _app is None:
+        return None
+    with _lock:
+        if _thread_pid == os.getpid() and _thread is not None and _thread.is_alive():
+            return _thread
+        _thread_pid = os.getpid()
+
+        def _loop():
+            while True:
+                try:
+                    executar_pendentes()
+                except Exception as e:
+                    print("[AGENDADOR] Falha na volta do agendador:", e)
+                time.sleep(AGENDADOR_TICK_S)
+
+        _thread = threading.Thread(target=_loop, name="agendador", daemon=True)
+        _thread.start()
+        return _thread
+
+
+# ----------------- TAREFAS DO PRÓPRIO BANCO -----------------
+
+def _checkpoint_wal(conn):
+    # PASSIVE: copia o -wal para o banco sem bloquear leitores/escritores
+    busy, paginas, copiadas = banco.checkpoint_wal("PASSIVE")
+    print(f"[AGENDADOR] Checkpoint do WAL: {copiadas}/{paginas} página(s){' (ocupado)' if busy else ''}")
+
+
+def _registrar_checkpoint():
+    # o intervalo vem do perfil de armazenamento (app.config / RFA_BD_CHECKPOINT_INTERVALO_S)
+    intervalo = banco.perfil["BD_CHECKPOINT_INTERVALO_S"]
+    if intervalo > 0 and banco.perfil["BD_JOURNAL_MODE"].upper() == "WAL":
+        tarefa("bd_checkpoint", intervalo_s=intervalo)(_checkpoint_wal)
+    else:
+        TAREFAS.pop("bd_checkpoint", None)
+
+
+# ----------------- ROTA / CLI -----------------
+
+@bp_agendador.route("/agendador/status")
+def status_agendador():
+    if "usuario" not in session or session.get("tipo") != "moderador":
+        return jsonify({"ok": False, "error": "Acesso não autorizado"}), 403
+    conn = banco.conectar_bd()
+    try:
+        return jsonify(situacao(conn))
+    finally:
+        conn.close()
+
+
+@click.group("agendador")
+def cli_agendador():
+    """Tarefas periódicas do app."""
+
+
+@cli_agendador.command("status")
+def cli_status():
+    """Líder atual e última execução de cada tarefa."""
+    conn = banco.conectar_bd()
+    try:
+        dados = situacao(conn)
+    finally:
+        conn.close()
+
+    lider = dados["lider"]
+    if lider:
+        click.echo(f"Líder: {lider['dono']} (desde {lider['desde']}, expira {lider['expira_em']})")
+    else:
+        click.echo("Líder: nenhum ainda")
+    for t in dados["tarefas"]:
+        ultima = t.get("ultima_em") or "nunca"
+        duracao = f"{t['duracao_ms']} ms" if t.get("duracao_ms") is not None else "-"
+        click.echo(
+            f"{t['tarefa']:<24} {t['agenda']:<18} última {ultima} ({duracao}), "
+            f"próxima {t.get('proxima_em') or '-'}, {t.get('execucoes') or 0} execução(ões), "
+            f"{t.get('falhas') or 0} falha(s)"
+        )
+        if t.get("erro"):
+            click.echo(f"{'':<24} erro: {t['erro']}")
+
+
+@cli_agendador.command("executar")
+@click.argument("nome")
+def cli_executar(nome):
+    """Roda a tarefa NOME agora (o horário agendado não muda)."""
+    if nome not in TAREFAS:
+        raise click.BadParameter(f"tarefas: {', '.join(sorted(TAREFAS))}", param_hint="NOME")
+    conn = banco.conectar_bd()
+    try:
+        conn.execute(
+            "INSERT OR IGNORE INTO agendador_tarefas (tarefa, proxima_em) VALUES (?, ?)",
+            (nome, datetime.now().strftime(FMT)),
+        )
+        _rodar(conn, nome)
+    finally:
+        conn.close()
+
+
+def init_app(app):
+    global _app
+    _app = app
+    _registrar_checkpoint()
+    app.register_blueprint(bp_agendador)
+    app.cli.add_command(cli_agendador)
+
+    @app.before_request
+    def _agendador_garantir_thread():
+        iniciar()
@@ -1,4 +1,6 @@
 from __future__ import annotations
+import csv
+import gzip
 import os
 from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response, send_file
 import sqlite3
@@ -10,11 +12,24 @@ from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 from reportlab.lib.utils import simpleSplit
 from io import BytesIO
-from datetime import datetime
+from datetime import datetime, timedelta
 from checklist import bp_checklist, ensure_checklist_tables
+import banco
+import migracoes
+import indices
+import painel_responsavel
+import fila_jobs
+import pdf_partes
+import recursos_pdf
+from banco import conectar_bd
+from migracoes import migracao
 
 # === Lista de Presença (DOCX/PDF) ===
+import tempfile
+import threading
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
 from docx import Document
 
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
@@ -24,13 +39,23 @@ from biblioteca import conectar_bd_biblioteca
 from reportlab.lib.pagesizes import A4, landscape
 from carometro import bp_carometro, init_carometro_db
 from conselho import bp_conselho, ensure_conselho_tables
-import re
 from soe import bp_soe, ensure_soe_table
 from termo import bp_termo, ensure_termo_tables, get_termo_ativo, registrar_aceite
 from rotina import bp_rotina, ensure_rotina_tables
+import agendador
+import importacao_alunos
+from importacao_alunos import bp_importacao
+from busca_alunos import bp_busca_alunos, SQL_ALUNOS_DA_TURMA
 
 app = Flask(__name__)
 app.secret_key = 'sua_chave_secreta'
+# Configuração opcional (ex.: BD_CACHE_SIZE = -32000): arquivo .py apontado por RFA_CONFIG.
+# Precisa vir ANTES de banco.init_app, que lê app.config["BD_..."] uma vez só.
+app.config.from_envvar("RFA_CONFIG", silent=True)
+
+# Funções auxiliares de banco
+# conectar_bd() vem de banco.py: uma conexão (do pool) por requisição
+banco.init_app(app)
 
 # Disciplinas disponíveis para o professor
 DISCIPLINAS = [
@@ -45,72 +70,20 @@ DISCIPLINAS = [
 ]
 
 
-# Funções auxiliares de banco
-
-def conectar_bd():
-    conn = sqlite3.connect('rfa.db', check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
 def extrair_nomes_alunos_do_pdf(file_storage):
-    file_storage.stream.seek(0)  # 🔧 garante leitura desde o início
-    nomes = []
-    vistos = set()
     """
     Extrai somente os NOMES do PDF de enturmação (modelo SEEDF/CRE).
     Ignora código, telefone e demais dados.
     Retorna lista na ordem em que aparece no PDF (sem repetidos).
+    Leitura página por página e cache por hash do arquivo: ver importacao_alunos.
     """
-    nomes = []
-    vistos = set()
-
-    # Tentativa 1: pdfplumber (recomendado)
-    try:
-        import pdfplumber
-        with pdfplumber.open(file_storage.stream) as pdf:
-            texto_total = ""
-            for page in pdf.pages:
-                texto_total += (page.extract_text() or "") + "\n"
-    except Exception:
-        # Tentativa 2: PyPDF2 (fallback)
-        try:
-            from PyPDF2 import PdfReader
-            reader = PdfReader(file_storage.stream)
-            texto_total = ""
-            for p in reader.pages:
-                texto_total += (p.extract_text() or "") + "\n"
-        except Exception as e:
-            raise RuntimeError(f"Não foi possível ler o PDF. Erro: {e}")
-
-    # Normaliza e percorre linha a linha
-    for raw in texto_total.splitlines():
-        linha = (raw or "").strip()
-        if not linha:
-            continue
-
-        # Padrão típico do PDF: "123456 NOME COMPLETO (61) 9..."
-        m = re.match(r"^\s*\d+\s+(.+?)\s*(?:\(|$)", linha)
-        if not m:
-            continue
-
-        candidato = m.group(1).strip()
-
-        # Filtra cabeçalhos do relatório caso apareçam como "nome"
-        # (no seu PDF vem "Código Nome do Estudante/Nome Social Telefone")
-        if "NOME DO ESTUDANTE" in candidato.upper():
-            continue
-
-        # Limpa múltiplos espaços
-        candidato = re.sub(r"\s{2,}", " ", candidato).strip()
-
-        # Evita duplicados (case-insensitive)
-        key = candidato.upper()
-        if key not in vistos:
-            vistos.add(key)
-            nomes.append(candidato)
+    file_storage.stream.seek(0)  # 🔧 garante leitura desde o início
+    dados = file_storage.stream.read()
 
-    return nomes
+    resultado = importacao_alunos.analisar_pdf_em_cache(file_storage.filename or "", dados)
+    if resultado["erro"]:
+        raise RuntimeError(resultado["erro"])
+    return resultado["nomes"]
 
 
 def inicializar_bd():
@@ -951,11 +924,20 @@ def obter_turmas_professor(professor_id):
 
 
 # Inicializar banco e ajustes
-inicializar_bd()
-atualizar_bd()
-ensure_soe_table()
-ensure_termo_tables(conectar_bd)
-ensure_checklist_tables()
+# As tabelas são criadas pelas migrações versionadas (migracoes.py); na subida do
+# worker só conferimos a versão do schema (ver garantir_atualizado no fim deste bloco).
+
+@migracao(1, "Esquema base (app + SOE, termos, checklist, carômetro, conselho, rotinas)")
+def _migracao_esquema_base(conn):
+    inicializar_bd()
+    atualizar_bd()
+    ensure_soe_table()
+    ensure_termo_tables(conectar_bd)
+    ensure_checklist_tables()
+    init_carometro_db()
+    ensure_conselho_tables()
+    ensure_rotina_tables()
+
 
 bp_termo.conectar_bd = conectar_bd
 bp_rotina.conectar_bd = conectar_bd
@@ -964,7 +946,6 @@ bp_checklist.conectar_bd = conectar_bd
 app.register_blueprint(bp_biblioteca, url_prefix='/biblioteca')
 
 # Carômetro (depende de professores/turmas/alunos existirem)
-init_carometro_db()
 app.register_blueprint(bp_carometro)
 app.register_blueprint(bp_soe)
 app.register_blueprint(bp_conselho)
@@ -975,17 +956,22 @@ app.register_blueprint(bp_checklist)
 
 app.register_blueprint(bp_rotina)
 
-try:
-    ensure_conselho_tables()
-except Exception as _e:
-    # Evita quebrar a inicializacao se o banco ainda nao estiver pronto
-    print('[CONSELHO] Falha ao garantir tabelas:', _e)
+# Importação de estudantes em lote (PDFs de enturmação)
+app.register_blueprint(bp_importacao)
 
-# Inicializar tabelas de rotinas
-try:
-    ensure_rotina_tables()
-except Exception as e:
-    print('[ROTINA] Falha ao garantir tabelas:', e)
+# Busca de estudantes pelo nome (/api/alunos/buscar)
+app.register_blueprint(bp_busca_alunos)
+
+# Fila de relatórios em segundo plano (/jobs/<id>)
+fila_jobs.init_app(app)
+# Tarefas periódicas (status da rotina, atrasos da biblioteca, logs, checkpoint do WAL...)
+agendador.init_app(app)
+recursos_pdf.carregar()
+
+# Schema: uma consulta de versão; migrações pendentes rodam uma vez, sob lock
+migracoes.init_app(app)
+indices.init_app(app)
+migracoes.garantir_atualizado(app)
 
 
 # Rotas principais
@@ -1211,28 +1197,8 @@ def soe_controle_acesso():
     return render_template('soe_controle_acesso.html', moderadores=moderadores)
 
 
-@app.route('/logs_acessos')
-def logs_acessos():
-    if 'usuario' not in session or session.get('tipo') != 'moderador':
-        flash("Acesso não autorizado.")
-        return redirect(url_for('login'))
-
-    # Filtros recebidos via query string
-    tipo = (request.args.get('tipo') or 'todos').lower()
-
-    # Tipos válidos (pode acrescentar outros se passar a registrar novos)
-    tipos_validos = ('todos', 'professor', 'responsavel', 'biblioteca')
-    if tipo not in tipos_validos:
-        tipo = 'todos'
-
-    login_filtro = (request.args.get('login') or '').strip()
-    data_de = (request.args.get('data_de') or '').strip()
-    data_ate = (request.args.get('data_ate') or '').strip()
-
-    conn = conectar_bd()
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
+def _sql_logs_acessos(tipo: str, login_filtro: str, data_de: str, data_ate: str):
+    """SELECT da tela de logs com os filtros -> (sql, params)."""
     # Começa sem filtro de tipo (para "todos")
     sql = '''
         SELECT id, tipo, login, data_hora
@@ -1250,16 +1216,49 @@ def logs_acessos():
         sql += " AND login LIKE ?"
         params.append(f"%{login_filtro}%")
 
+    # Faixa direto em data_hora (texto 'YYYY-MM-DD HH:MM:SS') para usar idx_logs_acessos_data
     if data_de:
-        sql += " AND date(data_hora) >= date(?)"
+        sql += " AND data_hora >= date(?)"
         params.append(data_de)
 
     if data_ate:
-        sql += " AND date(data_hora) <= date(?)"
+        sql += " AND data_hora < date(?, '+1 day')"
         params.append(data_ate)
 
     # Agora sem LIMIT, para realmente listar todos (se quiser, pode colocar LIMIT 1000)
-    sql += " ORDER BY datetime(data_hora) DESC"
+    sql += " ORDER BY data_hora DESC"
+    return sql, params
+
+
+indices.consulta_quente(
+    "logs de acesso por período", "logs_acessos", "logs_acessos",
+    lambda cur: cur.execute(*_sql_logs_acessos("todos", "", "2026-01-01", "2026-01-31")),
+)
+
+
+@app.route('/logs_acessos')
+def logs_acessos():
+    if 'usuario' not in session or session.get('tipo') != 'moderador':
+        flash("Acesso não autorizado.")
+        return redirect(url_for('login'))
+
+    # Filtros recebidos via query string
+    tipo = (request.args.get('tipo') or 'todos').lower()
+
+    # Tipos válidos (pode acrescentar outros se passar a registrar novos)
+    tipos_validos = ('todos', 'professor', 'responsavel', 'biblioteca')
+    if tipo not in tipos_validos:
+        tipo = 'todos'
+
+    login_filtro = (request.args.get('login') or '').strip()
+    data_de = (request.args.get('data_de') or '').strip()
+    data_ate = (request.args.get('data_ate') or '').strip()
+
+    conn = conectar_bd()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    sql, params = _sql_logs_acessos(tipo, login_filtro, data_de, data_ate)
 
     cursor.execute(sql, params)
     logs = cursor.fetchall()
@@ -1277,6 +1276,57 @@ def logs_acessos():
     )
 
 
+# ----------------- Arquivamento dos logs de acesso (agendador) -----------------
+# Opcional: só com RFA_LOGS_RETENCAO_DIAS definido (sem ela nada sai da tabela, e a página
+# de logs continua mostrando todo o histórico). Com ela, logs_acessos guarda só os últimos
+# LOGS_RETENCAO_DIAS: uma vez por dia o que for mais antigo é acrescentado em
+# logs_arquivados/logs_acessos_AAAA-MM.csv.gz (um arquivo por mês, id;tipo;login;data_hora)
+# e sai da tabela, em lotes. Se o processo cair entre a gravação e o DELETE, o lote é
+# regravado na próxima vez (o id permite tirar repetidos).
+LOGS_RETENCAO_DIAS = int(os.environ.get("RFA_LOGS_RETENCAO_DIAS") or 0) or None
+LOGS_ARQUIVO_DIR = os.environ.get(
+    "RFA_LOGS_ARQUIVO_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(banco.DB_PATH)), "logs_arquivados"),
+)
+LOGS_ARQUIVO_LOTE = 5000
+
+
+@agendador.tarefa("logs_acessos_arquivar", diaria="03:00")
+def arquivar_logs_acessos(conn):
+    if not LOGS_RETENCAO_DIAS:
+        return 0
+    limite = (datetime.now() - timedelta(days=LOGS_RETENCAO_DIAS)).strftime("%Y-%m-%d")
+    total = 0
+    while True:
+        # faixa em data_hora: usa idx_logs_acessos_data
+        lote = conn.execute(
+            "SELECT id, tipo, login, data_hora FROM logs_acessos WHERE data_hora < ? ORDER BY data_hora, id LIMIT ?",
+            (limite, LOGS_ARQUIVO_LOTE),
+        ).fetchall()
+        if not lote:
+            break
+        os.makedirs(LOGS_ARQUIVO_DIR, exist_ok=True)
+
+        por_mes = {}
+        for r in lote:
+            por_mes.setdefault(r["data_hora"][:7], []).append(r)
+        for mes, linhas in por_mes.items():
+            caminho = os.path.join(LOGS_ARQUIVO_DIR, f"logs_acessos_{mes}.csv.gz")
+            # "at": cada lote vira mais um membro gzip no fim do arquivo (gzip/zcat leem tudo)
+            with gzip.open(caminho, "at", encoding="utf-8", newline="") as f:
+                csv.writer(f, delimiter=";").writerows(
+                    (r["id"], r["tipo"], r["login"], r["data_hora"]) for r in linhas
+                )
+
+        conn.executemany("DELETE FROM logs_acessos WHERE id = ?", [(r["id"],) for r in lote])
+        conn.commit()
+        total += len(lote)
+
+    if total:
+        print(f"[LOGS] {total} acesso(s) anteriores a {limite} arquivado(s) em {LOGS_ARQUIVO_DIR}")
+    return total
+
+
 # Professores
 
 @app.route('/cadastro_professor', methods=['GET', 'POST'])
@@ -1472,7 +1522,7 @@ def api_alunos_por_turma(turma_id):
 
     conn = conectar_bd()
     cursor = conn.cursor()
-    cursor.execute("SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome", (turma_id,))
+    cursor.execute(SQL_ALUNOS_DA_TURMA, (turma_id,))
     rows = cursor.fetchall()
     cursor.close()
     conn.close()
@@ -1572,7 +1622,7 @@ def sala_recursos():
 
     if turma_sel_id:
         # Lista completa da turma
-        cursor.execute("SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome", (turma_sel_id,))
+        cursor.execute(SQL_ALUNOS_DA_TURMA, (turma_sel_id,))
         alunos_turma = cursor.fetchall()
 
         # Marcados na sala de recursos
@@ -2304,551 +2354,140 @@ def area_responsavel():
     # Atestados
     bim_atest = (request.args.get('bim_atest') or '').strip()
 
+    # ========== CASCA DA PÁGINA (as seções vêm de /api/responsavel/<secao>) ==========
+    filtros = {
+        'bim_plan': bim_plan, 'disciplina_plan': disciplina_plan, 'professor_plan': professor_plan,
+        'bim_av': bim_av, 'disciplina_av': disciplina_av, 'professor_av': professor_av,
+        'bim_oc': bim_oc, 'professor_oc': professor_oc,
+        'bim_rec': bim_rec, 'professor_rec': professor_rec,
+        'bim_atest': bim_atest,
+    }
+
     conn = conectar_bd()
     conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    # BUSCAR INFORMAÇÕES BÁSICAS DO ALUNO E TURMA
-    cursor.execute(
-        '''
-        SELECT
-            a.nome AS aluno_nome,
-            t.nome AS turma_nome,
-            t.id   AS turma_id
-        FROM alunos a
-        JOIN turmas t ON a.turma_id = t.id
-        WHERE a.id = ?
-        ''',
-        (aluno_id,)
-    )
-    row = cursor.fetchone()
-    if not row:
-        cursor.close()
+    try:
+        cabecalho = painel_responsavel.carregar_cabecalho(conn, aluno_id)
+    finally:
         conn.close()
+
+    if cabecalho is None:
         flash("Aluno não encontrado para este responsável.")
         return redirect(url_for('login_responsavel'))
 
-    aluno_nome = row['aluno_nome']
-    turma_nome = row['turma_nome']
-    turma_id = row['turma_id']
+    # ========== RETORNAR TEMPLATE COM TODAS AS VARIÁVEIS ==========
+    return render_template(
+        'area_responsavel.html',
+        **cabecalho,
 
-    # ========== PLANEJAMENTOS ==========
-    sql_plan = '''
-        SELECT
-            p.id,
-            pr.login AS professor_login,
-            p.disciplina,
-            p.bimestre,
-            p.ano,
-            p.criado_em,
-            p.observacoes,
-            GROUP_CONCAT(DISTINCT t.nome || ' (' || t.turno || ')') AS turmas_nomes,
-            SUM(COALESCE(pi.pontuacao_total, 0)) AS total_pontos
-        FROM planejamentos p
-        JOIN professores pr ON p.professor_id = pr.id
-        LEFT JOIN planejamentos_turmas pt ON pt.planejamento_id = p.id
-        LEFT JOIN turmas t              ON t.id = pt.turma_id
-        LEFT JOIN planejamento_itens pi ON pi.planejamento_id = p.id
-        WHERE t.id = ?
-    '''
-    params_plan = [turma_id]
+        # Filtros atuais
+        **filtros
+    )
 
-    if bim_plan:
-        try:
-            b = int(bim_plan)
-            sql_plan += " AND p.bimestre = ?"
-            params_plan.append(b)
-        except ValueError:
-            pass
 
-    if disciplina_plan:
-        sql_plan += " AND p.disciplina = ?"
-        params_plan.append(disciplina_plan)
+@app.route('/api/responsavel/<secao>')
+def api_responsavel_secao(secao):
+    """
+    Uma página de uma seção da Área do Responsável.
+    Parâmetros: after=<data>|<id> (cursor devolvido em 'proximo'), limite, e os mesmos filtros da página.
+    """
+    if 'responsavel' not in session:
+        return jsonify({'erro': 'Não autenticado.'}), 401
+    if secao not in painel_responsavel.SECOES:
+        return jsonify({'erro': 'Seção inválida.'}), 404
 
-    if professor_plan:
-        sql_plan += " AND pr.login = ?"
-        params_plan.append(professor_plan)
+    conn = conectar_bd()
+    conn.row_factory = sqlite3.Row
+    try:
+        pagina = painel_responsavel.carregar_secao(
+            conn,
+            session.get('aluno_id'),
+            secao,
+            {k: (v or '').strip() for k, v in request.args.items()},
+            after=request.args.get('after', ''),
+            limite=request.args.get('limite', type=int) or painel_responsavel.LIMITE_PADRAO,
+        )
+    except ValueError:
+        return jsonify({'erro': 'Cursor inválido.'}), 400
+    finally:
+        conn.close()
 
-    sql_plan += '''
-        GROUP BY
-            p.id,
-            pr.login,
-            p.disciplina,
-            p.bimestre,
-            p.ano,
-            p.criado_em,
-            p.observacoes
-        ORDER BY p.ano DESC, p.bimestre DESC, p.criado_em DESC
-    '''
+    if pagina is None:
+        return jsonify({'erro': 'Aluno não encontrado.'}), 404
+    return jsonify(pagina)
 
-    cursor.execute(sql_plan, params_plan)
-    planejamentos = cursor.fetchall()
 
-    # Itens de planejamento
-    itens_por_planejamento = {}
-    if planejamentos:
-        ids = [str(pl['id']) for pl in planejamentos]
-        placeholders = ','.join(['?'] * len(ids))
-        cursor.execute(f'''
-            SELECT
-                planejamento_id,
-                conteudo,
-                data_inicio,
-                data_fim,
-                forma_avaliacao,
-                pontuacao_total,
-                COALESCE(concluido, 0) AS concluido
-            FROM planejamento_itens
-            WHERE planejamento_id IN ({placeholders})
-            ORDER BY planejamento_id, id
-        ''', ids)
-        itens_rows = cursor.fetchall()
-        for it in itens_rows:
-            pid = it['planejamento_id']
-            itens_por_planejamento.setdefault(pid, []).append(it)
-
-    # ========== AVALIAÇÕES BIMESTRAIS ==========
-    sql_av = '''
-        SELECT
-            a.id,
-            a.disciplina,
-            a.bimestre,
-            a.ano,
-            a.tipo_avaliacao,
-            a.descricao_avaliacao,
-            a.conteudos,
-            a.data_avaliacao,
-            a.pontuacao,
-            p.login AS professor_login
-        FROM avaliacoes_bimestrais a
-        JOIN professores p ON a.professor_id = p.id
-        WHERE a.turma_id = ?
-    '''
-    params_av = [turma_id]
+@app.route('/cadastrar_responsavel', methods=['GET', 'POST'])
+def cadastrar_responsavel():
+    conn = conectar_bd()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
 
-    if bim_av:
-        try:
-            b = int(bim_av)
-            sql_av += " AND a.bimestre = ?"
-            params_av.append(b)
-        except ValueError:
-            pass
+    # ✅ Busca termo ativo (para exibir no GET e validar no POST)
+    termo = get_termo_ativo(conectar_bd, "responsavel")
 
-    if disciplina_av:
-        sql_av += " AND a.disciplina = ?"
-        params_av.append(disciplina_av)
+    if request.method == 'POST':
+        login_r = request.form['login']
+        senha = request.form['senha']
+        aluno_id = request.form['aluno_id']
+        telefone = (request.form.get('telefone') or '').strip()
+        senha_hash = generate_password_hash(senha)
 
-    if professor_av:
-        sql_av += " AND p.login = ?"
-        params_av.append(professor_av)
+        # ✅ Exige termo ativo
+        if not termo:
+            flash("Termo não encontrado/ativo. Contate a equipe da escola.")
+            cursor.close()
+            conn.close()
+            return redirect(url_for('cadastrar_responsavel'))
 
-    sql_av += " ORDER BY a.ano DESC, a.bimestre, a.data_avaliacao"
+        # ✅ Exige aceite marcado
+        if not request.form.get("aceite_termo"):
+            flash("Para concluir o cadastro, você precisa aceitar o Termo de Uso.")
+            cursor.close()
+            conn.close()
+            return redirect(url_for('cadastrar_responsavel'))
 
-    cursor.execute(sql_av, params_av)
-    avaliacoes_rows = cursor.fetchall()
+        if not telefone:
+            flash("Por favor, informe um número de telefone/WhatsApp atualizado.")
+            cursor.close()
+            conn.close()
+            return redirect(url_for('cadastrar_responsavel'))
 
-    avaliacoes = []
-    for row in avaliacoes_rows:
-        d = dict(row)
-        data_str = d.get('data_avaliacao')
-        if data_str:
-            try:
-                dt = datetime.strptime(data_str, '%Y-%m-%d')
-                d['data_avaliacao_formatada'] = dt.strftime('%d/%m/%Y')
-            except ValueError:
-                d['data_avaliacao_formatada'] = data_str
-        else:
-            d['data_avaliacao_formatada'] = 'Não informada'
-        avaliacoes.append(d)
+        # Verifica limite de até 2 responsáveis por aluno
+        cursor.execute("SELECT COUNT(*) AS n FROM responsaveis WHERE aluno_id = ?", (aluno_id,))
+        num_responsaveis = cursor.fetchone()["n"]
 
-    # ========== OCORRÊNCIAS ==========
-    sql_oc = '''
-        SELECT
-            o.data,
-            o.tipo_ocorrencia,
-            o.motivo,
-            o.total_dias,
-            o.professor,
-            o.chamar_responsavel,
-            COALESCE(o.data_reuniao, 'N/A') AS data_reuniao,
-            COALESCE(o.hora_reuniao, 'N/A') AS hora_reuniao
-        FROM ocorrencias o
-        WHERE o.aluno_id = ?
-    '''
-    params_oc = [aluno_id]
+        if num_responsaveis >= 2:
+            flash("Este aluno já possui dois responsáveis cadastrados.")
+            cursor.close()
+            conn.close()
+            return redirect(url_for('cadastrar_responsavel'))
 
-    if bim_oc:
         try:
-            b = int(bim_oc)
-            sql_oc += '''
-                AND (((CAST(strftime('%m', o.data) AS INTEGER) - 1) / 3) + 1) = ?
-            '''
-            params_oc.append(b)
-        except ValueError:
-            pass
-
-    if professor_oc:
-        sql_oc += " AND o.professor = ?"
-        params_oc.append(professor_oc)
+            cursor.execute(
+                "INSERT INTO responsaveis (login, senha, telefone, aluno_id) VALUES (?, ?, ?, ?)",
+                (login_r, senha_hash, telefone, aluno_id)
+            )
+            conn.commit()
 
-    sql_oc += " ORDER BY o.data DESC"
+            # ✅ Registra aceite do termo (tipo_cadastro = responsavel)
+            registrar_aceite(conectar_bd, termo, "responsavel", login_r)
 
-    cursor.execute(sql_oc, params_oc)
-    ocorrencias_rows = cursor.fetchall()
+            flash("Responsável cadastrado com sucesso!")
+        except sqlite3.IntegrityError:
+            flash("Login já está em uso. Escolha outro.")
+        finally:
+            cursor.close()
+            conn.close()
 
-    ocorrencias = []
-    for oc in ocorrencias_rows:
-        d = dict(oc)
-        data_str = d.get('data')
-        if data_str:
-            try:
-                dt = datetime.strptime(data_str, '%Y-%m-%d')
-                d['data_br'] = dt.strftime('%d/%m/%Y')
-            except ValueError:
-                d['data_br'] = data_str
-        else:
-            d['data_br'] = '-'
+        return redirect(url_for('login_responsavel'))
 
-        data_reu = d.get('data_reuniao')
-        if data_reu and data_reu != 'N/A':
-            try:
-                dt_reu = datetime.strptime(data_reu, '%Y-%m-%d')
-                d['data_reuniao_br'] = dt_reu.strftime('%d/%m/%Y')
-            except ValueError:
-                d['data_reuniao_br'] = data_reu
-        else:
-            d['data_reuniao_br'] = ''
+    # GET – carrega turmas + termo
+    cursor.execute("SELECT id, nome FROM turmas ORDER BY nome")
+    turmas = cursor.fetchall()
+    cursor.close()
+    conn.close()
 
-        ocorrencias.append(d)
-
-    # ========== ATESTADOS DO ALUNO ==========
-    sql_at = '''
-        SELECT
-            a.id,
-            a.data_atestado,
-            a.bimestre,
-            a.tipo_atestado,
-            a.total_dias,
-            a.outro_tipo
-        FROM atestados a
-        WHERE a.aluno_id = ?
-    '''
-    params_at = [aluno_id]
-
-    if bim_atest:
-        try:
-            b = int(bim_atest)
-            sql_at += " AND a.bimestre = ?"
-            params_at.append(b)
-        except ValueError:
-            pass
-
-    sql_at += " ORDER BY date(a.data_atestado) DESC, a.id DESC"
-
-    cursor.execute(sql_at, params_at)
-    atestados_rows = cursor.fetchall()
-
-    atestados_aluno = []
-    for at in atestados_rows:
-        d = dict(at)
-        data_at = d.get('data_atestado')
-        if data_at:
-            try:
-                dt = datetime.strptime(data_at, '%Y-%m-%d')
-                d['data_atestado_br'] = dt.strftime('%d/%m/%Y')
-            except ValueError:
-                d['data_atestado_br'] = data_at
-        else:
-            d['data_atestado_br'] = '-'
-        atestados_aluno.append(d)
-
-    # ========== RECADOS POR ALUNO ==========
-    sql_rec = '''
-        SELECT
-            ra.id,
-            ra.data_criacao,
-            ra.conteudo,
-            ra.visualizado,
-            p.login AS professor_login,
-            t.nome AS turma_nome,
-            GROUP_CONCAT(pd.disciplina, ', ') AS professor_funcao
-        FROM recados_aluno ra
-        JOIN professores p ON ra.professor_id = p.id
-        JOIN turmas t ON ra.turma_id = t.id
-        LEFT JOIN professor_disciplinas pd ON pd.professor_id = p.id
-        WHERE ra.aluno_id = ?
-          AND IFNULL(ra.excluido_para_responsavel, 0) = 0
-    '''
-    params_rec = [aluno_id]
-
-    if bim_rec:
-        try:
-            b = int(bim_rec)
-            sql_rec += '''
-                AND (((CAST(strftime('%m', ra.data_criacao) AS INTEGER) - 1) / 3) + 1) = ?
-            '''
-            params_rec.append(b)
-        except ValueError:
-            pass
-
-    if professor_rec:
-        sql_rec += " AND p.login = ?"
-        params_rec.append(professor_rec)
-
-    sql_rec += '''
-        GROUP BY ra.id
-        ORDER BY ra.data_criacao DESC
-    '''
-
-    cursor.execute(sql_rec, params_rec)
-    recados_rows = cursor.fetchall()
-
-    recados_aluno = []
-    for r in recados_rows:
-        d = dict(r)
-        data_cr = d.get('data_criacao')
-
-        if data_cr:
-            try:
-                if isinstance(data_cr, datetime):
-                    d['data_criacao_br'] = data_cr.strftime('%d/%m/%Y')
-                elif ' ' in data_cr:
-                    dt = datetime.strptime(data_cr, '%Y-%m-%d %H:%M:%S')
-                    d['data_criacao_br'] = dt.strftime('%d/%m/%Y')
-                else:
-                    dt = datetime.strptime(data_cr, '%Y-%m-%d')
-                    d['data_criacao_br'] = dt.strftime('%d/%m/%Y')
-            except Exception:
-                d['data_criacao_br'] = data_cr[:10]
-        else:
-            d['data_criacao_br'] = '-'
-
-        if not d.get('professor_funcao'):
-            d['professor_funcao'] = '-'
-
-        recados_aluno.append(d)
-
-    # ========== EMPRÉSTIMOS DA BIBLIOTECA ==========
-    conn_bib = conectar_bd_biblioteca()
-    conn_bib.row_factory = sqlite3.Row
-    c_bib = conn_bib.cursor()
-
-    c_bib.execute("""
-        SELECT
-            titulo_livro,
-            data_emprestimo,
-            data_prevista_devolucao,
-            data_devolucao,
-            status,
-            devolucao_pontual
-        FROM emprestimos_biblioteca
-        WHERE aluno_id = ?
-        ORDER BY data_emprestimo DESC
-    """, (aluno_id,))
-
-    emprestimos_raw = c_bib.fetchall()
-    c_bib.close()
-    conn_bib.close()
-
-    emprestimos_biblioteca = []
-    for e in emprestimos_raw:
-        d = dict(e)
-
-        def formata_data(val):
-            if not val:
-                return '-'
-            try:
-                return datetime.strptime(val, '%Y-%m-%d').strftime('%d/%m/%Y')
-            except ValueError:
-                return val
-
-        d['data_emprestimo_br'] = formata_data(d.get('data_emprestimo'))
-        d['data_prevista_devolucao_br'] = formata_data(d.get('data_prevista_devolucao'))
-        d['data_devolucao_br'] = formata_data(d.get('data_devolucao'))
-        emprestimos_biblioteca.append(d)
-
-    # ========== BUSCAR LISTAS PARA OS FILTROS ==========
-
-    # Disciplinas de planejamentos da turma
-    cursor.execute("""
-        SELECT DISTINCT p.disciplina
-        FROM planejamentos p
-        INNER JOIN planejamentos_turmas pt ON p.id = pt.planejamento_id
-        WHERE pt.turma_id = ?
-        ORDER BY p.disciplina
-    """, (turma_id,))
-    disciplinas_planejamento = [row['disciplina'] for row in cursor.fetchall()]
-
-    # Professores de planejamentos da turma
-    cursor.execute("""
-        SELECT DISTINCT pr.login
-        FROM planejamentos p
-        INNER JOIN professores pr ON p.professor_id = pr.id
-        INNER JOIN planejamentos_turmas pt ON p.id = pt.planejamento_id
-        WHERE pt.turma_id = ?
-        ORDER BY pr.login
-    """, (turma_id,))
-    professores_planejamento = [row['login'] for row in cursor.fetchall()]
-
-    # Disciplinas de avaliações da turma
-    cursor.execute("""
-        SELECT DISTINCT disciplina
-        FROM avaliacoes_bimestrais
-        WHERE turma_id = ?
-        ORDER BY disciplina
-    """, (turma_id,))
-    disciplinas_avaliacao = [row['disciplina'] for row in cursor.fetchall()]
-
-    # Professores de avaliações da turma
-    cursor.execute("""
-        SELECT DISTINCT p.login
-        FROM avaliacoes_bimestrais a
-        INNER JOIN professores p ON a.professor_id = p.id
-        WHERE a.turma_id = ?
-        ORDER BY p.login
-    """, (turma_id,))
-    professores_avaliacao = [row['login'] for row in cursor.fetchall()]
-
-    # Professores de ocorrências do aluno
-    cursor.execute("""
-        SELECT DISTINCT professor
-        FROM ocorrencias
-        WHERE aluno_id = ?
-          AND professor IS NOT NULL
-          AND professor != ''
-        ORDER BY professor
-    """, (aluno_id,))
-    professores_ocorrencia = [row['professor'] for row in cursor.fetchall()]
-
-    # Professores de recados do aluno
-    cursor.execute("""
-        SELECT DISTINCT p.login
-        FROM recados_aluno ra
-        INNER JOIN professores p ON ra.professor_id = p.id
-        WHERE ra.aluno_id = ?
-        ORDER BY p.login
-    """, (aluno_id,))
-    professores_recado = [row['login'] for row in cursor.fetchall()]
-
-    cursor.close()
-    conn.close()
-
-    # ========== RETORNAR TEMPLATE COM TODAS AS VARIÁVEIS ==========
-    return render_template(
-        'area_responsavel.html',
-        aluno_nome=aluno_nome,
-        turma_nome=turma_nome,
-
-        # Dados
-        planejamentos=planejamentos,
-        itens_por_planejamento=itens_por_planejamento,
-        avaliacoes=avaliacoes,
-        ocorrencias=ocorrencias,
-        atestados_aluno=atestados_aluno,
-        recados_aluno=recados_aluno,
-        emprestimos_biblioteca=emprestimos_biblioteca,
-
-        # Filtros atuais
-        bim_plan=bim_plan,
-        disciplina_plan=disciplina_plan,
-        professor_plan=professor_plan,
-
-        bim_av=bim_av,
-        disciplina_av=disciplina_av,
-        professor_av=professor_av,
-
-        bim_oc=bim_oc,
-        professor_oc=professor_oc,
-
-        bim_rec=bim_rec,
-        professor_rec=professor_rec,
-
-        bim_atest=bim_atest,
-
-        # Listas para popular os dropdowns (✅ ESTAS ESTAVAM FALTANDO!)
-        disciplinas_planejamento=disciplinas_planejamento,
-        professores_planejamento=professores_planejamento,
-
-        disciplinas_avaliacao=disciplinas_avaliacao,
-        professores_avaliacao=professores_avaliacao,
-
-        professores_ocorrencia=professores_ocorrencia,
-        professores_recado=professores_recado
-    )
-
-
-@app.route('/cadastrar_responsavel', methods=['GET', 'POST'])
-def cadastrar_responsavel():
-    conn = conectar_bd()
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    # ✅ Busca termo ativo (para exibir no GET e validar no POST)
-    termo = get_termo_ativo(conectar_bd, "responsavel")
-
-    if request.method == 'POST':
-        login_r = request.form['login']
-        senha = request.form['senha']
-        aluno_id = request.form['aluno_id']
-        telefone = (request.form.get('telefone') or '').strip()
-        senha_hash = generate_password_hash(senha)
-
-        # ✅ Exige termo ativo
-        if not termo:
-            flash("Termo não encontrado/ativo. Contate a equipe da escola.")
-            cursor.close()
-            conn.close()
-            return redirect(url_for('cadastrar_responsavel'))
-
-        # ✅ Exige aceite marcado
-        if not request.form.get("aceite_termo"):
-            flash("Para concluir o cadastro, você precisa aceitar o Termo de Uso.")
-            cursor.close()
-            conn.close()
-            return redirect(url_for('cadastrar_responsavel'))
-
-        if not telefone:
-            flash("Por favor, informe um número de telefone/WhatsApp atualizado.")
-            cursor.close()
-            conn.close()
-            return redirect(url_for('cadastrar_responsavel'))
-
-        # Verifica limite de até 2 responsáveis por aluno
-        cursor.execute("SELECT COUNT(*) AS n FROM responsaveis WHERE aluno_id = ?", (aluno_id,))
-        num_responsaveis = cursor.fetchone()["n"]
-
-        if num_responsaveis >= 2:
-            flash("Este aluno já possui dois responsáveis cadastrados.")
-            cursor.close()
-            conn.close()
-            return redirect(url_for('cadastrar_responsavel'))
-
-        try:
-            cursor.execute(
-                "INSERT INTO responsaveis (login, senha, telefone, aluno_id) VALUES (?, ?, ?, ?)",
-                (login_r, senha_hash, telefone, aluno_id)
-            )
-            conn.commit()
-
-            # ✅ Registra aceite do termo (tipo_cadastro = responsavel)
-            registrar_aceite(conectar_bd, termo, "responsavel", login_r)
-
-            flash("Responsável cadastrado com sucesso!")
-        except sqlite3.IntegrityError:
-            flash("Login já está em uso. Escolha outro.")
-        finally:
-            cursor.close()
-            conn.close()
-
-        return redirect(url_for('login_responsavel'))
-
-    # GET – carrega turmas + termo
-    cursor.execute("SELECT id, nome FROM turmas ORDER BY nome")
-    turmas = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    return render_template('cadastrar_responsavel.html', turmas=turmas, termo=termo)
+    return render_template('cadastrar_responsavel.html', turmas=turmas, termo=termo)
 
 
 @app.route('/redefinir_senha', methods=['GET', 'POST'])
@@ -3173,6 +2812,44 @@ def registrar_ocorrencia():
     return render_template('registro_ocorrencia.html', turmas=turmas, alunos=alunos)
 
 
+def _sql_ocorrencias_turma(turma_id, aluno_id):
+    """SELECT da tela de ocorrências (turma e, opcionalmente, um aluno) -> (sql, params)."""
+    # Montar SQL das ocorrências com professor
+    sql = '''
+        SELECT
+            ocorrencias.id,                -- 0
+            alunos.nome AS aluno_nome,     -- 1
+            turmas.nome AS turma_nome,     -- 2
+            ocorrencias.professor,         -- 3
+            ocorrencias.data,              -- 4
+            ocorrencias.tipo_ocorrencia,   -- 5
+            ocorrencias.motivo,            -- 6
+            ocorrencias.total_dias,        -- 7
+            ocorrencias.chamar_responsavel,-- 8
+            COALESCE(ocorrencias.data_reuniao, 'N/A') AS data_reuniao, -- 9
+            COALESCE(ocorrencias.hora_reuniao, 'N/A') AS hora_reuniao  -- 10
+        FROM ocorrencias
+        JOIN alunos ON ocorrencias.aluno_id = alunos.id
+        JOIN turmas ON ocorrencias.turma_id = turmas.id
+        WHERE turmas.id = ?
+    '''
+    params = [turma_id]
+
+    # Se um aluno específico foi selecionado, filtra também
+    if aluno_id:
+        sql += " AND alunos.id = ?"
+        params.append(aluno_id)
+
+    sql += " ORDER BY ocorrencias.data DESC"
+    return sql, params
+
+
+indices.consulta_quente(
+    "ocorrências da turma", "ocorrencias", "ocorrencias",
+    lambda cur: cur.execute(*_sql_ocorrencias_turma(1, "")),
+)
+
+
 @app.route('/visualizar_ocorrencias', methods=['GET'])
 def visualizar_ocorrencias():
     if 'usuario' not in session or session.get('tipo') not in ('professor', 'moderador'):
@@ -3196,38 +2873,12 @@ def visualizar_ocorrencias():
     # Se uma turma foi selecionada, carregar alunos da turma
     if turma_id:
         cursor.execute(
-            "SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome",
+            SQL_ALUNOS_DA_TURMA,
             (turma_id,)
         )
         alunos_da_turma = cursor.fetchall()
 
-        # Montar SQL das ocorrências com professor
-        sql = '''
-            SELECT
-                ocorrencias.id,                -- 0
-                alunos.nome AS aluno_nome,     -- 1
-                turmas.nome AS turma_nome,     -- 2
-                ocorrencias.professor,         -- 3
-                ocorrencias.data,              -- 4
-                ocorrencias.tipo_ocorrencia,   -- 5
-                ocorrencias.motivo,            -- 6
-                ocorrencias.total_dias,        -- 7
-                ocorrencias.chamar_responsavel,-- 8
-                COALESCE(ocorrencias.data_reuniao, 'N/A') AS data_reuniao, -- 9
-                COALESCE(ocorrencias.hora_reuniao, 'N/A') AS hora_reuniao  -- 10
-            FROM ocorrencias
-            JOIN alunos ON ocorrencias.aluno_id = alunos.id
-            JOIN turmas ON ocorrencias.turma_id = turmas.id
-            WHERE turmas.id = ?
-        '''
-        params = [turma_id]
-
-        # Se um aluno específico foi selecionado, filtra também
-        if aluno_id:
-            sql += " AND alunos.id = ?"
-            params.append(aluno_id)
-
-        sql += " ORDER BY ocorrencias.data DESC"
+        sql, params = _sql_ocorrencias_turma(turma_id, aluno_id)
 
         cursor.execute(sql, params)
         ocorrencias = cursor.fetchall()
@@ -3410,18 +3061,7 @@ def registrar_atestado():
     cursor.execute("SELECT id, nome, turno FROM turmas ORDER BY turno, nome")
     turmas = cursor.fetchall()
 
-    cursor.execute("SELECT id, nome, turma_id FROM alunos ORDER BY nome")
-    alunos_rows = cursor.fetchall()
-
-    # CONVERTE Row -> dict PARA USAR |tojson NO TEMPLATE
-    alunos = [
-        {
-            "id": row["id"],
-            "nome": row["nome"],
-            "turma_id": row["turma_id"]
-        }
-        for row in alunos_rows
-    ]
+    # alunos: carregados por turma / busca pelo nome (/api/alunos/buscar)
 
     data_hoje = datetime.now().strftime('%Y-%m-%d')
 
@@ -3431,7 +3071,6 @@ def registrar_atestado():
     return render_template(
         'registrar_atestado.html',
         turmas=turmas,
-        alunos=alunos,
         data_hoje=data_hoje
     )
 
@@ -3454,7 +3093,7 @@ def visualizar_atestados():
 
     alunos_da_turma = []
     if turma_id:
-        cursor.execute("SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome", (turma_id,))
+        cursor.execute(SQL_ALUNOS_DA_TURMA, (turma_id,))
         alunos_da_turma = cursor.fetchall()
 
     query = '''
@@ -3583,7 +3222,7 @@ def editar_atestado(atestado_id):
 
     cursor.execute("SELECT id, nome, turno FROM turmas ORDER BY turno, nome")
     turmas = cursor.fetchall()
-    cursor.execute("SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome", (atestado['turma_id'],))
+    cursor.execute(SQL_ALUNOS_DA_TURMA, (atestado['turma_id'],))
     alunos_da_turma = cursor.fetchall()
 
     cursor.close()
@@ -3799,7 +3438,7 @@ def listar_recados_aluno():
     alunos = []
     if turma_id:
         cursor.execute(
-            "SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome",
+            SQL_ALUNOS_DA_TURMA,
             (turma_id,)
         )
         alunos = cursor.fetchall()
@@ -3947,12 +3586,15 @@ def listar_recados_aluno_gestor():
     cursor.execute("SELECT id, login FROM professores WHERE status = 'aprovado' ORDER BY login")
     professores = cursor.fetchall()
 
-    # Alunos (se tiver turma escolhida, filtra por ela)
+    # Alunos só da turma escolhida; sem turma, o filtro é pela busca por nome
     if turma_id:
-        cursor.execute("SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome", (turma_id,))
+        cursor.execute(SQL_ALUNOS_DA_TURMA, (turma_id,))
+        alunos = cursor.fetchall()
+    elif aluno_id:
+        cursor.execute("SELECT id, nome FROM alunos WHERE id = ?", (aluno_id,))
+        alunos = cursor.fetchall()
     else:
-        cursor.execute("SELECT id, nome FROM alunos ORDER BY nome")
-    alunos = cursor.fetchall()
+        alunos = []
 
     # Consulta principal dos recados (AGORA COM excluido_para_responsavel)
     sql = '''
@@ -4059,38 +3701,13 @@ def verificar_senha():
 
 # Gerar PDF geral
 
-@app.route('/gerar_pdf', methods=['GET', 'POST'])
-def gerar_pdf():
-    # Apenas moderador pode gerar PDF
-    if 'usuario' not in session or session.get('tipo') != 'moderador':
-        flash("Acesso não autorizado.")
-        return redirect(url_for('login'))
-
-    # GET: só mostra a tela com os filtros
-    if request.method == 'GET':
-        conn = conectar_bd()
-        cursor = conn.cursor()
-
-        # Turmas para o filtro de atestados
-        cursor.execute("SELECT id, nome, turno FROM turmas ORDER BY turno, nome")
-        turmas = cursor.fetchall()
-
-        cursor.close()
-        conn.close()
-        return render_template('gerar_pdf.html', turmas=turmas)
-
-    # POST: gera o PDF de fato
-    tabelas_selecionadas = request.form.getlist('tabelas')
-
-    if not tabelas_selecionadas:
-        flash("Selecione pelo menos uma opção para gerar o PDF.")
-        return redirect(url_for('gerar_pdf'))
-
-    # Filtros específicos
-    bimestre_planejamento = (request.form.get('bimestre_planejamento') or "").strip()
-    bimestre_atestado = (request.form.get('bimestre_atestado') or "").strip()
-    turma_atestado = (request.form.get('turma_atestado') or "").strip()
-
+@fila_jobs.tipo_job("relatorio_geral")
+def _montar_relatorio_geral(destino, tabelas_selecionadas, bimestre_planejamento="", bimestre_atestado="", turma_atestado=""):
+    """
+    Monta o "Relatório Geral – De Olho na Escola" em `destino` (roda na fila de jobs).
+    A story é gravada em partes quando enche (ver pdf_partes.py): a memória não cresce
+    com o histórico da escola, e as partes temporárias somem se der erro no meio.
+    """
     conn = conectar_bd()
     cursor = conn.cursor()
 
@@ -4114,15 +3731,15 @@ def gerar_pdf():
     # ------------------------------------
     # Montagem do PDF
     # ------------------------------------
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=landscape(A4),  # A4 HORIZONTAL
-        leftMargin=24,
-        rightMargin=24,
-        topMargin=30,
-        bottomMargin=24
-    )
+    def novo_doc(caminho):
+        return SimpleDocTemplate(
+            caminho,
+            pagesize=landscape(A4),  # A4 HORIZONTAL
+            leftMargin=24,
+            rightMargin=24,
+            topMargin=30,
+            bottomMargin=24
+        )
 
     styles = getSampleStyleSheet()
     titulo_style = styles["Title"]
@@ -4151,219 +3768,189 @@ def gerar_pdf():
         s = s.replace("\r\n", "<br/>").replace("\n", "<br/>").replace("\r", "<br/>")
         return Paragraph(s, wrap_style)
 
-    story = []
+    with pdf_partes.RelatorioEmPartes(destino, novo_doc) as story:
 
-    static_dir = os.path.join(app.root_path, 'static')
-    logo_left_path = os.path.join(static_dir, 'logo.jpg')
-    logo_right_path = os.path.join(static_dir, 'logo1.PNG')
+        # Estilos de tabela usados pelas seções
+        estilo_simples = [
+            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+            ("ALIGN", (0, 0), (-1, -1), "CENTER"),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+        ]
+        estilo_texto = [
+            ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+            ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+            ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+            ("VALIGN", (0, 0), (-1, -1), "TOP"),
+            ("ALIGN", (0, 0), (-1, 0), "CENTER"),
+            ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+            ("FONTSIZE", (0, 0), (-1, -1), 7),
+        ]
 
-    def _mk_logo(p, w=52, h=52):
-        try:
-            if p and os.path.exists(p):
-                return Image(p, width=w, height=h)
-        except Exception:
-            pass
-        return ''
+        header_tbl = Table(
+            [[recursos_pdf.logo_flowable(recursos_pdf.LOGO_ESQ),
+              Paragraph('<b>RELATÓRIO – DE OLHO NA ESCOLA (ESCOLA CLASSE 16)</b>', normal),
+              recursos_pdf.logo_flowable(recursos_pdf.LOGO_DIR)]],
+            colWidths=[60, None, 60],
+        )
+        header_tbl.setStyle(TableStyle([
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+            ('ALIGN', (1, 0), (1, 0), 'CENTER'),
+            ('ALIGN', (2, 0), (2, 0), 'RIGHT'),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]))
+        story.append(header_tbl)
+        story.append(Spacer(1, 10))
+
+        story.append(Paragraph("Relatório Geral – De Olho na Escola", titulo_style))
+        story.append(Spacer(1, 8))
+        story.append(Paragraph(f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}", normal))
+        story.append(Spacer(1, 16))
 
-    header_tbl = Table(
-        [[_mk_logo(logo_left_path), Paragraph('<b>RELATÓRIO – DE OLHO NA ESCOLA (ESCOLA CLASSE 16)</b>', normal),
-          _mk_logo(logo_right_path)]],
-        colWidths=[60, None, 60],
-    )
-    header_tbl.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-        ('ALIGN', (1, 0), (1, 0), 'CENTER'),
-        ('ALIGN', (2, 0), (2, 0), 'RIGHT'),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    story.append(header_tbl)
-    story.append(Spacer(1, 10))
-
-    story.append(Paragraph("Relatório Geral – De Olho na Escola", titulo_style))
-    story.append(Spacer(1, 8))
-    story.append(Paragraph(f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}", normal))
-    story.append(Spacer(1, 16))
+        # =========================
+        # 1) PROFESSORES
+        # =========================
+        if "professores" in tabelas_selecionadas:
+            cursor.execute("""
+                SELECT id, login, status
+                FROM professores
+                ORDER BY login
+            """)
 
-    # =========================
-    # 1) PROFESSORES
-    # =========================
-    if "professores" in tabelas_selecionadas:
-        cursor.execute("""
-            SELECT id, login, status
-            FROM professores
-            ORDER BY login
-        """)
-        rows = cursor.fetchall()
-
-        story.append(Paragraph("Professores", h2))
-        story.append(Spacer(1, 6))
-
-        if rows:
-            dados_tabela = [["ID", "Login", "Status"]]
-            for r in rows:
-                dados_tabela.append([r["id"], r["login"], r["status"]])
-
-            tabela = Table(dados_tabela, repeatRows=1)
-            tabela.setStyle(TableStyle([
-                ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ]))
-            story.append(tabela)
-        else:
-            story.append(Paragraph("Nenhum professor cadastrado.", normal))
+            story.append(Paragraph("Professores", h2))
+            story.append(Spacer(1, 6))
 
-        story.append(Spacer(1, 16))
+            total = pdf_partes.tabela_em_lotes(
+                story, cursor,
+                ["ID", "Login", "Status"],
+                lambda r: [r["id"], r["login"], r["status"]],
+                estilo_simples,
+            )
+            if not total:
+                story.append(Paragraph("Nenhum professor cadastrado.", normal))
 
-    # =========================
-    # 2) TURMAS
-    # =========================
-    if "turmas" in tabelas_selecionadas:
-        cursor.execute("""
-            SELECT id, nome, turno
-            FROM turmas
-            ORDER BY turno, nome
-        """)
-        rows = cursor.fetchall()
-
-        story.append(Paragraph("Turmas", h2))
-        story.append(Spacer(1, 6))
-
-        if rows:
-            dados_tabela = [["ID", "Nome", "Turno"]]
-            for r in rows:
-                dados_tabela.append([r["id"], r["nome"], r["turno"]])
-
-            tabela = Table(dados_tabela, repeatRows=1)
-            tabela.setStyle(TableStyle([
-                ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ]))
-            story.append(tabela)
-        else:
-            story.append(Paragraph("Nenhuma turma cadastrada.", normal))
+            story.append(Spacer(1, 16))
 
-        story.append(Spacer(1, 16))
+        # =========================
+        # 2) TURMAS
+        # =========================
+        if "turmas" in tabelas_selecionadas:
+            cursor.execute("""
+                SELECT id, nome, turno
+                FROM turmas
+                ORDER BY turno, nome
+            """)
 
-    # =========================
-    # 3) ALUNOS
-    # =========================
-    if "alunos" in tabelas_selecionadas:
-        cursor.execute("""
-            SELECT a.id,
-                   a.nome,
-                   t.nome  AS turma,
-                   t.turno AS turno
-            FROM alunos a
-            JOIN turmas t ON a.turma_id = t.id
-            ORDER BY t.turno, t.nome, a.nome
-        """)
-        rows = cursor.fetchall()
-
-        story.append(Paragraph("Alunos", h2))
-        story.append(Spacer(1, 6))
-
-        if rows:
-            dados_tabela = [["ID", "Nome", "Turma", "Turno"]]
-            for r in rows:
-                dados_tabela.append([r["id"], r["nome"], r["turma"], r["turno"]])
-
-            tabela = Table(dados_tabela, repeatRows=1)
-            tabela.setStyle(TableStyle([
-                ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ]))
-            story.append(tabela)
-        else:
-            story.append(Paragraph("Nenhum aluno cadastrado.", normal))
+            story.append(Paragraph("Turmas", h2))
+            story.append(Spacer(1, 6))
 
-        story.append(Spacer(1, 16))
+            total = pdf_partes.tabela_em_lotes(
+                story, cursor,
+                ["ID", "Nome", "Turno"],
+                lambda r: [r["id"], r["nome"], r["turno"]],
+                estilo_simples,
+            )
+            if not total:
+                story.append(Paragraph("Nenhuma turma cadastrada.", normal))
 
-    # =========================
-    # 4) RESPONSÁVEIS
-    # =========================
-    if "responsaveis" in tabelas_selecionadas:
-        cursor.execute("""
-            SELECT r.id,
-                   r.login,
-                   r.telefone,
-                   a.nome AS aluno
-            FROM responsaveis r
-            LEFT JOIN alunos a ON r.aluno_id = a.id
-            ORDER BY r.login
-        """)
-        rows = cursor.fetchall()
+            story.append(Spacer(1, 16))
+
+        # =========================
+        # 3) ALUNOS
+        # =========================
+        if "alunos" in tabelas_selecionadas:
+            cursor.execute("""
+                SELECT a.id,
+                       a.nome,
+                       t.nome  AS turma,
+                       t.turno AS turno
+                FROM alunos a
+                JOIN turmas t ON a.turma_id = t.id
+                ORDER BY t.turno, t.nome, a.nome
+            """)
+
+            story.append(Paragraph("Alunos", h2))
+            story.append(Spacer(1, 6))
+
+            total = pdf_partes.tabela_em_lotes(
+                story, cursor,
+                ["ID", "Nome", "Turma", "Turno"],
+                lambda r: [r["id"], r["nome"], r["turma"], r["turno"]],
+                estilo_simples,
+            )
+            if not total:
+                story.append(Paragraph("Nenhum aluno cadastrado.", normal))
+
+            story.append(Spacer(1, 16))
+
+        # =========================
+        # 4) RESPONSÁVEIS
+        # =========================
+        if "responsaveis" in tabelas_selecionadas:
+            cursor.execute("""
+                SELECT r.id,
+                       r.login,
+                       r.telefone,
+                       a.nome AS aluno
+                FROM responsaveis r
+                LEFT JOIN alunos a ON r.aluno_id = a.id
+                ORDER BY r.login
+            """)
 
-        story.append(Paragraph("Responsáveis", h2))
-        story.append(Spacer(1, 6))
+            story.append(Paragraph("Responsáveis", h2))
+            story.append(Spacer(1, 6))
 
-        if rows:
-            dados_tabela = [["ID", "Login", "Telefone", "Aluno"]]
-            for r in rows:
-                dados_tabela.append([
+            total = pdf_partes.tabela_em_lotes(
+                story, cursor,
+                ["ID", "Login", "Telefone", "Aluno"],
+                lambda r: [
                     r["id"],
                     r["login"],
                     r["telefone"] or "",
                     r["aluno"] or "",
-                ])
-
-            tabela = Table(dados_tabela, repeatRows=1)
-            tabela.setStyle(TableStyle([
-                ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-            ]))
-            story.append(tabela)
-        else:
-            story.append(Paragraph("Nenhum responsável cadastrado.", normal))
+                ],
+                estilo_simples,
+            )
+            if not total:
+                story.append(Paragraph("Nenhum responsável cadastrado.", normal))
 
-        story.append(Spacer(1, 16))
+            story.append(Spacer(1, 16))
 
-    # =========================
-    # 5) OCORRÊNCIAS
-    # =========================
-    if "ocorrencias" in tabelas_selecionadas:
-        try:
-            cursor.execute("""
-                SELECT
-                    o.id,
-                    a.nome AS aluno,
-                    t.nome AS turma,
-                    t.turno AS turno,
-                    o.data,
-                    o.tipo_ocorrencia AS tipo,
-                    o.motivo,
-                    o.professor,
-                    COALESCE(o.data_reuniao, '') AS data_reuniao,
-                    COALESCE(o.hora_reuniao, '') AS hora_reuniao,
-                    COALESCE(o.descricao, '') AS descricao
-                FROM ocorrencias o
-                JOIN alunos a ON o.aluno_id = a.id
-                JOIN turmas t ON a.turma_id = t.id
-                ORDER BY t.turno, t.nome, o.data
-            """)
-            rows = cursor.fetchall()
+        # =========================
+        # 5) OCORRÊNCIAS
+        # =========================
+        if "ocorrencias" in tabelas_selecionadas:
+            try:
+                cursor.execute("""
+                    SELECT
+                        o.id,
+                        a.nome AS aluno,
+                        t.nome AS turma,
+                        t.turno AS turno,
+                        o.data,
+                        o.tipo_ocorrencia AS tipo,
+                        o.motivo,
+                        o.professor,
+                        COALESCE(o.data_reuniao, '') AS data_reuniao,
+                        COALESCE(o.hora_reuniao, '') AS hora_reuniao,
+                        COALESCE(o.descricao, '') AS descricao
+                    FROM ocorrencias o
+                    JOIN alunos a ON o.aluno_id = a.id
+                    JOIN turmas t ON a.turma_id = t.id
+                    ORDER BY t.turno, t.nome, o.data
+                """)
 
-            story.append(Paragraph("Ocorrências", h2))
-            story.append(Spacer(1, 6))
+                story.append(Paragraph("Ocorrências", h2))
+                story.append(Spacer(1, 6))
 
-            if rows:
-                dados_tabela = [["ID", "Aluno", "Turma", "Turno",
-                                 "Data", "Tipo", "Motivo",
-                                 "Professor", "Descrição", "Data Reunião", "Hora Reunião"]]
-                for r in rows:
-                    dados_tabela.append([
+                total = pdf_partes.tabela_em_lotes(
+                    story, cursor,
+                    ["ID", "Aluno", "Turma", "Turno",
+                     "Data", "Tipo", "Motivo",
+                     "Professor", "Descrição", "Data Reunião", "Hora Reunião"],
+                    lambda r: [
                         r["id"],
                         r["aluno"],
                         r["turma"],
@@ -4375,87 +3962,70 @@ def gerar_pdf():
                         _pwrap(r["descricao"]),
                         fmt_data(r["data_reuniao"]) if r["data_reuniao"] else "",
                         r["hora_reuniao"] or "",
-                    ])
-
-                tabela = Table(dados_tabela, repeatRows=1)
-                tabela.setStyle(TableStyle([
-                    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                    ("ALIGN", (0, 0), (-1, 0), "CENTER"),
-                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                    ("FONTSIZE", (0, 0), (-1, -1), 7),
-                ]))
-                story.append(tabela)
-            else:
-                story.append(Paragraph("Nenhuma ocorrência cadastrada.", normal))
-
-            story.append(Spacer(1, 16))
-        except sqlite3.Error:
-            story.append(Paragraph("Não foi possível carregar as ocorrências.", normal))
-            story.append(Spacer(1, 16))
-
-    # =========================
-    # 6) ATESTADOS (por turma e bimestre)
-    # =========================
-    if "atestados" in tabelas_selecionadas:
-        sql_at = """
-            SELECT
-                at.data_atestado,
-                at.bimestre,
-                t.nome  AS turma,
-                t.turno AS turno,
-                a.nome  AS aluno,
-                at.tipo_atestado,
-                COALESCE(at.outro_tipo, '') AS outro_tipo,
-                at.total_dias
-            FROM atestados at
-            JOIN alunos a ON a.id = at.aluno_id
-            JOIN turmas t ON t.id = at.turma_id
-            WHERE 1=1
-        """
-        params_at = []
-
-        if bimestre_atestado:
-            sql_at += " AND at.bimestre = ?"
-            params_at.append(bimestre_atestado)
-
-        if turma_atestado:
-            sql_at += " AND t.id = ?"
-            params_at.append(turma_atestado)
+                    ],
+                    estilo_texto,
+                )
+                if not total:
+                    story.append(Paragraph("Nenhuma ocorrência cadastrada.", normal))
 
-        sql_at += """
-            ORDER BY t.turno, t.nome, at.bimestre, at.data_atestado, a.nome
-        """
+                story.append(Spacer(1, 16))
+            except sqlite3.Error:
+                story.append(Paragraph("Não foi possível carregar as ocorrências.", normal))
+                story.append(Spacer(1, 16))
 
-        cursor.execute(sql_at, params_at)
-        rows = cursor.fetchall()
-
-        story.append(Paragraph("Atestados por Turma e Bimestre", h2))
-        story.append(Spacer(1, 6))
-
-        filtros_txt = []
-        if bimestre_atestado:
-            filtros_txt.append(f"Bimestre: {bimestre_atestado}")
-        if turma_atestado:
-            cursor.execute("SELECT nome, turno FROM turmas WHERE id = ?", (turma_atestado,))
-            turma_sel = cursor.fetchone()
-            if turma_sel:
-                filtros_txt.append(f"Turma: {turma_sel['nome']} ({turma_sel['turno']})")
-        if filtros_txt:
-            story.append(Paragraph("Filtros aplicados: " + " | ".join(filtros_txt), normal))
+        # =========================
+        # 6) ATESTADOS (por turma e bimestre)
+        # =========================
+        if "atestados" in tabelas_selecionadas:
+            sql_at = """
+                SELECT
+                    at.data_atestado,
+                    at.bimestre,
+                    t.nome  AS turma,
+                    t.turno AS turno,
+                    a.nome  AS aluno,
+                    at.tipo_atestado,
+                    COALESCE(at.outro_tipo, '') AS outro_tipo,
+                    at.total_dias
+                FROM atestados at
+                JOIN alunos a ON a.id = at.aluno_id
+                JOIN turmas t ON t.id = at.turma_id
+                WHERE 1=1
+            """
+            params_at = []
+
+            if bimestre_atestado:
+                sql_at += " AND at.bimestre = ?"
+                params_at.append(bimestre_atestado)
+
+            if turma_atestado:
+                sql_at += " AND t.id = ?"
+                params_at.append(turma_atestado)
+
+            sql_at += """
+                ORDER BY t.turno, t.nome, at.bimestre, at.data_atestado, a.nome
+            """
+
+            story.append(Paragraph("Atestados por Turma e Bimestre", h2))
             story.append(Spacer(1, 6))
 
-        if rows:
-            dados_tabela = [["Data", "Bimestre", "Turma", "Turno",
-                             "Aluno", "Tipo", "Dias"]]
-            for r in rows:
+            filtros_txt = []
+            if bimestre_atestado:
+                filtros_txt.append(f"Bimestre: {bimestre_atestado}")
+            if turma_atestado:
+                cursor.execute("SELECT nome, turno FROM turmas WHERE id = ?", (turma_atestado,))
+                turma_sel = cursor.fetchone()
+                if turma_sel:
+                    filtros_txt.append(f"Turma: {turma_sel['nome']} ({turma_sel['turno']})")
+            if filtros_txt:
+                story.append(Paragraph("Filtros aplicados: " + " | ".join(filtros_txt), normal))
+                story.append(Spacer(1, 6))
+
+            def _linha_atestado(r):
                 tipo = r["tipo_atestado"]
                 if tipo == "outro" and r["outro_tipo"]:
                     tipo = r["outro_tipo"]
-
-                dados_tabela.append([
+                return [
                     fmt_data(r["data_atestado"]),
                     r["bimestre"],
                     r["turma"],
@@ -4463,67 +4033,57 @@ def gerar_pdf():
                     r["aluno"],
                     tipo,
                     r["total_dias"],
-                ])
-
-            tabela = Table(dados_tabela, repeatRows=1)
-            tabela.setStyle(TableStyle([
-                ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-                ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("FONTSIZE", (0, 0), (-1, -1), 8),
-            ]))
-            story.append(tabela)
-        else:
-            story.append(Paragraph("Nenhum atestado encontrado com os filtros informados.", normal))
-
-        story.append(Spacer(1, 16))
+                ]
+
+            cursor.execute(sql_at, params_at)
+            total = pdf_partes.tabela_em_lotes(
+                story, cursor,
+                ["Data", "Bimestre", "Turma", "Turno",
+                 "Aluno", "Tipo", "Dias"],
+                _linha_atestado,
+                estilo_simples + [("FONTSIZE", (0, 0), (-1, -1), 8)],
+            )
+            if not total:
+                story.append(Paragraph("Nenhum atestado encontrado com os filtros informados.", normal))
 
-    # =========================
-    # 7) ATENDIMENTOS – EQUIPE GESTORA (MODERADORES)
-    # =========================
-    if "atendimentos_gestao" in tabelas_selecionadas:
-        try:
-            cursor.execute("""
-                SELECT
-                    ar.id,
-                    ar.data_atendimento,
-                    ar.hora_atendimento,
-                    t.nome  AS turma,
-                    t.turno AS turno,
-                    a.nome  AS aluno,
-                    COALESCE(NULLIF(ar.responsavel_nome,''), r.login) AS responsavel,
-                    COALESCE(ar.registrador_nome,'')  AS registrador_nome,
-                    COALESCE(ar.registrador_cargo,'') AS registrador_cargo,
-                    COALESCE(ar.assunto,'')           AS assunto,
-                    ar.envolve_professor,
-                    COALESCE(ar.professor_nome,'')    AS professor_nome,
-                    COALESCE(ar.relato,'')            AS relato,
-                    COALESCE(ar.combinados,'')        AS combinados,
-                    ar.retorno_previsto,
-                    COALESCE(ar.retorno_em,'')        AS retorno_em,
-                    ar.reuniao_agendada,
-                    COALESCE(ar.reuniao_data,'')      AS reuniao_data
-                FROM atendimentos_responsaveis ar
-                JOIN turmas t ON t.id = ar.turma_id
-                JOIN alunos a ON a.id = ar.aluno_id
-                LEFT JOIN responsaveis r ON r.id = ar.responsavel_id
-                ORDER BY ar.data_atendimento DESC, ar.hora_atendimento DESC
-            """)
-            rows = cursor.fetchall()
+            story.append(Spacer(1, 16))
 
-            story.append(Paragraph("Atendimentos – Equipe Gestora (Moderadores)", h2))
-            story.append(Spacer(1, 6))
+        # =========================
+        # 7) ATENDIMENTOS – EQUIPE GESTORA (MODERADORES)
+        # =========================
+        if "atendimentos_gestao" in tabelas_selecionadas:
+            try:
+                cursor.execute("""
+                    SELECT
+                        ar.id,
+                        ar.data_atendimento,
+                        ar.hora_atendimento,
+                        t.nome  AS turma,
+                        t.turno AS turno,
+                        a.nome  AS aluno,
+                        COALESCE(NULLIF(ar.responsavel_nome,''), r.login) AS responsavel,
+                        COALESCE(ar.registrador_nome,'')  AS registrador_nome,
+                        COALESCE(ar.registrador_cargo,'') AS registrador_cargo,
+                        COALESCE(ar.assunto,'')           AS assunto,
+                        ar.envolve_professor,
+                        COALESCE(ar.professor_nome,'')    AS professor_nome,
+                        COALESCE(ar.relato,'')            AS relato,
+                        COALESCE(ar.combinados,'')        AS combinados,
+                        ar.retorno_previsto,
+                        COALESCE(ar.retorno_em,'')        AS retorno_em,
+                        ar.reuniao_agendada,
+                        COALESCE(ar.reuniao_data,'')      AS reuniao_data
+                    FROM atendimentos_responsaveis ar
+                    JOIN turmas t ON t.id = ar.turma_id
+                    JOIN alunos a ON a.id = ar.aluno_id
+                    LEFT JOIN responsaveis r ON r.id = ar.responsavel_id
+                    ORDER BY ar.data_atendimento DESC, ar.hora_atendimento DESC
+                """)
 
-            if rows:
-                dados_tabela = [[
-                    "Data", "Hora", "Turma", "Aluno(a)", "Responsável",
-                    "Assunto", "Envolve professor", "Relato", "Combinados",
-                    "Retorno", "Reunião", "Registrado por"
-                ]]
+                story.append(Paragraph("Atendimentos – Equipe Gestora (Moderadores)", h2))
+                story.append(Spacer(1, 6))
 
-                for r in rows:
+                def _linha_gestao(r):
                     retorno_txt = "Não"
                     if r["retorno_previsto"]:
                         retorno_txt = "Sim"
@@ -4549,7 +4109,7 @@ def gerar_pdf():
                     if not registrador_txt:
                         registrador_txt = "—"
 
-                    dados_tabela.append([
+                    return [
                         fmt_data(r["data_atendimento"]),
                         (r["hora_atendimento"] or ""),
                         f"{r['turma']} ({r['turno']})",
@@ -4562,72 +4122,61 @@ def gerar_pdf():
                         retorno_txt,
                         reuniao_txt,
                         _pwrap(registrador_txt),
-                    ])
-
-                tabela = Table(dados_tabela, repeatRows=1)
-                tabela.setStyle(TableStyle([
-                    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                    ("ALIGN", (0, 0), (-1, 0), "CENTER"),
-                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                    ("FONTSIZE", (0, 0), (-1, -1), 7),
-                ]))
-                story.append(tabela)
-            else:
-                story.append(Paragraph("Nenhum atendimento de gestão cadastrado.", normal))
+                    ]
+
+                total = pdf_partes.tabela_em_lotes(
+                    story, cursor,
+                    ["Data", "Hora", "Turma", "Aluno(a)", "Responsável",
+                     "Assunto", "Envolve professor", "Relato", "Combinados",
+                     "Retorno", "Reunião", "Registrado por"],
+                    _linha_gestao,
+                    estilo_texto,
+                )
+                if not total:
+                    story.append(Paragraph("Nenhum atendimento de gestão cadastrado.", normal))
 
-            story.append(Spacer(1, 16))
-        except sqlite3.Error:
-            story.append(Paragraph("Não foi possível carregar os atendimentos da gestão.", normal))
-            story.append(Spacer(1, 16))
+                story.append(Spacer(1, 16))
+            except sqlite3.Error:
+                story.append(Paragraph("Não foi possível carregar os atendimentos da gestão.", normal))
+                story.append(Spacer(1, 16))
 
-    # =========================
-    # 8) ATENDIMENTOS – SOE (sem encaminhamentos)
-    # =========================
-    if "soe_atendimentos" in tabelas_selecionadas:
-        try:
+        # =========================
+        # 8) ATENDIMENTOS – SOE (sem encaminhamentos)
+        # =========================
+        if "soe_atendimentos" in tabelas_selecionadas:
             try:
-                ensure_soe_table()
-            except Exception:
-                pass
-
-            cursor.execute("""
-                SELECT
-                    s.id,
-                    s.data_atendimento,
-                    s.hora_atendimento,
-                    t.nome  AS turma,
-                    t.turno AS turno,
-                    a.nome  AS aluno,
-                    COALESCE(s.responsavel_nome,'')  AS responsavel_nome,
-                    COALESCE(s.orientadora_nome,'')  AS orientadora_nome,
-                    COALESCE(s.assunto,'')           AS assunto,
-                    COALESCE(s.relato,'')            AS relato,
-                    COALESCE(s.combinados,'')        AS combinados,
-                    s.retorno_previsto,
-                    COALESCE(s.retorno_em,'')        AS retorno_em,
-                    s.reuniao_agendada,
-                    COALESCE(s.reuniao_data,'')      AS reuniao_data
-                FROM soe_atendimentos s
-                JOIN turmas t ON t.id = s.turma_id
-                JOIN alunos a ON a.id = s.aluno_id
-                ORDER BY s.data_atendimento DESC, s.hora_atendimento DESC
-            """)
-            rows = cursor.fetchall()
+                try:
+                    ensure_soe_table()
+                except Exception:
+                    pass
 
-            story.append(Paragraph("Atendimentos – SOE", h2))
-            story.append(Spacer(1, 6))
+                cursor.execute("""
+                    SELECT
+                        s.id,
+                        s.data_atendimento,
+                        s.hora_atendimento,
+                        t.nome  AS turma,
+                        t.turno AS turno,
+                        a.nome  AS aluno,
+                        COALESCE(s.responsavel_nome,'')  AS responsavel_nome,
+                        COALESCE(s.orientadora_nome,'')  AS orientadora_nome,
+                        COALESCE(s.assunto,'')           AS assunto,
+                        COALESCE(s.relato,'')            AS relato,
+                        COALESCE(s.combinados,'')        AS combinados,
+                        s.retorno_previsto,
+                        COALESCE(s.retorno_em,'')        AS retorno_em,
+                        s.reuniao_agendada,
+                        COALESCE(s.reuniao_data,'')      AS reuniao_data
+                    FROM soe_atendimentos s
+                    JOIN turmas t ON t.id = s.turma_id
+                    JOIN alunos a ON a.id = s.aluno_id
+                    ORDER BY s.data_atendimento DESC, s.hora_atendimento DESC
+                """)
 
-            if rows:
-                dados_tabela = [[
-                    "Data", "Hora", "Turma", "Aluno(a)", "Responsável",
-                    "Orientadora", "Assunto", "Relato", "Combinados",
-                    "Retorno", "Reunião"
-                ]]
+                story.append(Paragraph("Atendimentos – SOE", h2))
+                story.append(Spacer(1, 6))
 
-                for r in rows:
+                def _linha_soe(r):
                     retorno_txt = "Não"
                     if r["retorno_previsto"]:
                         retorno_txt = "Sim"
@@ -4640,7 +4189,7 @@ def gerar_pdf():
                         if r["reuniao_data"]:
                             reuniao_txt += f" ({fmt_data(r['reuniao_data'])})"
 
-                    dados_tabela.append([
+                    return [
                         fmt_data(r["data_atendimento"]),
                         (r["hora_atendimento"] or ""),
                         f"{r['turma']} ({r['turno']})",
@@ -4649,65 +4198,59 @@ def gerar_pdf():
                         _pwrap(r["orientadora_nome"]),
                         _pwrap(r["assunto"]),
                         _pwrap(r["relato"]),
-                        _pwrap(r["combinados"]),
-                        retorno_txt,
-                        reuniao_txt,
-                    ])
-
-                tabela = Table(dados_tabela, repeatRows=1)
-                tabela.setStyle(TableStyle([
-                    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                    ("ALIGN", (0, 0), (-1, 0), "CENTER"),
-                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                    ("FONTSIZE", (0, 0), (-1, -1), 7),
-                ]))
-                story.append(tabela)
-            else:
-                story.append(Paragraph("Nenhum atendimento do SOE cadastrado.", normal))
+                        _pwrap(r["combinados"]),
+                        retorno_txt,
+                        reuniao_txt,
+                    ]
+
+                total = pdf_partes.tabela_em_lotes(
+                    story, cursor,
+                    ["Data", "Hora", "Turma", "Aluno(a)", "Responsável",
+                     "Orientadora", "Assunto", "Relato", "Combinados",
+                     "Retorno", "Reunião"],
+                    _linha_soe,
+                    estilo_texto,
+                )
+                if not total:
+                    story.append(Paragraph("Nenhum atendimento do SOE cadastrado.", normal))
 
-            story.append(Spacer(1, 16))
-        except sqlite3.Error:
-            story.append(Paragraph("Não foi possível carregar os atendimentos do SOE.", normal))
-            story.append(Spacer(1, 16))
+                story.append(Spacer(1, 16))
+            except sqlite3.Error:
+                story.append(Paragraph("Não foi possível carregar os atendimentos do SOE.", normal))
+                story.append(Spacer(1, 16))
 
-    # =========================
-    # 9) BIBLIOTECA – Empréstimos (datas e status)
-    # =========================
-    if "emprestimos_biblioteca" in tabelas_selecionadas:
-        try:
-            cursor.execute("""
-                SELECT
-                    e.id,
-                    e.data_emprestimo,
-                    e.data_prevista_devolucao,
-                    e.data_devolucao,
-                    e.status,
-                    e.titulo_livro,
-                    COALESCE(e.autor,'') AS autor,
-                    COALESCE(e.codigo_interno,'') AS codigo_interno,
-                    a.nome AS aluno,
-                    t.nome AS turma,
-                    t.turno AS turno
-                FROM emprestimos_biblioteca e
-                JOIN alunos a ON a.id = e.aluno_id
-                JOIN turmas t ON t.id = e.turma_id
-                ORDER BY e.data_emprestimo DESC
-            """)
-            rows = cursor.fetchall()
+        # =========================
+        # 9) BIBLIOTECA – Empréstimos (datas e status)
+        # =========================
+        if "emprestimos_biblioteca" in tabelas_selecionadas:
+            try:
+                cursor.execute("""
+                    SELECT
+                        e.id,
+                        e.data_emprestimo,
+                        e.data_prevista_devolucao,
+                        e.data_devolucao,
+                        e.status,
+                        e.titulo_livro,
+                        COALESCE(e.autor,'') AS autor,
+                        COALESCE(e.codigo_interno,'') AS codigo_interno,
+                        a.nome AS aluno,
+                        t.nome AS turma,
+                        t.turno AS turno
+                    FROM emprestimos_biblioteca e
+                    JOIN alunos a ON a.id = e.aluno_id
+                    JOIN turmas t ON t.id = e.turma_id
+                    ORDER BY e.data_emprestimo DESC
+                """)
 
-            story.append(Paragraph("Biblioteca – Empréstimos de Livros", h2))
-            story.append(Spacer(1, 6))
+                story.append(Paragraph("Biblioteca – Empréstimos de Livros", h2))
+                story.append(Spacer(1, 6))
 
-            if rows:
-                dados_tabela = [[
-                    "Data empréstimo", "Prevista devolução", "Data devolução", "Status",
-                    "Turma", "Aluno(a)", "Título", "Autor", "Código"
-                ]]
-                for r in rows:
-                    dados_tabela.append([
+                total = pdf_partes.tabela_em_lotes(
+                    story, cursor,
+                    ["Data empréstimo", "Prevista devolução", "Data devolução", "Status",
+                     "Turma", "Aluno(a)", "Título", "Autor", "Código"],
+                    lambda r: [
                         fmt_data(r["data_emprestimo"]),
                         fmt_data(r["data_prevista_devolucao"]),
                         fmt_data(r["data_devolucao"]),
@@ -4717,67 +4260,56 @@ def gerar_pdf():
                         _pwrap(r["titulo_livro"]),
                         _pwrap(r["autor"]),
                         _pwrap(r["codigo_interno"]),
-                    ])
-
-                tabela = Table(dados_tabela, repeatRows=1)
-                tabela.setStyle(TableStyle([
-                    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                    ("ALIGN", (0, 0), (-1, 0), "CENTER"),
-                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                    ("FONTSIZE", (0, 0), (-1, -1), 7),
-                ]))
-                story.append(tabela)
-            else:
-                story.append(Paragraph("Nenhum empréstimo de biblioteca cadastrado.", normal))
-
-            story.append(Spacer(1, 16))
-        except sqlite3.Error:
-            story.append(Paragraph("Não foi possível carregar os empréstimos da biblioteca.", normal))
-            story.append(Spacer(1, 16))
-
-    # =========================
-    # 10) PLANEJAMENTOS
-    # =========================
-    if "planejamentos" in tabelas_selecionadas:
-        sql_pl = """
-            SELECT
-                p.id,
-                pr.login AS professor,
-                p.disciplina,
-                p.bimestre,
-                p.ano,
-                p.criado_em,
-                COALESCE(p.observacoes, '') AS observacoes
-            FROM planejamentos p
-            JOIN professores pr ON pr.id = p.professor_id
-            WHERE 1=1
-        """
-        params_pl = []
-
-        if bimestre_planejamento:
-            sql_pl += " AND p.bimestre = ?"
-            params_pl.append(bimestre_planejamento)
-
-        sql_pl += " ORDER BY p.ano DESC, p.bimestre, pr.login, p.disciplina, p.id"
-
-        cursor.execute(sql_pl, params_pl)
-        planejamentos = cursor.fetchall()
+                    ],
+                    estilo_texto,
+                )
+                if not total:
+                    story.append(Paragraph("Nenhum empréstimo de biblioteca cadastrado.", normal))
 
-        story.append(Paragraph("Planejamentos – Resumo", h2))
-        story.append(Spacer(1, 6))
+                story.append(Spacer(1, 16))
+            except sqlite3.Error:
+                story.append(Paragraph("Não foi possível carregar os empréstimos da biblioteca.", normal))
+                story.append(Spacer(1, 16))
 
-        if bimestre_planejamento:
-            story.append(Paragraph(f"Filtrado pelo bimestre: {bimestre_planejamento}", normal))
+        # =========================
+        # 10) PLANEJAMENTOS
+        # =========================
+        if "planejamentos" in tabelas_selecionadas:
+            sql_pl = """
+                SELECT
+                    p.id,
+                    pr.login AS professor,
+                    p.disciplina,
+                    p.bimestre,
+                    p.ano,
+                    p.criado_em,
+                    COALESCE(p.observacoes, '') AS observacoes
+                FROM planejamentos p
+                JOIN professores pr ON pr.id = p.professor_id
+                WHERE 1=1
+            """
+            params_pl = []
+
+            if bimestre_planejamento:
+                sql_pl += " AND p.bimestre = ?"
+                params_pl.append(bimestre_planejamento)
+
+            sql_pl += " ORDER BY p.ano DESC, p.bimestre, pr.login, p.disciplina, p.id"
+
+            story.append(Paragraph("Planejamentos – Resumo", h2))
             story.append(Spacer(1, 6))
 
-        if not planejamentos:
-            story.append(Paragraph("Nenhum planejamento encontrado com os filtros informados.", normal))
-            story.append(Spacer(1, 16))
-        else:
-            for p in planejamentos:
+            if bimestre_planejamento:
+                story.append(Paragraph(f"Filtrado pelo bimestre: {bimestre_planejamento}", normal))
+                story.append(Spacer(1, 6))
+
+            # cursor próprio para percorrer os planejamentos sem fetchall();
+            # `cursor` fica livre para as turmas/itens de cada um
+            cur_pl = conn.cursor()
+            cur_pl.execute(sql_pl, params_pl)
+            algum = False
+            for p in cur_pl:
+                algum = True
                 cursor.execute("""
                     SELECT t.nome, t.turno
                     FROM planejamentos_turmas pt
@@ -4844,55 +4376,58 @@ def gerar_pdf():
                     story.append(Paragraph("Nenhum item de conteúdo cadastrado neste planejamento.", normal))
 
                 story.append(Spacer(1, 16))
+                story.flush_se_cheio()
+            cur_pl.close()
 
-    # =========================
-    # 11) AVALIAÇÕES BIMESTRAIS
-    # =========================
-    if "avaliacoes" in tabelas_selecionadas:
-        sql_av = """
-            SELECT
-                a.id                             AS id,
-                t.nome || ' (' || t.turno || ')' AS turma,
-                a.disciplina                     AS disciplina,
-                a.bimestre                       AS bimestre,
-                a.ano                            AS ano,
-                a.tipo_avaliacao                 AS tipo,
-                a.descricao_avaliacao            AS descricao,
-                a.conteudos                      AS conteudos,
-                a.data_avaliacao                 AS data_avaliacao,
-                a.pontuacao                      AS pontuacao,
-                p.login                          AS professor
-            FROM avaliacoes_bimestrais a
-            JOIN professores p ON a.professor_id = p.id
-            JOIN turmas t      ON a.turma_id = t.id
-            WHERE 1=1
-        """
-        params_av = []
-
-        if bimestre_planejamento:
-            try:
-                b = int(bimestre_planejamento)
-                sql_av += " AND a.bimestre = ?"
-                params_av.append(b)
-            except ValueError:
-                pass
+            if not algum:
+                story.append(Paragraph("Nenhum planejamento encontrado com os filtros informados.", normal))
+                story.append(Spacer(1, 16))
+            story.flush_se_cheio()
 
-        sql_av += " ORDER BY a.ano DESC, a.bimestre, a.data_avaliacao"
+        # =========================
+        # 11) AVALIAÇÕES BIMESTRAIS
+        # =========================
+        if "avaliacoes" in tabelas_selecionadas:
+            sql_av = """
+                SELECT
+                    a.id                             AS id,
+                    t.nome || ' (' || t.turno || ')' AS turma,
+                    a.disciplina                     AS disciplina,
+                    a.bimestre                       AS bimestre,
+                    a.ano                            AS ano,
+                    a.tipo_avaliacao                 AS tipo,
+                    a.descricao_avaliacao            AS descricao,
+                    a.conteudos                      AS conteudos,
+                    a.data_avaliacao                 AS data_avaliacao,
+                    a.pontuacao                      AS pontuacao,
+                    p.login                          AS professor
+                FROM avaliacoes_bimestrais a
+                JOIN professores p ON a.professor_id = p.id
+                JOIN turmas t      ON a.turma_id = t.id
+                WHERE 1=1
+            """
+            params_av = []
+
+            if bimestre_planejamento:
+                try:
+                    b = int(bimestre_planejamento)
+                    sql_av += " AND a.bimestre = ?"
+                    params_av.append(b)
+                except ValueError:
+                    pass
 
-        cursor.execute(sql_av, params_av)
-        rows = cursor.fetchall()
+            sql_av += " ORDER BY a.ano DESC, a.bimestre, a.data_avaliacao"
 
-        story.append(Paragraph("Avaliações Bimestrais", h2))
-        story.append(Spacer(1, 6))
+            cursor.execute(sql_av, params_av)
 
-        if rows:
-            dados_tabela = [[
-                "ID", "Turma", "Disciplina", "Bimestre", "Ano",
-                "Tipo", "Descrição", "Conteúdos", "Data", "Pontuação", "Professor"
-            ]]
+            story.append(Paragraph("Avaliações Bimestrais", h2))
+            story.append(Spacer(1, 6))
 
-            for r in rows:
-                dados_tabela.append([
+            total = pdf_partes.tabela_em_lotes(
+                story, cursor,
+                ["ID", "Turma", "Disciplina", "Bimestre", "Ano",
+                 "Tipo", "Descrição", "Conteúdos", "Data", "Pontuação", "Professor"],
+                lambda r: [
                     r["id"],
                     r["turma"],
                     r["disciplina"],
@@ -4904,34 +4439,71 @@ def gerar_pdf():
                     fmt_data(r["data_avaliacao"]),
                     r["pontuacao"],
                     r["professor"],
-                ])
-
-            tabela = Table(dados_tabela, repeatRows=1)
-            tabela.setStyle(TableStyle([
-                ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
-                ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-                ("VALIGN", (0, 0), (-1, -1), "TOP"),
-                ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-                ("FONTSIZE", (0, 0), (-1, -1), 7),
-            ]))
-            story.append(tabela)
-        else:
-            story.append(Paragraph("Nenhuma avaliação bimestral cadastrada.", normal))
+                ],
+                [
+                    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+                    ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+                    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+                    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+                    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+                    ("FONTSIZE", (0, 0), (-1, -1), 7),
+                ],
+            )
+            if not total:
+                story.append(Paragraph("Nenhuma avaliação bimestral cadastrada.", normal))
 
-        story.append(Spacer(1, 16))
+            story.append(Spacer(1, 16))
 
-    cursor.close()
-    conn.close()
+        cursor.close()
+        conn.close()
+
+        story.finalizar()
+
+
+@app.route('/gerar_pdf', methods=['GET', 'POST'])
+def gerar_pdf():
+    # Apenas moderador pode gerar PDF
+    if 'usuario' not in session or session.get('tipo') != 'moderador':
+        flash("Acesso não autorizado.")
+        return redirect(url_for('login'))
+
+    # GET: só mostra a tela com os filtros
+    if request.method == 'GET':
+        conn = conectar_bd()
+        cursor = conn.cursor()
+
+        # Turmas para o filtro de atestados
+        cursor.execute("SELECT id, nome, turno FROM turmas ORDER BY turno, nome")
+        turmas = cursor.fetchall()
+
+        cursor.close()
+        conn.close()
+        # ?job=<id>: a tela acompanha o relatório enviado para a fila
+        return render_template('gerar_pdf.html', turmas=turmas, job_id=(request.args.get('job') or '').strip())
+
+    # POST: gera o PDF de fato
+    tabelas_selecionadas = request.form.getlist('tabelas')
+
+    if not tabelas_selecionadas:
+        flash("Selecione pelo menos uma opção para gerar o PDF.")
+        return redirect(url_for('gerar_pdf'))
 
-    doc.build(story)
-    pdf = buffer.getvalue()
-    buffer.close()
+    # Filtros específicos
+    bimestre_planejamento = (request.form.get('bimestre_planejamento') or "").strip()
+    bimestre_atestado = (request.form.get('bimestre_atestado') or "").strip()
+    turma_atestado = (request.form.get('turma_atestado') or "").strip()
 
-    response = make_response(pdf)
-    response.headers["Content-Type"] = "application/pdf"
-    response.headers["Content-Disposition"] = "attachment; filename=relatorio_geral.pdf"
-    return response
+    parametros = {
+        "tabelas_selecionadas": sorted(tabelas_selecionadas),
+        "bimestre_planejamento": bimestre_planejamento,
+        "bimestre_atestado": bimestre_atestado,
+        "turma_atestado": turma_atestado,
+    }
+    # Relatório completo pode levar minutos: vai para a fila e a tela acompanha o status
+    job_id, _novo = fila_jobs.enfileirar(
+        "relatorio_geral", parametros, "relatorio_geral.pdf", criado_por=session.get('usuario')
+    )
+    return redirect(url_for('gerar_pdf', job=job_id))
 
 
 @app.route('/visualizar_turmas/<int:turma_id>')
@@ -6540,7 +6112,7 @@ def atendimentos_historico():
 
     alunos = []
     if turma_id:
-        cursor.execute("SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome", (turma_id,))
+        cursor.execute(SQL_ALUNOS_DA_TURMA, (turma_id,))
         alunos = cursor.fetchall()
 
     # monta query
@@ -6668,7 +6240,7 @@ def api_alunos():
         conn = conectar_bd()
         conn.row_factory = sqlite3.Row
         cur = conn.cursor()
-        cur.execute("SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome", (turma_id,))
+        cur.execute(SQL_ALUNOS_DA_TURMA, (turma_id,))
         rows = cur.fetchall()
         cur.close()
         conn.close()
@@ -6745,12 +6317,12 @@ def atendimentos_pdf(atendimento_id):
     # CABEÇALHO COM LOGOS
     # =========================
     def _draw_header(pdf, titulo):
-        logo_esq = os.path.join(app.root_path, 'static', 'logo.jpg')
-        logo_dir = os.path.join(app.root_path, 'static', 'logo1.PNG')
+        logo_esq = recursos_pdf.logo(recursos_pdf.LOGO_ESQ)
+        logo_dir = recursos_pdf.logo(recursos_pdf.LOGO_DIR)
 
         y_top = 770
 
-        if os.path.exists(logo_esq):
+        if logo_esq:
             pdf.drawImage(
                 logo_esq,
                 40, y_top - 45,
@@ -6759,7 +6331,7 @@ def atendimentos_pdf(atendimento_id):
                 mask='auto'
             )
 
-        if os.path.exists(logo_dir):
+        if logo_dir:
             pdf.drawImage(
                 logo_dir,
                 520, y_top - 45,
@@ -6913,32 +6485,8 @@ def atendimentos_pdf(atendimento_id):
     )
 
 
-@app.route('/api/calendario/eventos')
-def api_calendario_eventos():
-    """
-    Retorna eventos do calendário para o professor logado:
-    - Avaliações agendadas
-    - Períodos de planejamento
-    - Ocorrências importantes
-    """
-    if 'usuario' not in session or session.get('tipo') != 'professor':
-        return jsonify({'ok': False, 'error': 'Não autorizado'}), 403
-
-    professor_id = obter_professor_id(session['usuario'])
-    if not professor_id:
-        return jsonify({'ok': False, 'error': 'Professor não encontrado'}), 404
-
-    # Filtros opcionais
-    mes = request.args.get('mes')  # 1-12
-    ano = request.args.get('ano')  # 2024, 2025...
-
-    conn = conectar_bd()
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    eventos = []
-
-    # ========== AVALIAÇÕES AGENDADAS ==========
+def _sql_calendario_avaliacoes(professor_id, ano, mes):
+    """Avaliações do professor no calendário (ano/mês opcionais) -> (sql, params)."""
     sql_av = """
         SELECT
             a.id,
@@ -6965,6 +6513,42 @@ def api_calendario_eventos():
         params_av.append(ano)
 
     sql_av += " ORDER BY a.data_avaliacao"
+    return sql_av, params_av
+
+
+indices.consulta_quente(
+    "calendário do professor: avaliações", "avaliacoes_bimestrais", "a",
+    lambda cur: cur.execute(*_sql_calendario_avaliacoes(1, None, None)),
+)
+
+
+@app.route('/api/calendario/eventos')
+def api_calendario_eventos():
+    """
+    Retorna eventos do calendário para o professor logado:
+    - Avaliações agendadas
+    - Períodos de planejamento
+    - Ocorrências importantes
+    """
+    if 'usuario' not in session or session.get('tipo') != 'professor':
+        return jsonify({'ok': False, 'error': 'Não autorizado'}), 403
+
+    professor_id = obter_professor_id(session['usuario'])
+    if not professor_id:
+        return jsonify({'ok': False, 'error': 'Professor não encontrado'}), 404
+
+    # Filtros opcionais
+    mes = request.args.get('mes')  # 1-12
+    ano = request.args.get('ano')  # 2024, 2025...
+
+    conn = conectar_bd()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+
+    eventos = []
+
+    # ========== AVALIAÇÕES AGENDADAS ==========
+    sql_av, params_av = _sql_calendario_avaliacoes(professor_id, ano, mes)
 
     cursor.execute(sql_av, params_av)
     avaliacoes = cursor.fetchall()
@@ -7054,6 +6638,29 @@ def api_calendario_eventos():
 
 # ============== ROTA 2: NOTIFICAÇÕES DO PROFESSOR ==============
 
+# Recados que o responsável ainda não viu (notificações do professor)
+SQL_RECADOS_NAO_LIDOS = indices.consulta_quente(
+    "notificações do professor: recados não lidos", "recados_aluno", "ra",
+    """
+        SELECT
+            ra.id,
+            ra.data_criacao,
+            a.nome AS aluno_nome,
+            t.nome AS turma_nome,
+            t.turno AS turma_turno
+        FROM recados_aluno ra
+        JOIN alunos a ON ra.aluno_id = a.id
+        JOIN turmas t ON ra.turma_id = t.id
+        WHERE ra.professor_id = ?
+          AND ra.visualizado = 0
+          AND IFNULL(ra.excluido_para_responsavel, 0) = 0
+        ORDER BY ra.data_criacao DESC
+        LIMIT 10
+    """,
+    (1,),
+)
+
+
 @app.route('/api/notificacoes/professor')
 def api_notificacoes_professor():
     """
@@ -7076,22 +6683,7 @@ def api_notificacoes_professor():
     notificacoes = []
 
     # ========== RECADOS NÃO VISUALIZADOS ==========
-    cursor.execute("""
-        SELECT
-            ra.id,
-            ra.data_criacao,
-            a.nome AS aluno_nome,
-            t.nome AS turma_nome,
-            t.turno AS turma_turno
-        FROM recados_aluno ra
-        JOIN alunos a ON ra.aluno_id = a.id
-        JOIN turmas t ON ra.turma_id = t.id
-        WHERE ra.professor_id = ?
-          AND ra.visualizado = 0
-          AND IFNULL(ra.excluido_para_responsavel, 0) = 0
-        ORDER BY ra.data_criacao DESC
-        LIMIT 10
-    """, (professor_id,))
+    cursor.execute(SQL_RECADOS_NAO_LIDOS, (professor_id,))
 
     recados_nao_lidos = cursor.fetchall()
 
@@ -7294,85 +6886,6 @@ def _parse_data_br(data_str: str) -> str:
         raise ValueError("Data inválida. Use o formato dd/mm/aaaa.")
 
 
-import glob
-
-
-def _encontrar_logos_lista_presenca() -> tuple[str | None, str | None]:
-    """Tenta localizar duas logos no projeto (sem quebrar se não existir)."""
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-
-    # ✅ Prioridade absoluta (solicitado):
-    #    ESQUERDA = static/logo.jpg
-    #    DIREITA  = static/logo1.PNG
-    # Nota: em Linux (PythonAnywhere) o nome do arquivo é *case-sensitive*.
-    # Então "logo1.PNG" é diferente de "logo1.png".
-    static_dir = os.path.join(base_dir, "static")
-    logo_esq_prior = os.path.join(static_dir, "logo.jpg")
-    logo_dir_prior = os.path.join(static_dir, "logo1.PNG")
-    if os.path.isfile(logo_esq_prior) and os.path.isfile(logo_dir_prior):
-        return logo_esq_prior, logo_dir_prior
-
-    # fallback 1: aceitar variações comuns de maiúsculas/minúsculas
-    for alt_dir in ["logo1.png", "logo1.jpg", "logo1.jpeg", "logo_1.png"]:
-        p_alt = os.path.join(static_dir, alt_dir)
-        if os.path.isfile(logo_esq_prior) and os.path.isfile(p_alt):
-            return logo_esq_prior, p_alt
-    candidatos: list[str] = []
-    pastas = [
-        base_dir,
-        os.path.join(base_dir, "static"),
-        os.path.join(base_dir, "static", "img"),
-        os.path.join(base_dir, "static", "images"),
-        os.path.join(base_dir, "static", "assets"),
-    ]
-    padroes = [
-        "logo_left.png", "logo_right.png",
-        "logo_esquerda.png", "logo_direita.png",
-        "logo1.png", "logo2.png",
-        "*logo*.png", "*logo*.jpg", "*logo*.jpeg",
-        "*brasao*.png", "*brasao*.jpg", "*emblema*.png",
-    ]
-    for pasta in pastas:
-        if not os.path.isdir(pasta):
-            continue
-        for pad in padroes:
-            for f in sorted(glob.glob(os.path.join(pasta, pad))):
-                if os.path.isfile(f) and f not in candidatos:
-                    candidatos.append(f)
-
-    # preferir pares explícitos left/right se existirem
-    left = None
-    right = None
-    for nome in ["logo_left.png", "logo_esquerda.png"]:
-        for pasta in pastas:
-            f = os.path.join(pasta, nome)
-            if os.path.isfile(f):
-                left = f
-                break
-        if left:
-            break
-
-    for nome in ["logo_right.png", "logo_direita.png"]:
-        for pasta in pastas:
-            f = os.path.join(pasta, nome)
-            if os.path.isfile(f):
-                right = f
-                break
-        if right:
-            break
-
-    # fallback: pegar as duas primeiras encontradas
-    if left is None and candidatos:
-        left = candidatos[0]
-    if right is None:
-        if len(candidatos) >= 2:
-            right = candidatos[1]
-        elif left is not None:
-            right = left
-
-    return left, right
-
-
 def _inserir_logos_no_docx(d):
     """Insere uma logo em cada lado do cabeçalho (tabela 0, linha 0)."""
     try:
@@ -7385,7 +6898,7 @@ def _inserir_logos_no_docx(d):
     if len(d.tables) < 1:
         return
 
-    left, right = _encontrar_logos_lista_presenca()
+    left, right = recursos_pdf.logos_lista_presenca()
     if not left and not right:
         return
 
@@ -7522,63 +7035,113 @@ def _buscar_alunos_da_turma(turma_id: int):
     return alunos
 
 
-def _preencher_docx_lista_presenca(modelo_path: str, turma_nome: str, data_br: str, atividade: str,
-                                   alunos: list[str]) -> BytesIO:
-    from docx import Document
-    por_pagina = 34
-    total_paginas = max(1, (len(alunos) + por_pagina - 1) // por_pagina)
-
-    doc_final = None
+LISTA_POR_PAGINA = 34
+# Turmas preenchidas em paralelo no "todas as turmas" (o save do DOCX é quase todo zlib/lxml)
+LISTA_PRESENCA_WORKERS = int(os.environ.get("RFA_LISTA_WORKERS", "4"))
 
-    for p in range(total_paginas):
-        inicio = p * por_pagina
-        fim = inicio + por_pagina
-        bloco = alunos[inicio:fim]
+_modelo_lista_lock = threading.Lock()
+_modelo_lista_cache: dict = {"chave": None, "doc": None}
 
-        d = Document(modelo_path)
 
-        _inserir_logos_no_docx(d)
+def _modelo_lista_presenca(modelo_path: str):
+    """
+    Cópia (deepcopy) do modelo JÁ PREPARADO (logos inseridas + tabela de assinaturas ajustada).
+    O modelo (~3 MB) é aberto uma vez por processo e refeito só se ele ou as logos mudarem;
+    cada turma recebe um Document próprio sem passar pelo parse do DOCX de novo.
+    """
+    logos = recursos_pdf.logos_lista_presenca()
+    chave = []
+    for caminho in (modelo_path,) + logos:
+        try:
+            st = os.stat(caminho) if caminho else None
+        except OSError:
+            st = None
+        chave.append((caminho, st.st_mtime_ns if st else None, st.st_size if st else None))
+    chave = tuple(chave)
+
+    with _modelo_lista_lock:
+        if _modelo_lista_cache["chave"] != chave:
+            d = Document(modelo_path)
+            _inserir_logos_no_docx(d)
+            if len(d.tables) > 1:
+                _ajustar_tabela_assinaturas_docx(d.tables[1])
+            # guardado reaberto do zero: um Document já usado tem proxies em cache (ex.: o _body
+            # de .tables) que o deepcopy separaria da árvore copiada
+            buf = BytesIO()
+            d.save(buf)
+            _modelo_lista_cache["chave"] = chave
+            _modelo_lista_cache["doc"] = Document(BytesIO(buf.getvalue()))
+        # cópia sob o lock: as turmas são preenchidas em threads
+        return deepcopy(_modelo_lista_cache["doc"])
+
+
+def _preencher_pagina_lista_presenca(tabelas, turma_nome: str, data_br: str, atividade: str, bloco: list[str]):
+    # Tabela 0: infos
+    if tabelas:
+        t0 = tabelas[0]
+        try:
+            t0.rows[1].cells[1].text = atividade
+        except Exception:
+            pass
+        try:
+            t0.rows[2].cells[1].text = turma_nome
+            t0.rows[2].cells[2].text = f"Data: {data_br}"
+        except Exception:
+            pass
 
-        # Tabela 0: infos
-        if d.tables:
-            t0 = d.tables[0]
-            try:
-                t0.rows[1].cells[1].text = atividade
-            except Exception:
-                pass
+    # Tabela 1: estudantes
+    if len(tabelas) > 1:
+        t1 = tabelas[1]
+        for i in range(LISTA_POR_PAGINA):
+            nome = bloco[i] if i < len(bloco) else ""
             try:
-                t0.rows[2].cells[1].text = turma_nome
-                t0.rows[2].cells[2].text = f"Data: {data_br}"
-            except Exception:
-                pass
-
-        # Tabela 1: estudantes
-        if len(d.tables) > 1:
-            t1 = d.tables[1]
-            _ajustar_tabela_assinaturas_docx(t1)
-            for i in range(34):
-                nome = bloco[i] if i < len(bloco) else ""
+                cell_nome = t1.rows[i + 1].cells[1]
+                cell_nome.text = nome
+                # Ajuste fino para caber nomes longos (quebra automática dentro da célula)
                 try:
-                    cell_nome = t1.rows[i + 1].cells[1]
-                    cell_nome.text = nome
-                    # Ajuste fino para caber nomes longos (quebra automática dentro da célula)
-                    try:
-                        for p in cell_nome.paragraphs:
-                            p.paragraph_format.space_before = 0
-                            p.paragraph_format.space_after = 0
-                            p.paragraph_format.line_spacing = 1.0
-                    except Exception:
-                        pass
-                    _set_cell_font_arial(cell_nome, 8)
+                    for p in cell_nome.paragraphs:
+                        p.paragraph_format.space_before = 0
+                        p.paragraph_format.space_after = 0
+                        p.paragraph_format.line_spacing = 1.0
                 except Exception:
                     pass
+                _set_cell_font_arial(cell_nome, 8)
+            except Exception:
+                pass
+
+
+def _preencher_docx_lista_presenca(modelo_path: str, turma_nome: str, data_br: str, atividade: str,
+                                   alunos: list[str]) -> BytesIO:
+    from docx.table import Table as DocxTable
+
+    por_pagina = LISTA_POR_PAGINA
+    total_paginas = max(1, (len(alunos) + por_pagina - 1) // por_pagina)
+
+    # Cópia do modelo já aberto; as demais páginas são cópias do body do próprio doc
+    doc_final = _modelo_lista_presenca(modelo_path)
+    corpo = [deepcopy(el) for el in doc_final.element.body if not el.tag.endswith("}sectPr")]
 
-        if doc_final is None:
-            doc_final = d
+    for p in range(total_paginas):
+        inicio = p * por_pagina
+        bloco = alunos[inicio:inicio + por_pagina]
+
+        if p == 0:
+            tabelas = doc_final.tables
         else:
             doc_final.add_page_break()
-            for element in d.element.body:
-                doc_final.element.body.append(element)
+            # cópias entram antes do sectPr final (que precisa continuar sendo o último do body)
+            sect_pr = doc_final.element.body.sectPr
+            tabelas = []
+            for el in corpo:
+                novo = deepcopy(el)
+                if sect_pr is not None:
+                    sect_pr.addprevious(novo)
+                else:
+                    doc_final.element.body.append(novo)
+                if novo.tag.endswith("}tbl"):
+                    tabelas.append(DocxTable(novo, doc_final._body))
+
+        _preencher_pagina_lista_presenca(tabelas, turma_nome, data_br, atividade, bloco)
 
     buf = BytesIO()
     doc_final.save(buf)
@@ -7593,30 +7156,8 @@ def _gerar_pdf_lista_presenca(turmas_com_alunos: list[dict], data_br: str, ativi
     """
     buf = BytesIO()
 
-    # --- Fonte: tentar Arial; se não existir, usar LiberationSans/DejaVu (bem próximo) e, por fim, Helvetica ---
-    pdf_font = "Helvetica"
-    try:
-        from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
-        possiveis = [
-            # Windows
-            os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts", "arial.ttf"),
-            # Linux comuns (PythonAnywhere costuma ter DejaVu)
-            "/usr/share/fonts/truetype/msttcorefonts/Arial.ttf",
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-            "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-        ]
-        for p in possiveis:
-            if p and os.path.isfile(p):
-                nome_reg = "Arial" if os.path.basename(p).lower().startswith("arial") else "SansFallback"
-                try:
-                    pdfmetrics.registerFont(TTFont(nome_reg, p))
-                    pdf_font = nome_reg
-                    break
-                except Exception:
-                    continue
-    except Exception:
-        pass
+    # --- Fonte: Arial; se não existir, LiberationSans/DejaVu (bem próximo) e, por fim, Helvetica ---
+    pdf_font = recursos_pdf.fonte_sans()
     # A4 (retraro) costuma casar melhor com a lista
     from reportlab.lib.pagesizes import A4
     c = canvas.Canvas(buf, pagesize=A4)
@@ -7626,16 +7167,15 @@ def _gerar_pdf_lista_presenca(turmas_com_alunos: list[dict], data_br: str, ativi
         y = height - 50
         # logos (se existirem) - um de cada lado
         try:
-            from reportlab.lib.utils import ImageReader
-            left_logo, right_logo = _encontrar_logos_lista_presenca()
+            left_logo, right_logo = (recursos_pdf.imagem(p) for p in recursos_pdf.logos_lista_presenca())
             logo_w = 46
             logo_h = 46
             y_logo = height - 92
-            if left_logo and os.path.isfile(left_logo):
-                c.drawImage(ImageReader(left_logo), 40, y_logo, width=logo_w, height=logo_h, mask='auto',
+            if left_logo:
+                c.drawImage(left_logo, 40, y_logo, width=logo_w, height=logo_h, mask='auto',
                             preserveAspectRatio=True)
-            if right_logo and os.path.isfile(right_logo):
-                c.drawImage(ImageReader(right_logo), width - 40 - logo_w, y_logo, width=logo_w, height=logo_h,
+            if right_logo:
+                c.drawImage(right_logo, width - 40 - logo_w, y_logo, width=logo_w, height=logo_h,
                             mask='auto', preserveAspectRatio=True)
         except Exception:
             pass
@@ -7831,17 +7371,27 @@ def gerar_lista_presenca():
                 mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
             )
 
-        zip_buf = BytesIO()
-        with zipfile.ZipFile(zip_buf, "w", zipfile.ZIP_DEFLATED) as zf:
-            for item in turmas_com_alunos:
-                docx_buf = _preencher_docx_lista_presenca(modelo_path, item["turma"], data_br, atividade,
-                                                          item["alunos"])
-                nome_doc = f"lista_presenca_{item['turma'].split('(')[0].strip()}_{data_br.replace('/', '-')}.docx"
-                zf.writestr(nome_doc, docx_buf.getvalue())
+        def _docx_da_turma(item):
+            return _preencher_docx_lista_presenca(modelo_path, item["turma"], data_br, atividade, item["alunos"])
 
-        zip_buf.seek(0)
+        # Turmas em paralelo; cada DOCX entra no ZIP (na ordem da lista) assim que fica pronto.
+        # O ZIP vai para um arquivo temporário (memória até 16 MB, depois disco) e é enviado em blocos.
+        zip_tmp = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+        try:
+            workers = max(1, min(LISTA_PRESENCA_WORKERS, len(turmas_com_alunos)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lista") as pool, \
+                    zipfile.ZipFile(zip_tmp, "w", zipfile.ZIP_DEFLATED) as zf:
+                for item, docx_buf in zip(turmas_com_alunos, pool.map(_docx_da_turma, turmas_com_alunos)):
+                    nome_doc = f"lista_presenca_{item['turma'].split('(')[0].strip()}_{data_br.replace('/', '-')}.docx"
+                    # DOCX já é compactado: guardar sem recomprimir
+                    zf.writestr(nome_doc, docx_buf.getvalue(), compress_type=zipfile.ZIP_STORED)
+        except Exception:
+            zip_tmp.close()
+            raise
+
+        zip_tmp.seek(0)
         nome_zip = f"listas_presenca_{data_br.replace('/', '-')}.zip"
-        return send_file(zip_buf, as_attachment=True, download_name=nome_zip, mimetype="application/zip")
+        return send_file(zip_tmp, as_attachment=True, download_name=nome_zip, mimetype="application/zip")
 
     except ValueError as e:
         flash(str(e))
@@ -7899,7 +7449,8 @@ def moderador_ver_carometro():
                                turmas=turmas,
                                alunos=alunos,
                                turma_id=turma_id,
-                               usuario=session['usuario'])
+                               usuario=session['usuario'],
+                               job_id=(request.args.get('job') or '').strip())
 
     except Exception as e:
         cursor.close()
@@ -0,0 +1,313 @@
+# banco.py
+# Camada única de acesso ao rfa.db (compartilhada por app.py e todos os blueprints)
+#
+# - Cada worker do gunicorn mantém um pequeno POOL de conexões SQLite.
+# - Dentro de uma requisição, toda chamada a conectar_bd() devolve a MESMA conexão
+#   (guardada em flask.g). Assim um salvamento do carômetro usa 1 conexão, e não 5–6.
+# - PRAGMAs são aplicados uma única vez, quando a conexão física é criada; o único que
+#   os módulos mudam em runtime (foreign_keys) volta ao valor do perfil a cada _pegar().
+# - conn.close() continua funcionando como antes nos módulos: ele apenas "devolve"
+#   a conexão. A liberação de verdade acontece no fim da requisição (teardown).
+# - Contador por requisição: quantas conexões físicas e quantas chamadas a conectar_bd().
+# - Perfil de armazenamento (WAL + PRAGMAs + busy timeout) configurável via app.config
+#   ou variáveis de ambiente. O checkpoint periódico do WAL (checkpoint_wal) é uma tarefa
+#   do agendador (agendador.py): roda em um worker só, o líder.
+
+import os
+import queue
+import sqlite3
+import threading
+
+from flask import g, has_app_context
+
+DB_PATH = os.environ.get("RFA_DB_PATH", "rfa.db")
+
+# Quantas conexões ociosas cada processo mantém guardadas
+POOL_TAMANHO = int(os.environ.get("RFA_DB_POOL", "8"))
+
+# Perfil de armazenamento (gunicorn com vários workers no mesmo rfa.db).
+# Cada chave pode ser sobrescrita por app.config["BD_..."] (arquivo de RFA_CONFIG, carregado
+# em app.py antes de init_app; depois dele não tem efeito) ou pela variável de ambiente RFA_BD_...
+#   - WAL: leituras não esperam as escritas (logs_acessos, recados_aluno, checklist...)
+#   - synchronous=NORMAL: seguro em WAL, bem menos fsync
+#   - cache_size negativo = KiB (-16000 ~ 16 MB por conexão)
+#   - foreign_keys: padrão do SQLite (OFF), como nas conexões novas de antes do pool;
+#     quem precisa (checklist, carômetro, conselho) liga na própria conexão
+PERFIL_PADRAO = {
+    "BD_JOURNAL_MODE": "WAL",
+    "BD_SYNCHRONOUS": "NORMAL",
+    "BD_CACHE_SIZE": -16000,
+    "BD_MMAP_SIZE": 64 * 1024 * 1024,
+    "BD_TEMP_STORE": "MEMORY",
+    "BD_BUSY_TIMEOUT_MS": 10000,
+    "BD_WAL_AUTOCHECKPOINT": 1000,
+    "BD_FOREIGN_KEYS": "OFF",
+    "BD_CHECKPOINT_INTERVALO_S": 300,
+}
+
+perfil = {}
+
+
+def _carregar_perfil(config=None):
+    novo = {}
+    for chave, padrao in PERFIL_PADRAO.items():
+        valor = os.environ.get(f"RFA_{chave}", padrao)
+        if config is not None and chave in config:
+            valor = config[chave]
+        if isinstance(padrao, int):
+            valor = int(valor)
+        novo[chave] = valor
+    perfil.clear()
+    perfil.update(novo)
+
+
+_carregar_perfil()
+
+
+def pragmas_conexao():
+    """PRAGMAs aplicados na criação da conexão física (nome, valor)."""
+    return [
+        ("busy_timeout", perfil["BD_BUSY_TIMEOUT_MS"]),
+        ("synchronous", perfil["BD_SYNCHRONOUS"]),
+        ("cache_size", perfil["BD_CACHE_SIZE"]),
+        ("mmap_size", perfil["BD_MMAP_SIZE"]),
+        ("temp_store", perfil["BD_TEMP_STORE"]),
+        ("wal_autocheckpoint", perfil["BD_WAL_AUTOCHECKPOINT"]),
+        ("foreign_keys", perfil["BD_FOREIGN_KEYS"]),
+    ]
+
+_pool: "queue.LifoQueue[ConexaoPool]" = queue.LifoQueue(maxsize=POOL_TAMANHO)
+_pool_pid = os.getpid()
+_lock = threading.Lock()
+_totais = {"criadas": 0, "reutilizadas": 0, "descartadas": 0}
+
+
+class ConexaoPool(sqlite3.Connection):
+    """
+    Conexão SQLite que sabe voltar para o pool.
+
+    Os módulos do sistema abrem e fecham conexões o tempo todo (conectar_bd()/close()).
+    Aqui o close() só decrementa o contador de uso; quando ninguém mais está usando,
+    desfaz o que ficou sem commit (mesmo efeito do close() original) e, fora de uma
+    requisição, devolve a conexão ao pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._em_uso = 0
+        self._da_requisicao = False
+        self._no_pool = False
+
+    def close(self):
+        if self._em_uso > 0:
+            self._em_uso -= 1
+        if self._em_uso > 0:
+            return
+        try:
+            if self.in_transaction:
+                self.rollback()
+        except sqlite3.Error:
+            pass
+        if not self._da_requisicao and not self._no_pool:
+            _devolver(self)
+
+    def fechar_de_verdade(self):
+        super().close()
+
+
+def _configurar(conn: sqlite3.Connection):
+    cur = conn.cursor()
+    try:
+        for nome, valor in pragmas_conexao():
+            cur.execute(f"PRAGMA {nome} = {valor}")
+    finally:
+        cur.close()
+
+
+def _nova_conexao() -> ConexaoPool:
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=perfil["BD_BUSY_TIMEOUT_MS"] / 1000,
+        check_same_thread=False,
+        factory=ConexaoPool,
+    )
+    _configurar(conn)
+    with _lock:
+        _totais["criadas"] += 1
+    return conn
+
+
+def _pegar() -> ConexaoPool:
+    global _pool, _pool_pid
+    # gunicorn --preload: conexões abertas no processo mestre não podem ir para os workers
+    if _pool_pid != os.getpid():
+        with _lock:
+            if _pool_pid != os.getpid():
+                _pool = queue.LifoQueue(maxsize=POOL_TAMANHO)
+                _pool_pid = os.getpid()
+    try:
+        conn = _pool.get_nowait()
+        with _lock:
+            _totais["reutilizadas"] += 1
+    except queue.Empty:
+        conn = _nova_conexao()
+    else:
+        # PRAGMA foreign_keys é por conexão: não herda o que a requisição anterior ligou/desligou
+        try:
+            conn.execute(f"PRAGMA foreign_keys = {perfil['BD_FOREIGN_KEYS']}")
+        except sqlite3.Error:
+            conn.fechar_de_verdade()
+            conn = _nova_conexao()
+    conn.row_factory = sqlite3.Row
+    conn._em_uso = 0
+    conn._no_pool = False
+    return conn
+
+
+def _esvaziar_pool():
+    while True:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            return
+        try:
+            conn.fechar_de_verdade()
+        except sqlite3.Error:
+            pass
+
+
+def _devolver(conn: ConexaoPool):
+    conn._em_uso = 0
+    conn._da_requisicao = False
+    try:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute(f"PRAGMA foreign_keys = {perfil['BD_FOREIGN_KEYS']}")
+        _pool.put_nowait(conn)
+        conn._no_pool = True
+    except (queue.Full, sqlite3.Error):
+        with _lock:
+            _totais["descartadas"] += 1
+        try:
+            conn.fechar_de_verdade()
+        except sqlite3.Error:
+            pass
+
+
+def conectar_bd() -> sqlite3.Connection:
+    """
+    Devolve a conexão da requisição atual (criando/pegando do pool na primeira chamada).
+    Fora de um contexto Flask (inicialização, scripts), devolve uma conexão do pool
+    que volta para ele no close().
+    """
+    if not has_app_context():
+        conn = _pegar()
+        conn._em_uso = 1
+        return conn
+
+    conn = g.get("_bd_conexao")
+    if conn is None:
+        conn = _pegar()
+        conn._da_requisicao = True
+        g._bd_conexao = conn
+        g._bd_conexoes = g.get("_bd_conexoes", 0) + 1
+
+    g._bd_aberturas = g.get("_bd_aberturas", 0) + 1
+    conn.row_factory = sqlite3.Row
+    conn._em_uso += 1
+    return conn
+
+
+def conectar_bd_avulsa() -> sqlite3.Connection:
+    """
+    Conexão do pool só para quem chamou, mesmo dentro de uma requisição: transação
+    própria, que não leva junto (nem é levada por) o que a requisição deixou pendente.
+    O close() devolve ao pool.
+    """
+    conn = _pegar()
+    conn._em_uso = 1
+    return conn
+
+
+def transacao_aberta_na_requisicao() -> bool:
+    """A conexão da requisição atual tem transação sem commit/rollback?"""
+    if not has_app_context():
+        return False
+    conn = g.get("_bd_conexao")
+    return conn is not None and conn.in_transaction
+
+
+def liberar_conexao(_exc=None):
+    """Teardown: devolve a conexão da requisição ao pool."""
+    conn = g.pop("_bd_conexao", None)
+    if conn is not None:
+        _devolver(conn)
+
+
+def contadores_requisicao() -> dict:
+    """Quantas conexões físicas e quantas chamadas a conectar_bd() a requisição atual fez."""
+    return {
+        "conexoes": g.get("_bd_conexoes", 0),
+        "aberturas": g.get("_bd_aberturas", 0),
+    }
+
+
+def totais_pool() -> dict:
+    with _lock:
+        dados = dict(_totais)
+    dados["ociosas"] = _pool.qsize()
+    return dados
+
+
+def configurar_armazenamento():
+    """
+    Aplica o journal_mode do perfil no arquivo do banco (persistente: vale para todos
+    os workers) e devolve o modo efetivo. Chamado uma vez na inicialização.
+    """
+    conn = sqlite3.connect(DB_PATH, timeout=perfil["BD_BUSY_TIMEOUT_MS"] / 1000)
+    try:
+        row = conn.execute(f"PRAGMA journal_mode = {perfil['BD_JOURNAL_MODE']}").fetchone()
+        return (row[0] if row else "").lower()
+    finally:
+        conn.close()
+
+
+def checkpoint_wal(modo: str = "PASSIVE"):
+    """
+    Copia o conteúdo do -wal para o banco. PASSIVE nunca bloqueia leitores/escritores;
+    devolve (busy, paginas_no_wal, paginas_copiadas).
+    """
+    conn = conectar_bd()
+    try:
+        row = conn.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+        return tuple(row) if row else (0, 0, 0)
+    finally:
+        conn.close()
+
+
+def init_app(app):
+    """
+    Registra o ciclo de vida da conexão e o cabeçalho de diagnóstico no app,
+    e aplica o perfil de armazenamento (app.config["BD_..."]).
+    """
+    for chave, padrao in PERFIL_PADRAO.items():
+        app.config.setdefault(chave, os.environ.get(f"RFA_{chave}", padrao))
+    _carregar_perfil(app.config)
+    # conexões criadas antes (imports dos blueprints) ainda estão com os PRAGMAs antigos
+    _esvaziar_pool()
+
+    try:
+        modo = configurar_armazenamento()
+        if modo != perfil["BD_JOURNAL_MODE"].lower():
+            print(f"[BANCO] journal_mode solicitado {perfil['BD_JOURNAL_MODE']}, em uso: {modo}")
+    except sqlite3.Error as e:
+        print("[BANCO] Falha ao configurar armazenamento:", e)
+
+    @app.after_request
+    def _bd_cabecalho_contador(response):
+        c = contadores_requisicao()
+        response.headers["X-BD-Conexoes"] = str(c["conexoes"])
+        response.headers["X-BD-Aberturas"] = str(c["aberturas"])
+        return response
+
+    app.teardown_appcontext(liberar_conexao)
@@ -1,24 +1,501 @@
+import csv
+import io
+import re
 import sqlite3
+import unicodedata
+from collections import Counter
 from datetime import datetime, date, timedelta
 
+import click
 from flask import (
     Blueprint, render_template, request, redirect,
-    url_for, session, flash
+    url_for, session, flash, jsonify, Response, stream_with_context
 )
 from werkzeug.security import generate_password_hash, check_password_hash
 
+import agendador
+import indices
+from banco import DB_PATH, conectar_bd
+from migracoes import migracao
+
 # Blueprint da Biblioteca
 bp_biblioteca = Blueprint('biblioteca', __name__)
 
-DB_PATH = 'rfa.db'
+
+# ----------------- RESUMOS (INDICADORES PRÉ-CALCULADOS) ----------------- #
+# Contadores por mês, por turma e por aluno, mantidos por triggers em
+# emprestimos_biblioteca: cada INSERT/UPDATE/DELETE (registrar_emprestimo,
+# devolver_livro...) ajusta os resumos na MESMA transação. Indicadores e painel
+# leem essas poucas linhas em vez de agregar todos os empréstimos já feitos.
+#     flask --app app biblioteca reconstruir-resumos   (recalcula tudo do zero)
+
+# (tabela, coluna chave, expressão da chave com {r} = NEW/OLD)
+RESUMOS_BIBLIOTECA = [
+    ('biblioteca_resumo_mes', 'periodo TEXT', "IFNULL(substr({r}.data_emprestimo, 1, 7), '')"),
+    ('biblioteca_resumo_turma', 'turma_id INTEGER', 'IFNULL({r}.turma_id, 0)'),
+    ('biblioteca_resumo_aluno', 'aluno_id INTEGER', 'IFNULL({r}.aluno_id, 0)'),
+]
+
+# contador -> expressão (0/1) sobre a linha do empréstimo
+CONTADORES_RESUMO = [
+    ('emprestimos', '1'),
+    ('devolvidos', "CASE WHEN {r}.status = 'Devolvido' THEN 1 ELSE 0 END"),
+    ('no_prazo', "CASE WHEN {r}.status = 'Devolvido' AND {r}.devolucao_pontual = 1 THEN 1 ELSE 0 END"),
+    ('atrasados', "CASE WHEN {r}.status = 'Devolvido' AND {r}.devolucao_pontual = 0 THEN 1 ELSE 0 END"),
+]
+
+
+def _sql_ajustar_resumo(tabela, coluna, chave, r, sinal):
+    """INSERT ... ON CONFLICT que soma (sinal=+1) ou tira (-1) a linha {r} do resumo."""
+    nomes = ', '.join(nome for nome, _ in CONTADORES_RESUMO)
+    valores = ', '.join(f"{sinal} * ({expr.format(r=r)})" for _, expr in CONTADORES_RESUMO)
+    somas = ', '.join(f"{nome} = {nome} + excluded.{nome}" for nome, _ in CONTADORES_RESUMO)
+    return (
+        f"INSERT INTO {tabela} ({coluna}, {nomes}) VALUES ({chave.format(r=r)}, {valores}) "
+        f"ON CONFLICT({coluna}) DO UPDATE SET {somas};"
+    )
+
+
+def criar_resumos_biblioteca(conn):
+    colunas = ', '.join(f"{nome} INTEGER NOT NULL DEFAULT 0" for nome, _ in CONTADORES_RESUMO)
+    for tabela, coluna_def, _chave in RESUMOS_BIBLIOTECA:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {tabela} ({coluna_def} PRIMARY KEY, {colunas})")
+
+    ins, dele = [], []
+    for tabela, coluna_def, chave in RESUMOS_BIBLIOTECA:
+        coluna = coluna_def.split()[0]
+        ins.append(_sql_ajustar_resumo(tabela, coluna, chave, 'NEW', 1))
+        dele.append(_sql_ajustar_resumo(tabela, coluna, chave, 'OLD', -1))
+
+    gatilhos = [
+        ('trg_bib_resumo_ins', 'AFTER INSERT ON emprestimos_biblioteca', ins),
+        ('trg_bib_resumo_del', 'AFTER DELETE ON emprestimos_biblioteca', dele),
+        ('trg_bib_resumo_upd',
+         'AFTER UPDATE OF aluno_id, turma_id, data_emprestimo, status, devolucao_pontual ON emprestimos_biblioteca',
+         dele + ins),
+    ]
+    for nome, evento, corpo in gatilhos:
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {nome}
+            {evento}
+            BEGIN
+                {' '.join(corpo)}
+            END
+        """)
+    conn.commit()
+
+
+def reconstruir_resumos_biblioteca(conn):
+    """Recalcula os resumos a partir de emprestimos_biblioteca (uma transação)."""
+    try:
+        for tabela, coluna_def, chave in RESUMOS_BIBLIOTECA:
+            coluna = coluna_def.split()[0]
+            expr_chave = chave.format(r='e')
+            somas = ', '.join(f"SUM({expr.format(r='e')})" for _, expr in CONTADORES_RESUMO)
+            nomes = ', '.join(nome for nome, _ in CONTADORES_RESUMO)
+            conn.execute(f"DELETE FROM {tabela}")
+            conn.execute(f"""
+                INSERT INTO {tabela} ({coluna}, {nomes})
+                SELECT {expr_chave}, {somas}
+                FROM emprestimos_biblioteca e
+                GROUP BY {expr_chave}
+            """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+@migracao(8, "Resumos da biblioteca (por mês, turma e aluno) mantidos por triggers")
+def _migracao_resumos_biblioteca(conn):
+    criar_resumos_biblioteca(conn)
+    reconstruir_resumos_biblioteca(conn)
+
+
+@bp_biblioteca.cli.command('reconstruir-resumos')
+def cli_reconstruir_resumos():
+    """Recalcula biblioteca_resumo_* a partir de todos os empréstimos."""
+    conn = conectar_bd()
+    try:
+        reconstruir_resumos_biblioteca(conn)
+        total = conn.execute("SELECT IFNULL(SUM(emprestimos), 0) FROM biblioteca_resumo_mes").fetchone()[0]
+    finally:
+        conn.close()
+    click.echo(f"Resumos da biblioteca recalculados ({total} empréstimo(s)).")
+
+
+# ----------------- ATRASOS (VARREDURA DIÁRIA) ----------------- #
+# - biblioteca_atrasos: lista pronta dos empréstimos em aberto fora do prazo (painel e
+#   histórico da turma leem daqui). biblioteca_atrasos_turma: contador por turma,
+#   mantido por triggers na própria lista.
+# - A varredura diária (agendador, 00:05) marca atrasado/dias_atraso nos empréstimos
+#   em aberto (e zera os que deixaram de estar vencidos, ex.: prazo prorrogado) e refaz
+#   a lista. Entre uma varredura e outra, triggers em emprestimos_biblioteca fazem o
+#   mesmo só para a linha lançada/alterada e a tiram da lista quando devolvida/excluída.
+#     flask --app app agendador executar biblioteca_atrasos   (roda a varredura agora)
+
+_SQL_INCLUIR_ATRASO = """
+    INSERT INTO biblioteca_atrasos
+        (emprestimo_id, aluno_id, turma_id, titulo_livro, data_emprestimo, data_prevista_devolucao, dias_atraso)
+    SELECT {r}.id, {r}.aluno_id, {r}.turma_id, {r}.titulo_livro, {r}.data_emprestimo, {r}.data_prevista_devolucao,
+           CAST(julianday(date('now', 'localtime')) - julianday({r}.data_prevista_devolucao) AS INTEGER)
+    WHERE {r}.status = 'Emprestado'
+      AND {r}.data_prevista_devolucao IS NOT NULL
+      AND {r}.data_prevista_devolucao < date('now', 'localtime');
+    UPDATE emprestimos_biblioteca
+    SET atrasado = CASE WHEN {r}.data_prevista_devolucao < date('now', 'localtime') THEN 1 ELSE 0 END,
+        dias_atraso = CASE WHEN {r}.data_prevista_devolucao < date('now', 'localtime')
+                           THEN CAST(julianday(date('now', 'localtime')) - julianday({r}.data_prevista_devolucao) AS INTEGER)
+                      END
+    WHERE id = {r}.id AND {r}.status = 'Emprestado';
+"""
+
+
+def _gatilhos_atraso_emprestimo():
+    return [
+        ('trg_bib_atrasos_emp_ins', 'AFTER INSERT ON emprestimos_biblioteca',
+         _SQL_INCLUIR_ATRASO.format(r='NEW')),
+        ('trg_bib_atrasos_emp_upd',
+         'AFTER UPDATE OF status, data_prevista_devolucao, aluno_id, turma_id, titulo_livro ON emprestimos_biblioteca',
+         "DELETE FROM biblioteca_atrasos WHERE emprestimo_id = OLD.id;" + _SQL_INCLUIR_ATRASO.format(r='NEW')),
+    ]
+
+
+@migracao(10, "Atrasos da biblioteca (lista pré-calculada e contador por turma)")
+def _migracao_atrasos_biblioteca(conn):
+    colunas = {r[1] for r in conn.execute("PRAGMA table_info(emprestimos_biblioteca)").fetchall()}
+    if 'atrasado' not in colunas:
+        conn.execute("ALTER TABLE emprestimos_biblioteca ADD COLUMN atrasado INTEGER NOT NULL DEFAULT 0")
+    if 'dias_atraso' not in colunas:
+        conn.execute("ALTER TABLE emprestimos_biblioteca ADD COLUMN dias_atraso INTEGER")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS biblioteca_atrasos (
+            emprestimo_id INTEGER PRIMARY KEY,
+            aluno_id INTEGER,
+            turma_id INTEGER,
+            titulo_livro TEXT,
+            data_emprestimo TEXT,
+            data_prevista_devolucao TEXT,
+            dias_atraso INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_biblioteca_atrasos_turma ON biblioteca_atrasos (turma_id, dias_atraso)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS biblioteca_atrasos_turma (
+            turma_id INTEGER PRIMARY KEY,
+            total INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    gatilhos = [
+        ('trg_bib_atrasos_conta_ins', 'AFTER INSERT ON biblioteca_atrasos', """
+            INSERT INTO biblioteca_atrasos_turma (turma_id, total) VALUES (IFNULL(NEW.turma_id, 0), 1)
+            ON CONFLICT(turma_id) DO UPDATE SET total = total + 1;
+        """),
+        ('trg_bib_atrasos_conta_del', 'AFTER DELETE ON biblioteca_atrasos', """
+            UPDATE biblioteca_atrasos_turma SET total = total - 1 WHERE turma_id = IFNULL(OLD.turma_id, 0);
+        """),
+        *_gatilhos_atraso_emprestimo(),
+        ('trg_bib_atrasos_emp_del', 'AFTER DELETE ON emprestimos_biblioteca', """
+            DELETE FROM biblioteca_atrasos WHERE emprestimo_id = OLD.id;
+        """),
+    ]
+    for nome, evento, corpo in gatilhos:
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {nome}
+            {evento}
+            BEGIN
+                {corpo}
+            END
+        """)
+    conn.commit()
+    varrer_atrasos(conn)
+
+
+@agendador.tarefa('biblioteca_atrasos', diaria='00:05')
+def varrer_atrasos(conn, hoje: str = None):
+    """
+    Marca os empréstimos em aberto vencidos (atrasado=1, dias_atraso), zera os em aberto
+    que não estão mais vencidos e refaz a lista e os contadores por turma.
+    Uma transação; devolve quantos estão atrasados.
+    """
+    hoje = hoje or date.today().strftime('%Y-%m-%d')
+    try:
+        conn.execute("""
+            UPDATE emprestimos_biblioteca
+            SET atrasado = 0, dias_atraso = NULL
+            WHERE status = 'Emprestado'
+              AND (atrasado <> 0 OR dias_atraso IS NOT NULL)
+              AND (data_prevista_devolucao IS NULL OR data_prevista_devolucao >= ?)
+        """, (hoje,))
+        conn.execute("""
+            UPDATE emprestimos_biblioteca
+            SET atrasado = 1,
+                dias_atraso = CAST(julianday(?) - julianday(data_prevista_devolucao) AS INTEGER)
+            WHERE status = 'Emprestado'
+              AND data_prevista_devolucao IS NOT NULL
+              AND data_prevista_devolucao < ?
+        """, (hoje, hoje))
+
+        conn.execute("DELETE FROM biblioteca_atrasos")
+        # contadores recomeçam do zero (os triggers da lista somam de novo abaixo)
+        conn.execute("DELETE FROM biblioteca_atrasos_turma")
+        conn.execute("""
+            INSERT INTO biblioteca_atrasos
+                (emprestimo_id, aluno_id, turma_id, titulo_livro, data_emprestimo, data_prevista_devolucao, dias_atraso)
+            SELECT id, aluno_id, turma_id, titulo_livro, data_emprestimo, data_prevista_devolucao, dias_atraso
+            FROM emprestimos_biblioteca
+            WHERE status = 'Emprestado'
+              AND data_prevista_devolucao IS NOT NULL
+              AND data_prevista_devolucao < ?
+        """, (hoje,))
+        total = conn.execute("SELECT COUNT(*) FROM biblioteca_atrasos").fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    print(f"[BIBLIOTECA] Varredura de atrasos: {total} empréstimo(s) atrasado(s)")
+    return total
+
+
+def atrasos(c, turma_id=None, limite=None):
+    """
+    Lista pronta de atrasados (mais atrasados primeiro), com aluno e turma.
+    LEFT JOIN: empréstimo sem turma/aluno cadastrado também conta em biblioteca_atrasos_turma
+    (turma 0), então também aparece aqui.
+    """
+    sql = """
+        SELECT b.*,
+               IFNULL(a.nome, 'Aluno não encontrado') AS aluno_nome,
+               IFNULL(t.nome, 'Sem turma') AS turma_nome,
+               IFNULL(t.turno, '') AS turno
+        FROM biblioteca_atrasos b
+        LEFT JOIN alunos a ON a.id = b.aluno_id
+        LEFT JOIN turmas t ON t.id = b.turma_id
+    """
+    params = []
+    if turma_id:
+        sql += " WHERE b.turma_id = ?"
+        params.append(turma_id)
+    sql += " ORDER BY b.dias_atraso DESC, a.nome"
+    if limite:
+        sql += " LIMIT ?"
+        params.append(limite)
+    c.execute(sql, params)
+    return c.fetchall()
+
+
+@migracao(15, "Atrasos da biblioteca: triggers marcam/desmarcam o próprio empréstimo")
+def _migracao_atrasos_no_emprestimo(conn):
+    # mesmas definições da migração 10, agora com o UPDATE do empréstimo em _SQL_INCLUIR_ATRASO
+    conn.execute("DROP TRIGGER IF EXISTS trg_bib_atrasos_emp_ins")
+    conn.execute("DROP TRIGGER IF EXISTS trg_bib_atrasos_emp_upd")
+    for nome, evento, corpo in _gatilhos_atraso_emprestimo():
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {nome}
+            {evento}
+            BEGIN
+                {corpo}
+            END
+        """)
+    conn.commit()
+    varrer_atrasos(conn)
+
+
+# ----------------- CATÁLOGO DE LIVROS ----------------- #
+# - livros: um registro por título (autor, ISBN, exemplares), com titulo_normalizado
+#   (sem acento, minúsculo, só letras/números) indexado para a busca do formulário.
+# - emprestimos_biblioteca.livro_id aponta para o catálogo; triggers mantêm em livros
+#   os contadores emprestados (em aberto) e total_emprestimos. Disponíveis =
+#   exemplares - emprestados, sem percorrer os empréstimos.
+# - GET /biblioteca/api/livros?q=pequeno prin  -> [{id, titulo, autor, isbn, exemplares, disponiveis}]
+# - A migração 11 monta o catálogo a partir dos títulos já digitados nos empréstimos.
+
+LIMITE_BUSCA_LIVROS = 15
+# maior caractere possível: titulo_normalizado >= q AND < q + FIM_PREFIXO = "começa com q"
+FIM_PREFIXO = chr(0x10FFFF)
+
+
+def normalizar_titulo(texto):
+    """'O Pequeno Príncipe!' -> 'o pequeno principe' (chave de busca e agrupamento)."""
+    sem_acento = unicodedata.normalize('NFKD', texto or '')
+    sem_acento = ''.join(ch for ch in sem_acento if not unicodedata.combining(ch))
+    return ' '.join(re.findall(r'\w+', sem_acento.lower()))
+
+
+def normalizar_isbn(isbn):
+    return re.sub(r'[^0-9X]', '', (isbn or '').upper()) or None
+
+
+def recontar_livros(conn):
+    """Recalcula emprestados/total_emprestimos de todos os livros (sem commit)."""
+    conn.execute("""
+        UPDATE livros SET
+            emprestados = (SELECT COUNT(*) FROM emprestimos_biblioteca e
+                           WHERE e.livro_id = livros.id AND e.status = 'Emprestado'),
+            total_emprestimos = (SELECT COUNT(*) FROM emprestimos_biblioteca e
+                                 WHERE e.livro_id = livros.id)
+    """)
+
+
+def _contar_livro(r, sinal):
+    return (
+        f"UPDATE livros SET total_emprestimos = total_emprestimos + ({sinal}), "
+        f"emprestados = emprestados + ({sinal}) * (CASE WHEN {r}.status = 'Emprestado' THEN 1 ELSE 0 END) "
+        f"WHERE id = {r}.livro_id;"
+    )
+
+
+@migracao(11, "Catálogo de livros da biblioteca (a partir dos títulos emprestados)")
+def _migracao_livros(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS livros (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            titulo TEXT NOT NULL,
+            titulo_normalizado TEXT NOT NULL,
+            autor TEXT,
+            isbn TEXT,
+            exemplares INTEGER NOT NULL DEFAULT 1,
+            emprestados INTEGER NOT NULL DEFAULT 0,
+            total_emprestimos INTEGER NOT NULL DEFAULT 0,
+            criado_em TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_livros_titulo_normalizado ON livros (titulo_normalizado)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_livros_isbn ON livros (isbn) WHERE isbn IS NOT NULL")
+
+    colunas = {r[1] for r in conn.execute("PRAGMA table_info(emprestimos_biblioteca)").fetchall()}
+    if 'livro_id' not in colunas:
+        conn.execute("ALTER TABLE emprestimos_biblioteca ADD COLUMN livro_id INTEGER REFERENCES livros(id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_emprestimos_biblioteca_livro ON emprestimos_biblioteca (livro_id)")
+
+    # Títulos já emprestados: agrupa pela forma normalizada e fica com a grafia (e o
+    # autor) mais usados; exemplares = quantos estão emprestados ao mesmo tempo hoje.
+    grupos = {}
+    for e in conn.execute("""
+        SELECT id, titulo_livro, autor, status FROM emprestimos_biblioteca
+        WHERE livro_id IS NULL AND TRIM(IFNULL(titulo_livro, '')) <> ''
+    """).fetchall():
+        chave = normalizar_titulo(e[1])
+        if not chave:
+            continue
+        g = grupos.setdefault(chave, {'ids': [], 'titulos': Counter(), 'autores': Counter(), 'abertos': 0})
+        g['ids'].append(e[0])
+        g['titulos'][e[1].strip()] += 1
+        if (e[2] or '').strip():
+            g['autores'][e[2].strip()] += 1
+        if e[3] == 'Emprestado':
+            g['abertos'] += 1
+
+    vinculos = []
+    for chave, g in grupos.items():
+        existente = conn.execute(
+            "SELECT id FROM livros WHERE titulo_normalizado = ? ORDER BY id LIMIT 1", (chave,)
+        ).fetchone()
+        if existente:
+            livro_id = existente[0]
+        else:
+            autor = g['autores'].most_common(1)[0][0] if g['autores'] else None
+            livro_id = conn.execute(
+                "INSERT INTO livros (titulo, titulo_normalizado, autor, exemplares) VALUES (?, ?, ?, ?)",
+                (g['titulos'].most_common(1)[0][0], chave, autor, max(1, g['abertos'])),
+            ).lastrowid
+        vinculos.extend((livro_id, emp_id) for emp_id in g['ids'])
+    conn.executemany("UPDATE emprestimos_biblioteca SET livro_id = ? WHERE id = ?", vinculos)
+    recontar_livros(conn)
+
+    gatilhos = [
+        ('trg_livros_emp_ins', 'AFTER INSERT ON emprestimos_biblioteca', _contar_livro('NEW', 1)),
+        ('trg_livros_emp_del', 'AFTER DELETE ON emprestimos_biblioteca', _contar_livro('OLD', -1)),
+        ('trg_livros_emp_upd', 'AFTER UPDATE OF status, livro_id ON emprestimos_biblioteca',
+         _contar_livro('OLD', -1) + _contar_livro('NEW', 1)),
+    ]
+    for nome, evento, corpo in gatilhos:
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {nome}
+            {evento}
+            BEGIN
+                {corpo}
+            END
+        """)
+    conn.commit()
+    print(f"[BIBLIOTECA] Catálogo: {len(grupos)} título(s) a partir de {len(vinculos)} empréstimo(s)")
+
+
+def buscar_livros(c, q, limite=LIMITE_BUSCA_LIVROS):
+    """
+    Livros cujo título começa com `q` (faixa no índice de titulo_normalizado); se
+    faltar, completa com títulos que contêm `q`. ISBN digitado acha pelo ISBN.
+    """
+    colunas = "id, titulo, autor, isbn, exemplares, emprestados, exemplares - emprestados AS disponiveis"
+    chave = normalizar_titulo(q)
+    if not chave:
+        return []
+
+    isbn = normalizar_isbn(q)
+    if isbn and len(isbn) >= 10 and isbn.rstrip('X').isdigit():
+        c.execute(f"SELECT {colunas} FROM livros WHERE isbn = ?", (isbn,))
+        achados = c.fetchall()
+        if achados:
+            return achados
+
+    c.execute(f"""
+        SELECT {colunas} FROM livros
+        WHERE titulo_normalizado >= ? AND titulo_normalizado < ?
+        ORDER BY titulo_normalizado
+        LIMIT ?
+    """, (chave, chave + FIM_PREFIXO, limite))
+    achados = c.fetchall()
+    if len(achados) < limite:
+        c.execute(f"""
+            SELECT {colunas} FROM livros
+            WHERE instr(titulo_normalizado, ?) > 1
+            ORDER BY total_emprestimos DESC, titulo_normalizado
+            LIMIT ?
+        """, (chave, limite - len(achados)))
+        achados += c.fetchall()
+    return achados
+
+
+def resolver_livro(c, titulo, autor=None, livro_id=None):
+    """
+    id do livro do empréstimo: o escolhido na busca (livro_id) ou o do catálogo com o
+    mesmo título normalizado (preferindo o mesmo autor); se não houver, cadastra.
+    """
+    if livro_id:
+        c.execute("SELECT id FROM livros WHERE id = ?", (livro_id,))
+        row = c.fetchone()
+        if row:
+            return row['id']
+
+    chave = normalizar_titulo(titulo)
+    c.execute("SELECT id, autor FROM livros WHERE titulo_normalizado = ? ORDER BY id", (chave,))
+    candidatos = c.fetchall()
+    if candidatos:
+        if not autor:
+            return candidatos[0]['id']
+        autor_n = normalizar_titulo(autor)
+        for livro in candidatos:
+            if normalizar_titulo(livro['autor']) == autor_n:
+                return livro['id']
+        for livro in candidatos:
+            if not livro['autor']:
+                c.execute("UPDATE livros SET autor = ? WHERE id = ?", (autor, livro['id']))
+                return livro['id']
+
+    c.execute(
+        "INSERT INTO livros (titulo, titulo_normalizado, autor) VALUES (?, ?, ?)",
+        (titulo, chave, autor or None),
+    )
+    return c.lastrowid
 
 
 # ----------------- FUNÇÕES DE APOIO ----------------- #
 
 def conectar_bd_biblioteca():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Mesma conexão da requisição (banco.py)
+    return conectar_bd()
 
 
 # ----------------- FUNÇÕES DE APOIO ----------------- #
@@ -274,6 +751,28 @@ def atualizar_status_bibliotecario(bib_id, acao):
 
 # ----------------- PAINEL PRINCIPAL DA BIBLIOTECA ----------------- #
 
+SQL_EMPRESTIMOS_HOJE = indices.consulta_quente(
+    "biblioteca: empréstimos ativos hoje", "emprestimos_biblioteca", "emprestimos_biblioteca",
+    """
+        SELECT COUNT(*) AS total
+        FROM emprestimos_biblioteca
+        WHERE status = 'Emprestado'
+          AND data_emprestimo = ?
+    """,
+    ("2026-01-01",),
+)
+
+SQL_EMPRESTIMOS_MES = indices.consulta_quente(
+    "biblioteca: empréstimos do mês (resumo)", "biblioteca_resumo_mes", "biblioteca_resumo_mes",
+    """
+        SELECT emprestimos AS total
+        FROM biblioteca_resumo_mes
+        WHERE periodo = ?
+    """,
+    ("2026-01",),
+)
+
+
 @bp_biblioteca.route('/dashboard')
 def dashboard_biblioteca():
     if not require_bibliotecario():
@@ -281,27 +780,20 @@ def dashboard_biblioteca():
 
     hoje = date.today()
     hoje_str = hoje.strftime('%Y-%m-%d')
-    mes_str = hoje.strftime('%Y-%m')
+    inicio_mes = hoje.replace(day=1)
+    inicio_prox_mes = (inicio_mes + timedelta(days=32)).replace(day=1)
 
     conn = conectar_bd_biblioteca()
     c = conn.cursor()
 
     # Empréstimos ativos hoje
-    c.execute("""
-        SELECT COUNT(*) AS total
-        FROM emprestimos_biblioteca
-        WHERE status = 'Emprestado'
-          AND data_emprestimo = ?
-    """, (hoje_str,))
+    c.execute(SQL_EMPRESTIMOS_HOJE, (hoje_str,))
     emprestimos_hoje = c.fetchone()['total']
 
-    # Empréstimos no mês
-    c.execute("""
-        SELECT COUNT(*) AS total
-        FROM emprestimos_biblioteca
-        WHERE data_emprestimo LIKE ?
-    """, (f"{mes_str}%",))
-    emprestimos_mes = c.fetchone()['total']
+    # Empréstimos no mês (resumo pré-calculado)
+    c.execute(SQL_EMPRESTIMOS_MES, (inicio_mes.strftime('%Y-%m'),))
+    row = c.fetchone()
+    emprestimos_mes = row['total'] if row else 0
 
     # Turma com mais empréstimos nos últimos 30 dias
     data_limite = (hoje - timedelta(days=30)).strftime('%Y-%m-%d')
@@ -316,15 +808,10 @@ def dashboard_biblioteca():
     """, (data_limite,))
     turma_top = c.fetchone()
 
-    # Livros atrasados (emprestado e fora do prazo)
-    c.execute("""
-        SELECT COUNT(*) AS total
-        FROM emprestimos_biblioteca
-        WHERE status = 'Emprestado'
-          AND data_prevista_devolucao IS NOT NULL
-          AND data_prevista_devolucao < ?
-    """, (hoje_str,))
+    # Livros atrasados (contadores por turma da varredura diária)
+    c.execute("SELECT IFNULL(SUM(total), 0) AS total FROM biblioteca_atrasos_turma")
     atrasados = c.fetchone()['total']
+    lista_atrasados = atrasos(c, limite=10)
 
     c.close()
     conn.close()
@@ -334,7 +821,8 @@ def dashboard_biblioteca():
         emprestimos_hoje=emprestimos_hoje,
         emprestimos_mes=emprestimos_mes,
         turma_top=turma_top,
-        atrasados=atrasados
+        atrasados=atrasados,
+        lista_atrasados=lista_atrasados
     )
 
 
@@ -378,6 +866,7 @@ def registrar_emprestimo():
         autor = request.form.get('autor', '').strip()
         codigo = request.form.get('codigo', '').strip()
         data_prevista = request.form.get('data_prevista')
+        livro_id = request.form.get('livro_id', type=int)
 
         if not turma_id or not aluno_id or not titulo:
             flash("Selecione turma, aluno e informe o título do livro.")
@@ -387,18 +876,24 @@ def registrar_emprestimo():
 
         conn = conectar_bd_biblioteca()
         c = conn.cursor()
+        livro_id = resolver_livro(c, titulo, autor, livro_id)
         c.execute("""
             INSERT INTO emprestimos_biblioteca
             (aluno_id, turma_id, titulo_livro, autor, codigo_interno,
-             data_emprestimo, data_prevista_devolucao, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, 'Emprestado')
+             data_emprestimo, data_prevista_devolucao, status, livro_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 'Emprestado', ?)
         """, (aluno_id, turma_id, titulo, autor or None, codigo or None,
-              hoje_str, data_prevista or None))
+              hoje_str, data_prevista or None, livro_id))
+        c.execute("SELECT exemplares - emprestados AS disponiveis FROM livros WHERE id = ?", (livro_id,))
+        disponiveis = c.fetchone()['disponiveis']
         conn.commit()
         c.close()
         conn.close()
 
         flash("Empréstimo registrado com sucesso.")
+        if disponiveis < 0:
+            flash("Atenção: o catálogo tem menos exemplares deste livro do que empréstimos em aberto. "
+                  "Confira a quantidade em Catálogo de Livros.")
         return redirect(url_for('biblioteca.registrar_emprestimo'))
 
     return render_template(
@@ -408,17 +903,122 @@ def registrar_emprestimo():
     )
 
 
-# ----------------- REGISTRAR DEVOLUÇÃO ----------------- #
+@bp_biblioteca.route('/api/livros')
+def api_buscar_livros():
+    if not require_bibliotecario():
+        return jsonify({"ok": False, "error": "Acesso não autorizado"}), 403
 
-@bp_biblioteca.route('/emprestimos/devolucao', methods=['GET'])
-def registrar_devolucao():
+    q = (request.args.get('q') or '').strip()
+    conn = conectar_bd_biblioteca()
+    c = conn.cursor()
+    try:
+        return jsonify([dict(r) for r in buscar_livros(c, q)])
+    finally:
+        c.close()
+        conn.close()
+
+
+# ----------------- CATÁLOGO DE LIVROS (TELA) ----------------- #
+
+@bp_biblioteca.route('/livros', methods=['GET', 'POST'])
+def catalogo_livros():
     if not require_bibliotecario():
         return redirect(url_for('biblioteca.login_biblioteca'))
 
-    termo = (request.args.get('termo') or '').strip()
+    if request.method == 'POST':
+        titulo = request.form.get('titulo', '').strip()
+        autor = request.form.get('autor', '').strip()
+        isbn = normalizar_isbn(request.form.get('isbn'))
+        exemplares = max(1, request.form.get('exemplares', type=int) or 1)
+
+        if not normalizar_titulo(titulo):
+            flash("Informe o título do livro.")
+            return redirect(url_for('biblioteca.catalogo_livros'))
+
+        conn = conectar_bd_biblioteca()
+        c = conn.cursor()
+        try:
+            c.execute("""
+                INSERT INTO livros (titulo, titulo_normalizado, autor, isbn, exemplares)
+                VALUES (?, ?, ?, ?, ?)
+            """, (titulo, normalizar_titulo(titulo), autor or None, isbn, exemplares))
+            conn.commit()
+            flash("Livro cadastrado no catálogo.")
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            flash("Já existe um livro com esse ISBN no catálogo.")
+        finally:
+            c.close()
+            conn.close()
+        return redirect(url_for('biblioteca.catalogo_livros', q=titulo))
+
+    termo = (request.args.get('q') or '').strip()
 
     conn = conectar_bd_biblioteca()
     c = conn.cursor()
+    if termo:
+        livros = buscar_livros(c, termo, limite=100)
+    else:
+        c.execute("""
+            SELECT id, titulo, autor, isbn, exemplares, emprestados,
+                   exemplares - emprestados AS disponiveis
+            FROM livros
+            ORDER BY titulo_normalizado
+            LIMIT 100
+        """)
+        livros = c.fetchall()
+    c.execute("SELECT COUNT(*) AS titulos, IFNULL(SUM(exemplares), 0) AS exemplares FROM livros")
+    totais = c.fetchone()
+    c.close()
+    conn.close()
+
+    return render_template(
+        'biblioteca_livros.html',
+        livros=livros,
+        termo=termo,
+        total_titulos=totais['titulos'],
+        total_exemplares=totais['exemplares']
+    )
+
+
+@bp_biblioteca.route('/livros/<int:livro_id>', methods=['POST'])
+def atualizar_livro(livro_id):
+    if not require_bibliotecario():
+        return redirect(url_for('biblioteca.login_biblioteca'))
+
+    titulo = request.form.get('titulo', '').strip()
+    autor = request.form.get('autor', '').strip()
+    isbn = normalizar_isbn(request.form.get('isbn'))
+    exemplares = max(1, request.form.get('exemplares', type=int) or 1)
+    termo = request.form.get('q', '')
+
+    if not normalizar_titulo(titulo):
+        flash("Informe o título do livro.")
+        return redirect(url_for('biblioteca.catalogo_livros', q=termo))
+
+    conn = conectar_bd_biblioteca()
+    c = conn.cursor()
+    try:
+        c.execute("""
+            UPDATE livros
+            SET titulo = ?, titulo_normalizado = ?, autor = ?, isbn = ?, exemplares = ?
+            WHERE id = ?
+        """, (titulo, normalizar_titulo(titulo), autor or None, isbn, exemplares, livro_id))
+        conn.commit()
+        flash("Livro atualizado." if c.rowcount else "Livro não encontrado.")
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        flash("Já existe um livro com esse ISBN no catálogo.")
+    finally:
+        c.close()
+        conn.close()
+    return redirect(url_for('biblioteca.catalogo_livros', q=termo))
+
+
+# ----------------- REGISTRAR DEVOLUÇÃO ----------------- #
+
+def _sql_devolucoes_pendentes(termo: str):
+    """Empréstimos em aberto (busca opcional por aluno/título) -> (sql, params)."""
     query = """
         SELECT e.*, a.nome AS aluno_nome, t.nome AS turma_nome, t.turno
         FROM emprestimos_biblioteca e
@@ -433,7 +1033,25 @@ def registrar_devolucao():
         params.extend([like, like])
 
     query += " ORDER BY e.data_emprestimo DESC"
-    c.execute(query, params)
+    return query, params
+
+
+indices.consulta_quente(
+    "biblioteca: devoluções pendentes", "emprestimos_biblioteca", "e",
+    lambda cur: cur.execute(*_sql_devolucoes_pendentes("")),
+)
+
+
+@bp_biblioteca.route('/emprestimos/devolucao', methods=['GET'])
+def registrar_devolucao():
+    if not require_bibliotecario():
+        return redirect(url_for('biblioteca.login_biblioteca'))
+
+    termo = (request.args.get('termo') or '').strip()
+
+    conn = conectar_bd_biblioteca()
+    c = conn.cursor()
+    c.execute(*_sql_devolucoes_pendentes(termo))
     emprestimos = c.fetchall()
     c.close()
     conn.close()
@@ -470,18 +1088,21 @@ def devolver_livro(emprestimo_id):
 
     data_prevista = row['data_prevista_devolucao']
     devolucao_pontual = None
+    dias_atraso = None
     if data_prevista:
         try:
             data_prev = datetime.strptime(data_prevista, '%Y-%m-%d').date()
             devolucao_pontual = 1 if hoje <= data_prev else 0
+            dias_atraso = max(0, (hoje - data_prev).days)
         except ValueError:
             devolucao_pontual = None
 
     c.execute("""
         UPDATE emprestimos_biblioteca
-        SET data_devolucao = ?, status = 'Devolvido', devolucao_pontual = ?
+        SET data_devolucao = ?, status = 'Devolvido', devolucao_pontual = ?,
+            atrasado = ?, dias_atraso = ?
         WHERE id = ?
-    """, (hoje_str, devolucao_pontual, emprestimo_id))
+    """, (hoje_str, devolucao_pontual, 1 if dias_atraso else 0, dias_atraso, emprestimo_id))
     conn.commit()
     c.close()
     conn.close()
@@ -490,6 +1111,133 @@ def devolver_livro(emprestimo_id):
     return redirect(url_for('biblioteca.registrar_devolucao'))
 
 
+# ----------------- HISTÓRICO: PÁGINAS E CSV ----------------- #
+# - As telas de histórico mostram HISTORICO_POR_PAGINA empréstimos por vez, do mais
+#   recente para o mais antigo. A página seguinte continua de onde a anterior parou
+#   (?antes=<data_emprestimo>_<id> do último da página) em vez de OFFSET: a consulta
+#   desce direto pelo índice (aluno_id|turma_id, data_emprestimo), qualquer que seja a página.
+# - Os totais vêm de biblioteca_resumo_aluno / biblioteca_resumo_turma.
+# - /historico/estudante/csv e /historico/turma/csv escrevem o histórico completo
+#   linha a linha direto do cursor (resposta em streaming, sem montar a lista).
+
+HISTORICO_POR_PAGINA = 50
+CSV_LINHAS_POR_BLOCO = 200
+
+# filtro da tela -> coluna de emprestimos_biblioteca
+_FILTROS_HISTORICO = {'aluno': 'aluno_id', 'turma': 'turma_id'}
+
+_SQL_HISTORICO = """
+    SELECT e.*, a.nome AS aluno_nome
+    FROM emprestimos_biblioteca e
+    JOIN alunos a ON a.id = e.aluno_id
+    WHERE e.{coluna} = ?{continuar}
+    ORDER BY e.data_emprestimo DESC, e.id DESC
+"""
+
+
+def _ler_marcador(antes):
+    """'2026-03-10_812' -> ('2026-03-10', 812); None se vazio/inválido."""
+    data, _, emp_id = (antes or '').rpartition('_')
+    if not data or not emp_id.isdigit():
+        return None
+    return data, int(emp_id)
+
+
+def pagina_historico(c, filtro, valor, antes=None, por_pagina=HISTORICO_POR_PAGINA):
+    """
+    Uma página do histórico (aluno ou turma) a partir do marcador `antes`.
+    Devolve (linhas, marcador da próxima página ou None).
+    """
+    marcador = _ler_marcador(antes)
+    sql = _SQL_HISTORICO.format(
+        coluna=_FILTROS_HISTORICO[filtro],
+        continuar=' AND (e.data_emprestimo, e.id) < (?, ?)' if marcador else '',
+    )
+    c.execute(sql + " LIMIT ?", [valor, *(marcador or ()), por_pagina + 1])
+    linhas = c.fetchall()
+    if len(linhas) <= por_pagina:
+        return linhas, None
+    linhas = linhas[:por_pagina]
+    ultimo = linhas[-1]
+    return linhas, f"{ultimo['data_emprestimo']}_{ultimo['id']}"
+
+
+indices.consulta_quente(
+    "biblioteca: histórico do estudante (página seguinte)", "emprestimos_biblioteca", "e",
+    lambda cur: pagina_historico(cur, 'aluno', 1, '2026-01-01_100'),
+)
+indices.consulta_quente(
+    "biblioteca: histórico da turma", "emprestimos_biblioteca", "e",
+    lambda cur: pagina_historico(cur, 'turma', 1),
+)
+
+
+def _data_br(valor):
+    return f"{valor[8:10]}/{valor[5:7]}/{valor[0:4]}" if valor and len(valor) >= 10 else (valor or '')
+
+
+def _situacao(e):
+    if e['status'] != 'Devolvido':
+        return 'Atrasado' if e['atrasado'] else ''
+    return {1: 'No prazo', 0: 'Atrasado'}.get(e['devolucao_pontual'], '')
+
+
+def _csv_historico(filtro, valor, nome_arquivo):
+    def gerar():
+        conn = conectar_bd_biblioteca()
+        c = conn.cursor()
+        buf = io.StringIO()
+        escritor = csv.writer(buf, delimiter=';')
+        buf.write('\ufeff')  # BOM: o Excel abre com acentos certos
+        escritor.writerow(['Aluno', 'Livro', 'Autor', 'Empréstimo', 'Previsto', 'Devolução', 'Status', 'Situação'])
+        try:
+            c.execute(_SQL_HISTORICO.format(coluna=_FILTROS_HISTORICO[filtro], continuar=''), (valor,))
+            for n, e in enumerate(c, 1):
+                escritor.writerow([
+                    e['aluno_nome'], e['titulo_livro'], e['autor'] or '',
+                    _data_br(e['data_emprestimo']), _data_br(e['data_prevista_devolucao']),
+                    _data_br(e['data_devolucao']), e['status'], _situacao(e),
+                ])
+                if n % CSV_LINHAS_POR_BLOCO == 0:
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+            yield buf.getvalue()
+        finally:
+            c.close()
+            conn.close()
+
+    return Response(
+        stream_with_context(gerar()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{nome_arquivo}"'},
+    )
+
+
+@bp_biblioteca.route('/historico/estudante/csv')
+def historico_estudante_csv():
+    if not require_bibliotecario():
+        return redirect(url_for('biblioteca.login_biblioteca'))
+
+    aluno_id = request.args.get('aluno_id', type=int)
+    if not aluno_id:
+        flash("Selecione o estudante para exportar o histórico.")
+        return redirect(url_for('biblioteca.historico_estudante'))
+    return _csv_historico('aluno', aluno_id, f"historico_biblioteca_aluno_{aluno_id}.csv")
+
+
+@bp_biblioteca.route('/historico/turma/csv')
+def historico_turma_csv():
+    if not require_bibliotecario():
+        return redirect(url_for('biblioteca.login_biblioteca'))
+
+    turma_id = request.args.get('turma_id', type=int)
+    if not turma_id:
+        flash("Selecione a turma para exportar o histórico.")
+        return redirect(url_for('biblioteca.historico_turma'))
+    return _csv_historico('turma', turma_id, f"historico_biblioteca_turma_{turma_id}.csv")
+
+
 # ----------------- HISTÓRICO POR ESTUDANTE ----------------- #
 
 @bp_biblioteca.route('/historico/estudante', methods=['GET', 'POST'])
@@ -503,28 +1251,18 @@ def historico_estudante():
     c.execute("SELECT id, nome, turno FROM turmas ORDER BY turno, nome")
     turmas = c.fetchall()
 
-    c.execute("""
-        SELECT a.id, a.nome, a.turma_id
-        FROM alunos a
-        ORDER BY a.nome
-    """)
-    alunos = c.fetchall()
-
-    alunos_por_turma = {}
-    for al in alunos:
-        tid = al['turma_id']
-        alunos_por_turma.setdefault(tid, []).append({
-            'id': al['id'],
-            'nome': al['nome']
-        })
+    # alunos: carregados por turma / busca pelo nome (/api/alunos/buscar)
 
     historico = []
     total_lidos = 0
     atrasos = 0
     aluno_nome = None
     turma_info = None
+    turma_id_selecionada = None
 
     aluno_id = None
+    proxima_pagina = None
+    antes = request.args.get('antes')
 
     if request.method == 'POST':
         aluno_id = request.form.get('aluno_id')
@@ -533,7 +1271,7 @@ def historico_estudante():
 
     if aluno_id:
         c.execute("""
-            SELECT a.nome AS aluno_nome, t.nome AS turma_nome, t.turno
+            SELECT a.nome AS aluno_nome, a.turma_id, t.nome AS turma_nome, t.turno
             FROM alunos a
             JOIN turmas t ON t.id = a.turma_id
             WHERE a.id = ?
@@ -542,24 +1280,19 @@ def historico_estudante():
         if info:
             aluno_nome = info['aluno_nome']
             turma_info = f"{info['turma_nome']} - {info['turno']}"
+            turma_id_selecionada = info['turma_id']
 
-        c.execute("""
-            SELECT *
-            FROM emprestimos_biblioteca
-            WHERE aluno_id = ?
-            ORDER BY data_emprestimo DESC
-        """, (aluno_id,))
-        historico = c.fetchall()
-        total_lidos = len(historico)
+        historico, proxima_pagina = pagina_historico(c, 'aluno', aluno_id, antes)
 
         c.execute("""
-            SELECT COUNT(*) AS total
-            FROM emprestimos_biblioteca
+            SELECT emprestimos, atrasados
+            FROM biblioteca_resumo_aluno
             WHERE aluno_id = ?
-              AND status = 'Devolvido'
-              AND devolucao_pontual = 0
         """, (aluno_id,))
-        atrasos = c.fetchone()['total']
+        resumo = c.fetchone()
+        if resumo:
+            total_lidos = resumo['emprestimos']
+            atrasos = resumo['atrasados']
 
     c.close()
     conn.close()
@@ -567,13 +1300,15 @@ def historico_estudante():
     return render_template(
         'biblioteca_historico_estudante.html',
         turmas=turmas,
-        alunos_por_turma=alunos_por_turma,
+        turma_id_selecionada=turma_id_selecionada,
         historico=historico,
         aluno_nome=aluno_nome,
         turma_info=turma_info,
         total_lidos=total_lidos,
         atrasos=atrasos,
-        aluno_id_selecionado=aluno_id
+        aluno_id_selecionado=aluno_id,
+        pagina_seguinte=proxima_pagina,
+        pagina_inicial=not antes
     )
 
 
@@ -598,8 +1333,11 @@ def historico_turma():
 
     historico = []
     resumo_alunos = []
+    atrasados_turma = []
     turma_info = None
     total_emprestimos = 0
+    proxima_pagina = None
+    antes = request.args.get('antes')
 
     if turma_id:
         c.execute("""
@@ -609,16 +1347,12 @@ def historico_turma():
         if tinfo:
             turma_info = f"{tinfo['nome']} - {tinfo['turno']}"
 
-        # Histórico detalhado da turma
-        c.execute("""
-            SELECT e.*, a.nome AS aluno_nome
-            FROM emprestimos_biblioteca e
-            JOIN alunos a ON a.id = e.aluno_id
-            WHERE e.turma_id = ?
-            ORDER BY e.data_emprestimo DESC
-        """, (turma_id,))
-        historico = c.fetchall()
-        total_emprestimos = len(historico)
+        # Histórico detalhado da turma (uma página)
+        historico, proxima_pagina = pagina_historico(c, 'turma', turma_id, antes)
+
+        c.execute("SELECT emprestimos FROM biblioteca_resumo_turma WHERE turma_id = ?", (turma_id,))
+        resumo = c.fetchone()
+        total_emprestimos = resumo['emprestimos'] if resumo else 0
 
         # Ranking de alunos da turma
         c.execute("""
@@ -631,6 +1365,8 @@ def historico_turma():
         """, (turma_id,))
         resumo_alunos = c.fetchall()
 
+        atrasados_turma = atrasos(c, turma_id=turma_id)
+
     c.close()
     conn.close()
 
@@ -641,7 +1377,10 @@ def historico_turma():
         turma_info=turma_info,
         historico=historico,
         resumo_alunos=resumo_alunos,
-        total_emprestimos=total_emprestimos
+        atrasados_turma=atrasados_turma,
+        total_emprestimos=total_emprestimos,
+        pagina_seguinte=proxima_pagina,
+        pagina_inicial=not antes
     )
 
 
@@ -655,42 +1394,29 @@ def indicadores_biblioteca():
     conn = conectar_bd_biblioteca()
     c = conn.cursor()
 
-    # Totais
-    c.execute("SELECT COUNT(*) AS total FROM emprestimos_biblioteca")
-    total_emprestimos = c.fetchone()['total']
-
+    # Totais (somados dos resumos por mês: uma linha por mês, não por empréstimo)
     c.execute("""
-        SELECT COUNT(*) AS total
-        FROM emprestimos_biblioteca
-        WHERE status = 'Devolvido'
-    """)
-    total_devolvidos = c.fetchone()['total']
-
-    c.execute("""
-        SELECT COUNT(*) AS total
-        FROM emprestimos_biblioteca
-        WHERE status = 'Devolvido'
-          AND devolucao_pontual = 1
+        SELECT IFNULL(SUM(emprestimos), 0) AS total,
+               IFNULL(SUM(devolvidos), 0) AS devolvidos,
+               IFNULL(SUM(no_prazo), 0) AS no_prazo,
+               IFNULL(SUM(atrasados), 0) AS atrasados
+        FROM biblioteca_resumo_mes
     """)
-    devolvidos_prazo = c.fetchone()['total']
-
-    c.execute("""
-        SELECT COUNT(*) AS total
-        FROM emprestimos_biblioteca
-        WHERE status = 'Devolvido'
-          AND devolucao_pontual = 0
-    """)
-    devolvidos_atraso = c.fetchone()['total']
+    totais = c.fetchone()
+    total_emprestimos = totais['total']
+    total_devolvidos = totais['devolvidos']
+    devolvidos_prazo = totais['no_prazo']
+    devolvidos_atraso = totais['atrasados']
 
     # Médias
-    c.execute("SELECT COUNT(DISTINCT aluno_id) AS qtd FROM emprestimos_biblioteca")
+    c.execute("SELECT COUNT(*) AS qtd FROM biblioteca_resumo_aluno WHERE emprestimos > 0")
     alunos_distintos = c.fetchone()['qtd'] or 0
 
     media_por_estudante = 0
     if alunos_distintos > 0:
         media_por_estudante = round(total_emprestimos / alunos_distintos, 2)
 
-    c.execute("SELECT COUNT(DISTINCT turma_id) AS qtd FROM emprestimos_biblioteca")
+    c.execute("SELECT COUNT(*) AS qtd FROM biblioteca_resumo_turma WHERE emprestimos > 0")
     turmas_distintas = c.fetchone()['qtd'] or 0
 
     media_por_turma = 0
@@ -699,38 +1425,48 @@ def indicadores_biblioteca():
 
     # Rankings
     c.execute("""
-        SELECT t.nome AS turma_nome, t.turno, COUNT(*) AS total
-        FROM emprestimos_biblioteca e
-        JOIN turmas t ON t.id = e.turma_id
-        GROUP BY e.turma_id
+        SELECT t.nome AS turma_nome, t.turno, r.emprestimos AS total
+        FROM biblioteca_resumo_turma r
+        JOIN turmas t ON t.id = r.turma_id
+        WHERE r.emprestimos > 0
         ORDER BY total DESC
         LIMIT 5
     """)
     ranking_turmas = c.fetchall()
 
     c.execute("""
-        SELECT a.nome AS aluno_nome, t.nome AS turma_nome, COUNT(*) AS total
-        FROM emprestimos_biblioteca e
-        JOIN alunos a ON a.id = e.aluno_id
-        JOIN turmas t ON t.id = e.turma_id
-        GROUP BY e.aluno_id
+        SELECT a.nome AS aluno_nome, t.nome AS turma_nome, r.emprestimos AS total
+        FROM biblioteca_resumo_aluno r
+        JOIN alunos a ON a.id = r.aluno_id
+        JOIN turmas t ON t.id = a.turma_id
+        WHERE r.emprestimos > 0
         ORDER BY total DESC, aluno_nome
         LIMIT 5
     """)
     ranking_alunos = c.fetchall()
 
+    c.execute("""
+        SELECT titulo, autor, total_emprestimos, exemplares,
+               exemplares - emprestados AS disponiveis
+        FROM livros
+        WHERE total_emprestimos > 0
+        ORDER BY total_emprestimos DESC, titulo_normalizado
+        LIMIT 5
+    """)
+    ranking_livros = c.fetchall()
+
     # Empréstimos por mês (converter Row -> dict)
     c.execute("""
-        SELECT substr(data_emprestimo, 1, 7) AS periodo, COUNT(*) AS total
-        FROM emprestimos_biblioteca
-        GROUP BY periodo
+        SELECT periodo, emprestimos AS total
+        FROM biblioteca_resumo_mes
+        WHERE emprestimos > 0
         ORDER BY periodo
     """)
     rows = c.fetchall()
     emprestimos_por_mes = [
         {"periodo": row["periodo"], "total": row["total"]}
         for row in rows
-        if row["periodo"] is not None
+        if row["periodo"]
     ]
 
     c.close()
@@ -746,6 +1482,7 @@ def indicadores_biblioteca():
         media_por_turma=media_por_turma,
         ranking_turmas=ranking_turmas,
         ranking_alunos=ranking_alunos,
+        ranking_livros=ranking_livros,
         emprestimos_por_mes=emprestimos_por_mes
     )
 
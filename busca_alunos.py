@@ -0,0 +1,167 @@
+# busca_alunos.py
+# Busca de estudantes pelo nome (sem acento / maiúsculas) para os seletores das telas
+#
+# - alunos_busca: tabela FTS5 (tokenizer unicode61 remove_diacritics) sobre alunos.nome,
+#   com conteúdo externo (não duplica os nomes) e mantida pelos triggers da migração 7.
+# - GET /api/alunos/buscar?q=jo sil[&turma_id=3][&limite=20]
+#     -> [{id, nome, turma_id, turma, turno}]  (cada palavra vale como prefixo: "jo" acha "João")
+#   Só turma_id, sem q: os alunos daquela turma (substitui as listas da escola inteira
+#   que as páginas embutiam no HTML).
+# - Se o SQLite do servidor não tiver FTS5, a busca cai em LIKE (com acento, mas funciona).
+
+import re
+import sqlite3
+
+from flask import Blueprint, jsonify, request, session
+
+import indices
+from banco import conectar_bd
+from migracoes import migracao
+
+bp_busca_alunos = Blueprint("busca_alunos", __name__)
+
+LIMITE_PADRAO = 20
+LIMITE_MAXIMO = 50
+LIMITE_TURMA = 200  # só turma_id (lista completa da turma)
+
+RE_PALAVRA = re.compile(r"\w+", re.UNICODE)
+
+# Alunos de uma turma por nome: seletores de quase todas as telas (app, conselho, soe)
+SQL_ALUNOS_DA_TURMA = indices.consulta_quente(
+    "alunos da turma", "alunos", "alunos",
+    "SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome", (1,),
+)
+
+TRIGGERS_BUSCA = [
+    ("trg_alunos_busca_ins", "AFTER INSERT ON alunos", """
+        INSERT INTO alunos_busca (rowid, nome) VALUES (NEW.id, NEW.nome);
+    """),
+    ("trg_alunos_busca_del", "AFTER DELETE ON alunos", """
+        INSERT INTO alunos_busca (alunos_busca, rowid, nome) VALUES ('delete', OLD.id, OLD.nome);
+    """),
+    ("trg_alunos_busca_upd", "AFTER UPDATE OF nome ON alunos", """
+        INSERT INTO alunos_busca (alunos_busca, rowid, nome) VALUES ('delete', OLD.id, OLD.nome);
+        INSERT INTO alunos_busca (rowid, nome) VALUES (NEW.id, NEW.nome);
+    """),
+]
+
+
+@migracao(7, "Índice FTS5 de nomes de alunos (busca sem acento)")
+def _migracao_alunos_busca(conn):
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS alunos_busca USING fts5(
+                nome,
+                content='alunos',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        # SQLite sem FTS5: a busca usa LIKE (ver buscar())
+        print(f"[BUSCA_ALUNOS] FTS5 indisponível ({e}); busca por LIKE.")
+        return
+    for nome, evento, corpo in TRIGGERS_BUSCA:
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {nome}
+            {evento}
+            BEGIN
+                {corpo}
+            END
+        """)
+    conn.execute("INSERT INTO alunos_busca (alunos_busca) VALUES ('rebuild')")
+    conn.commit()
+
+
+# =========================
+# Consulta
+# =========================
+
+_tem_fts = None
+
+
+def _fts_disponivel(conn) -> bool:
+    global _tem_fts
+    if _tem_fts is None:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alunos_busca'"
+        ).fetchone()
+        _tem_fts = row is not None
+    return _tem_fts
+
+
+def _expressao_fts(palavras) -> str:
+    # cada palavra entre aspas (nada de sintaxe FTS vinda do usuário) e como prefixo
+    return " ".join(f'"{p}"*' for p in palavras)
+
+
+def buscar(conn, q: str, turma_id=None, limite: int = LIMITE_PADRAO) -> list:
+    """Alunos cujo nome contém todas as palavras de `q` (como prefixo), com a turma."""
+    palavras = RE_PALAVRA.findall(q or "")
+    filtro_turma = " AND a.turma_id = ?" if turma_id else ""
+    extra = [turma_id] if turma_id else []
+
+    if not palavras:
+        if not turma_id:
+            return []
+        rows = conn.execute(f"""
+            SELECT a.id, a.nome, a.turma_id, t.nome AS turma, t.turno
+            FROM alunos a
+            LEFT JOIN turmas t ON t.id = a.turma_id
+            WHERE 1 = 1{filtro_turma}
+            ORDER BY a.nome
+            LIMIT ?
+        """, extra + [limite]).fetchall()
+    elif _fts_disponivel(conn):
+        rows = conn.execute(f"""
+            SELECT a.id, a.nome, a.turma_id, t.nome AS turma, t.turno
+            FROM alunos_busca b
+            JOIN alunos a ON a.id = b.rowid
+            LEFT JOIN turmas t ON t.id = a.turma_id
+            WHERE alunos_busca MATCH ?{filtro_turma}
+            ORDER BY b.rank, a.nome
+            LIMIT ?
+        """, [_expressao_fts(palavras)] + extra + [limite]).fetchall()
+    else:
+        condicoes = " AND ".join("a.nome LIKE ?" for _ in palavras)
+        rows = conn.execute(f"""
+            SELECT a.id, a.nome, a.turma_id, t.nome AS turma, t.turno
+            FROM alunos a
+            LEFT JOIN turmas t ON t.id = a.turma_id
+            WHERE {condicoes}{filtro_turma}
+            ORDER BY a.nome
+            LIMIT ?
+        """, [f"%{p}%" for p in palavras] + extra + [limite]).fetchall()
+
+    return [dict(r) for r in rows]
+
+
+def _pode_buscar() -> bool:
+    # quem tem seletor de estudantes: moderação (inclui SOE/atestados) e biblioteca
+    if "usuario" in session and session.get("tipo") == "moderador":
+        return True
+    return session.get("biblioteca_logado") is True
+
+
+# =========================
+# Rota
+# =========================
+
+@bp_busca_alunos.route("/api/alunos/buscar")
+def buscar_alunos():
+    if not _pode_buscar():
+        return jsonify({"ok": False, "error": "Acesso não autorizado"}), 403
+
+    q = (request.args.get("q") or "").strip()
+    turma_id = request.args.get("turma_id", type=int)
+    limite = request.args.get("limite", type=int)
+    if q:
+        limite = max(1, min(limite or LIMITE_PADRAO, LIMITE_MAXIMO))
+    else:
+        limite = max(1, min(limite or LIMITE_TURMA, LIMITE_TURMA))
+
+    conn = conectar_bd()
+    try:
+        return jsonify(buscar(conn, q, turma_id=turma_id, limite=limite))
+    finally:
+        conn.close()
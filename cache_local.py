@@ -0,0 +1,131 @@
+# cache_local.py
+# Cache em memória (por worker) invalidado por VERSÃO guardada no próprio rfa.db
+#
+# Como cada worker do gunicorn tem sua própria memória, não dá para "avisar" os outros
+# quando um dado muda. Em vez disso:
+#   - a tabela cache_versoes guarda um contador por escopo (ex.: 'turma:12');
+#   - triggers (ou o próprio código de escrita) incrementam o contador;
+#   - cada entrada do cache lembra a versão com que foi montada; se a versão atual
+#     for diferente, a entrada é descartada e remontada.
+# Ler uma versão é uma consulta por chave primária: bem mais barato que remontar a página.
+# CacheLRU (sem versão) é para chaves que já identificam o conteúdo (ex.: hash de arquivo).
+
+import threading
+import time
+from collections import OrderedDict
+
+from migracoes import migracao
+
+
+@migracao(3, "Tabela cache_versoes (invalidação de cache entre workers)")
+def _migracao_cache_versoes(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cache_versoes (
+            escopo TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.commit()
+
+
+def sql_incrementar(escopo_sql: str, origem: str = "") -> str:
+    """
+    Trecho SQL (para usar dentro de triggers) que incrementa a versão de um escopo.
+    escopo_sql é uma expressão SQL, ex.: "'turma:' || NEW.turma_id".
+    origem (opcional) é um "FROM ... WHERE ..." quando o escopo vem de outra tabela.
+    """
+    if origem:
+        return (
+            f"INSERT INTO cache_versoes (escopo, versao) SELECT {escopo_sql}, 1 {origem} "
+            f"ON CONFLICT(escopo) DO UPDATE SET versao = versao + 1;"
+        )
+    return (
+        f"INSERT INTO cache_versoes (escopo, versao) VALUES ({escopo_sql}, 1) "
+        f"ON CONFLICT(escopo) DO UPDATE SET versao = versao + 1;"
+    )
+
+
+def versao(conn, escopo: str) -> int:
+    row = conn.execute("SELECT versao FROM cache_versoes WHERE escopo = ?", (escopo,)).fetchone()
+    return row[0] if row else 0
+
+
+def incrementar(conn, escopo: str):
+    """Para escritas feitas pelo código (sem trigger). Não faz commit."""
+    conn.execute(sql_incrementar("?"), (escopo,))
+
+
+class CacheVersionado:
+    """
+    LRU pequeno com validade por versão (e, opcionalmente, por tempo).
+    get() devolve None se não existir, se a versão mudou ou se expirou.
+    """
+
+    def __init__(self, max_itens: int = 256, ttl_s: float = 0):
+        self.max_itens = max_itens
+        self.ttl_s = ttl_s
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def get(self, chave, versao_atual):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                self.falhas += 1
+                return None
+            ver, criado, valor = item
+            if ver != versao_atual or (self.ttl_s and time.monotonic() - criado > self.ttl_s):
+                del self._dados[chave]
+                self.falhas += 1
+                return None
+            self._dados.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def set(self, chave, versao_atual, valor):
+        with self._lock:
+            self._dados[chave] = (versao_atual, time.monotonic(), valor)
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+
+
+class CacheLRU:
+    """
+    LRU pequeno, só limitado por quantidade (por worker, sem invalidação entre workers).
+    Para chaves que já identificam o conteúdo: a entrada nunca fica desatualizada.
+    """
+
+    def __init__(self, max_itens: int = 256):
+        self.max_itens = max_itens
+        self._dados = OrderedDict()
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+
+    def get(self, chave):
+        with self._lock:
+            valor = self._dados.get(chave)
+            if valor is None:
+                self.falhas += 1
+                return None
+            self._dados.move_to_end(chave)
+            self.acertos += 1
+            return valor
+
+    def set(self, chave, valor):
+        with self._lock:
+            self._dados[chave] = valor
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_itens:
+                self._dados.popitem(last=False)
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
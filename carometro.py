@@ -3,20 +3,51 @@ import os
 import base64
 import sqlite3
 from datetime import datetime
+from io import BytesIO
 
-from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify
+import click
+from flask import Blueprint, render_template, request, session, redirect, url_for, flash, jsonify, send_file
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader, simpleSplit
+from reportlab.pdfgen import canvas
 
-bp_carometro = Blueprint("bp_carometro", __name__, template_folder="templates")
+import agendador
+import fila_jobs
+import recursos_pdf
+from banco import DB_PATH, conectar_bd
+from cache_local import CacheVersionado
 
-DB_PATH = "rfa.db"
+try:
+    from PIL import Image, ImageOps, features  # Pillow (já vem com o reportlab)
+except ImportError:  # sem Pillow: só a foto original
+    Image = None
 
+bp_carometro = Blueprint("bp_carometro", __name__, template_folder="templates", cli_group="carometro")
 
-# ----------------- BANCO (mesmo rfa.db do app.py) -----------------
-def conectar_bd():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+# Versões reduzidas de cada foto, geradas ao salvar: (nome, largura em px).
+# O grid do carômetro usa a "mini"; telas largas/retina pegam a "media" pelo srcset.
+VARIANTES_FOTO = (("mini", 240), ("media", 480))
+
+if Image is not None and features.check("webp"):
+    FORMATO_VARIANTE, EXT_VARIANTE = "WEBP", "webp"
+else:
+    FORMATO_VARIANTE, EXT_VARIANTE = "JPEG", "jpg"
+
+# Folha de fotos (PDF): grade por página A4, variante embutida e largura (px) usada
+# quando a foto ainda não tem a variante
+PDF_COLUNAS = 5
+PDF_LINHAS = 7
+PDF_VARIANTE = "media"
+PDF_LARGURA_FOTO = 360
 
+# arquivo -> JPEG reduzido das fotos sem variante, validado pelo mtime (decodifica uma vez só)
+_fotos_pdf = CacheVersionado(800)
+
+
+# ----------------- BANCO (mesmo rfa.db do app.py) -----------------
+# conectar_bd() vem de banco.py (conexão compartilhada da requisição)
 
 def init_carometro_db():
     """Cria a tabela do carômetro (sem quebrar bancos antigos)."""
@@ -112,6 +143,73 @@ def _remover_arquivo_se_existir(caminho: str):
         pass
 
 
+def caminho_variante(arquivo_rel: str, nome: str) -> str:
+    """'carometro/turma_1/aluno_7.jpg' + 'mini' -> 'carometro/turma_1/aluno_7_mini.webp'."""
+    base, _ext = os.path.splitext(arquivo_rel)
+    return f"{base}_{nome}.{EXT_VARIANTE}"
+
+
+def gerar_variantes(arquivo_rel: str, refazer: bool = True) -> int:
+    """Gera as VARIANTES_FOTO a partir da foto original. Devolve quantas foram gravadas."""
+    if Image is None:
+        return 0
+
+    pendentes = [
+        (nome, largura) for nome, largura in VARIANTES_FOTO
+        if refazer or not os.path.isfile(os.path.join(STATIC_DIR, caminho_variante(arquivo_rel, nome)))
+    ]
+    if not pendentes:
+        return 0
+
+    maior = max(largura for _nome, largura in pendentes)
+    with Image.open(os.path.join(STATIC_DIR, arquivo_rel)) as original:
+        # JPEG: decodifica já reduzido (1/2, 1/4...) quando a foto é bem maior que a variante
+        original.draft("RGB", (maior, maior))
+        # câmera de celular grava a rotação no EXIF; a miniatura já sai "de pé"
+        foto = ImageOps.exif_transpose(original).convert("RGB")
+
+    gravadas = 0
+    for nome, largura in pendentes:
+        reduzida = foto.copy()
+        # limita só a largura (é o que o srcset descreve com "240w"/"480w")
+        reduzida.thumbnail((largura, largura * 4), Image.LANCZOS)
+        destino = os.path.join(STATIC_DIR, caminho_variante(arquivo_rel, nome))
+        tmp = destino + ".tmp"
+        if FORMATO_VARIANTE == "WEBP":
+            reduzida.save(tmp, "WEBP", quality=80, method=4)
+        else:
+            reduzida.save(tmp, "JPEG", quality=82, optimize=True, progressive=True)
+        os.replace(tmp, destino)
+        gravadas += 1
+    return gravadas
+
+
+def _remover_variantes(arquivo_rel: str):
+    for nome, _largura in VARIANTES_FOTO:
+        _remover_arquivo_se_existir(os.path.join(STATIC_DIR, caminho_variante(arquivo_rel, nome)))
+
+
+@bp_carometro.app_template_global()
+def foto_carometro(arquivo_rel: str, atualizado_em: str = None) -> dict:
+    """
+    {src, srcset} para o <img> do carômetro: src é a menor variante disponível
+    e srcset lista as variantes. Sem variantes (ainda), só a original.
+    """
+    versao = f"?v={atualizado_em.replace(' ', 'T')}" if atualizado_em else ""
+    original = url_for("static", filename=arquivo_rel) + versao
+
+    opcoes = []
+    for nome, largura in VARIANTES_FOTO:
+        rel = caminho_variante(arquivo_rel, nome)
+        if os.path.isfile(os.path.join(STATIC_DIR, rel)):
+            opcoes.append((url_for("static", filename=rel) + versao, largura))
+    if not opcoes:
+        return {"src": original, "srcset": ""}
+
+    srcset = ", ".join(f"{url} {largura}w" for url, largura in opcoes)
+    return {"src": opcoes[0][0], "srcset": srcset}
+
+
 def _foto_ja_existe(aluno_id) -> bool:
     conn = conectar_bd()
     cur = conn.cursor()
@@ -292,7 +390,7 @@ def api_salvar_foto():
         return jsonify({"ok": False, "error": "Falha ao decodificar imagem"}), 400
 
     # pasta e nome (1 foto por aluno)
-    pasta = os.path.join("static", "carometro", f"turma_{turma_id}")
+    pasta = os.path.join(STATIC_DIR, "carometro", f"turma_{turma_id}")
     _garantir_pasta(pasta)
 
     nome_arquivo = f"aluno_{aluno_id}.jpg"
@@ -309,6 +407,12 @@ def api_salvar_foto():
 
     caminho_rel = f"carometro/turma_{turma_id}/{nome_arquivo}"  # relativo a /static/
 
+    # miniatura + média (a original fica como veio da câmera)
+    try:
+        gerar_variantes(caminho_rel)
+    except Exception as e:
+        print(f"[CAROMETRO] Falha ao gerar miniaturas de {caminho_rel}: {e}")
+
     conn = conectar_bd()
     cur = conn.cursor()
 
@@ -361,6 +465,222 @@ def api_excluir_foto_aluno():
     cur.close()
     conn.close()
 
-    _remover_arquivo_se_existir(os.path.join("static", arquivo_rel))
+    _remover_arquivo_se_existir(os.path.join(STATIC_DIR, arquivo_rel))
+    _remover_variantes(arquivo_rel)
 
     return jsonify({"ok": True})
+
+
+# ----------------- FOLHA DE FOTOS (PDF) -----------------
+def _foto_pdf(arquivo_rel: str):
+    """
+    Foto pronta para o drawImage: a variante PDF_VARIANTE já gravada em disco (480px,
+    gerada ao salvar). Sem ela (ou se for mais velha que a original), reduz a original
+    para PDF_LARGURA_FOTO e guarda o JPEG em cache pelo mtime do arquivo.
+    """
+    caminho = os.path.join(STATIC_DIR, arquivo_rel)
+    try:
+        mtime = os.stat(caminho).st_mtime_ns
+    except OSError:
+        return None
+
+    variante = os.path.join(STATIC_DIR, caminho_variante(arquivo_rel, PDF_VARIANTE))
+    try:
+        if os.stat(variante).st_mtime_ns >= mtime:
+            return ImageReader(variante)
+    except OSError:
+        pass
+
+    dados = _fotos_pdf.get(caminho, mtime)
+    if dados is None:
+        if Image is None:
+            return ImageReader(caminho)
+        with Image.open(caminho) as original:
+            original.draft("RGB", (PDF_LARGURA_FOTO, PDF_LARGURA_FOTO))
+            foto = ImageOps.exif_transpose(original).convert("RGB")
+        foto.thumbnail((PDF_LARGURA_FOTO, PDF_LARGURA_FOTO * 4), Image.LANCZOS)
+        buf = BytesIO()
+        foto.save(buf, "JPEG", quality=85, optimize=True)
+        dados = buf.getvalue()
+        _fotos_pdf.set(caminho, mtime, dados)
+    return ImageReader(BytesIO(dados))
+
+
+def _alunos_com_foto(cur, turma_id):
+    cur.execute("""
+        SELECT a.id, a.nome, cf.arquivo
+        FROM alunos a
+        LEFT JOIN carometro_fotos cf ON cf.aluno_id = a.id
+        WHERE a.turma_id = ?
+        ORDER BY a.nome
+    """, (turma_id,))
+    return cur.fetchall()
+
+
+def _desenhar_turma(c, turma, alunos):
+    """Páginas da turma: cabeçalho + grade PDF_COLUNAS x PDF_LINHAS de foto e nome."""
+    largura, altura = A4
+    margem = 30
+    topo = altura - margem - 58
+    cel_w = (largura - 2 * margem) / PDF_COLUNAS
+    cel_h = (topo - margem) / PDF_LINHAS
+    foto_h = cel_h - 24
+    foto_w = min(cel_w - 10, foto_h * 3 / 4)
+    fonte = recursos_pdf.fonte_sans()
+    por_pagina = PDF_COLUNAS * PDF_LINHAS
+    paginas = max(1, -(-len(alunos) // por_pagina))
+
+    for pagina in range(paginas):
+        for nome_logo, x in ((recursos_pdf.LOGO_ESQ, margem), (recursos_pdf.LOGO_DIR, largura - margem - 46)):
+            leitor = recursos_pdf.logo(nome_logo)
+            if leitor is not None:
+                c.drawImage(leitor, x, altura - margem - 46, width=46, height=46, mask="auto", preserveAspectRatio=True)
+        c.setFont(fonte, 13)
+        c.drawCentredString(largura / 2, altura - margem - 18, "ESCOLA CLASSE 16 – CARÔMETRO")
+        c.setFont(fonte, 10)
+        c.drawCentredString(largura / 2, altura - margem - 34, f"{turma['nome']} – {turma['turno']}")
+        c.setFont(fonte, 7)
+        c.drawRightString(largura - margem, margem - 14, f"Página {pagina + 1} de {paginas} • {len(alunos)} estudante(s)")
+
+        for i, aluno in enumerate(alunos[pagina * por_pagina:(pagina + 1) * por_pagina]):
+            col, lin = i % PDF_COLUNAS, i // PDF_COLUNAS
+            x0 = margem + col * cel_w
+            y0 = topo - (lin + 1) * cel_h
+            fx = x0 + (cel_w - foto_w) / 2
+            fy = y0 + 22
+
+            foto = _foto_pdf(aluno["arquivo"]) if aluno["arquivo"] else None
+            if foto is not None:
+                c.drawImage(foto, fx, fy, width=foto_w, height=foto_h, preserveAspectRatio=True, anchor="c")
+            else:
+                c.setStrokeColorRGB(0.75, 0.75, 0.75)
+                c.rect(fx, fy, foto_w, foto_h)
+                c.setFont(fonte, 7)
+                c.drawCentredString(fx + foto_w / 2, fy + foto_h / 2, "Sem foto")
+
+            c.setFont(fonte, 7)
+            for j, linha in enumerate(simpleSplit(aluno["nome"], fonte, 7, cel_w - 6)[:2]):
+                c.drawCentredString(x0 + cel_w / 2, y0 + 13 - j * 8, linha)
+        c.showPage()
+
+
+def _novo_pdf(destino, titulo):
+    c = canvas.Canvas(destino, pagesize=A4)
+    c.setTitle(titulo)
+    return c
+
+
+@bp_carometro.route("/carometro/turma/<int:turma_id>/pdf", methods=["GET"])
+def carometro_turma_pdf(turma_id):
+    """Folha de fotos da turma (professor da turma ou moderador)."""
+    tipo = session.get("tipo", "")
+    if "usuario" not in session or tipo not in ["professor", "moderador"]:
+        flash("Acesso não autorizado.")
+        return redirect(url_for("login"))
+
+    if tipo == "professor":
+        professor_id = obter_professor_id(session["usuario"])
+        if _professor_tem_vinculos(professor_id) and not _turma_e_do_professor(professor_id, turma_id):
+            flash("Você não tem acesso a essa turma.")
+            return redirect(url_for("bp_carometro.carometro_ver"))
+
+    conn = conectar_bd()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id, nome, turno FROM turmas WHERE id = ?", (turma_id,))
+        turma = cur.fetchone()
+        if not turma:
+            flash("Turma não encontrada.")
+            return redirect(url_for("bp_carometro.carometro_ver"))
+        alunos = _alunos_com_foto(cur, turma_id)
+    finally:
+        cur.close()
+        conn.close()
+
+    buf = BytesIO()
+    c = _novo_pdf(buf, f"Carômetro – {turma['nome']}")
+    _desenhar_turma(c, turma, alunos)
+    c.save()
+    buf.seek(0)
+
+    nome = f"carometro_{turma['nome']}_{turma['turno']}".replace(" ", "_").replace("/", "-")
+    return send_file(buf, mimetype="application/pdf", as_attachment=True, download_name=f"{nome}.pdf")
+
+
+@fila_jobs.tipo_job("carometro_escola")
+def _exportar_carometro_escola(destino):
+    """Caderno com todas as turmas (turno, nome), uma turma por bloco de páginas."""
+    conn = conectar_bd()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id, nome, turno FROM turmas ORDER BY turno, nome")
+        turmas = cur.fetchall()
+
+        progresso = {"feitas": 0, "total": len(turmas)}
+        fila_jobs.informar_progresso(progresso)
+
+        c = _novo_pdf(destino, "Carômetro – Escola")
+        for turma in turmas:
+            alunos = _alunos_com_foto(cur, turma["id"])
+            if alunos:
+                _desenhar_turma(c, turma, alunos)
+            progresso["feitas"] += 1
+            fila_jobs.informar_progresso(progresso)
+        c.save()
+    finally:
+        cur.close()
+        conn.close()
+
+
+@bp_carometro.route("/carometro/escola/pdf", methods=["POST"])
+def carometro_escola_pdf():
+    """Enfileira o caderno da escola inteira e volta para o carômetro acompanhando o job."""
+    if "usuario" not in session or session.get("tipo") != "moderador":
+        flash("Acesso não autorizado.")
+        return redirect(url_for("login"))
+
+    job_id, _novo = fila_jobs.enfileirar(
+        "carometro_escola", {}, "carometro_escola.pdf", criado_por=session.get("usuario"),
+    )
+    return redirect(url_for("moderador_ver_carometro", turma_id=request.form.get("turma_id") or None, job=job_id))
+
+
+# ----------------- MINIATURAS PENDENTES (CLI / AGENDADOR) -----------------
+def gerar_variantes_pendentes(conn, refazer: bool = False, avisar=print):
+    """Gera as variantes que faltam (ou todas, com refazer). Devolve (fotos, gravadas, falhas)."""
+    arquivos = [r["arquivo"] for r in conn.execute("SELECT arquivo FROM carometro_fotos ORDER BY id")]
+    geradas = falhas = 0
+    for arquivo_rel in arquivos:
+        try:
+            geradas += gerar_variantes(arquivo_rel, refazer=refazer)
+        except Exception as e:
+            falhas += 1
+            avisar(f"[ERRO] {arquivo_rel}: {e}")
+    return len(arquivos), geradas, falhas
+
+
+@agendador.tarefa("carometro_miniaturas", intervalo_s=3600)
+def aquecer_miniaturas(conn):
+    # foto salva por fora da tela (ou variante apagada) ganha miniatura antes de alguém abrir o carômetro
+    if Image is None:
+        return
+    fotos, geradas, falhas = gerar_variantes_pendentes(conn)
+    if geradas or falhas:
+        print(f"[CAROMETRO] Miniaturas: {geradas} variante(s) gravada(s), {falhas} falha(s) em {fotos} foto(s)")
+
+
+@bp_carometro.cli.command("miniaturas")
+@click.option("--refazer", is_flag=True, help="Regera também as variantes que já existem.")
+def cli_miniaturas(refazer):
+    """Gera miniatura/média das fotos já cadastradas (flask --app app carometro miniaturas)."""
+    if Image is None:
+        click.echo("Pillow não está instalado; nada a fazer.")
+        return
+
+    conn = conectar_bd()
+    try:
+        fotos, geradas, falhas = gerar_variantes_pendentes(conn, refazer=refazer, avisar=click.echo)
+    finally:
+        conn.close()
+
+    click.echo(f"{fotos} foto(s), {geradas} variante(s) gravada(s) ({FORMATO_VARIANTE}), {falhas} falha(s).")
@@ -6,6 +6,8 @@ from datetime import datetime, date
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 
+import banco
+
 bp_checklist = Blueprint("checklist", __name__, template_folder="templates")
 
 # app.py vai injetar conectar_bd aqui
@@ -27,9 +29,7 @@ def _conn():
     global conectar_bd
     if conectar_bd:
         return conectar_bd()
-    conn = sqlite3.connect("rfa.db", check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return banco.conectar_bd()
 
 
 def _hoje_iso():
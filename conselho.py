@@ -2,7 +2,7 @@ from __future__ import annotations
 # conselho.py
 # Blueprint: Conselho de Classe Coletivo
 # - Professores alimentam por disciplina
-# - Moderador acompanha status e gera Word (individual e da turma inteira)
+# - Moderador acompanha status e gera Word (individual, da turma inteira ou da escola toda)
 #
 # ✅ Compatível com SQLite já existente:
 #    - Se a tabela professor_turmas_disciplina já existir com coluna "disciplina" (antiga),
@@ -11,27 +11,43 @@ from __future__ import annotations
 #    - Evita erro: sqlite3.OperationalError: no such column: ptd.disciplina_abrev
 
 import os
+import glob
+import hashlib
 import json
 import sqlite3
+import threading
+import zipfile
+from concurrent.futures import as_completed
 from datetime import datetime
 from copy import deepcopy
+from io import BytesIO
 from typing import Optional, List, Dict, Any
 
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash, send_file
 from docx import Document
 
+import cache_local
+import fila_jobs
+import indices
+import processos
+from banco import DB_PATH, conectar_bd
+from busca_alunos import SQL_ALUNOS_DA_TURMA
+from migracoes import apos_migrar
+
 bp_conselho = Blueprint("conselho", __name__, template_folder="templates")
 
 # =========================
 # CONFIG
 # =========================
 
-DB_PATH = os.environ.get("ESCOLA CLASSE 16_DB_PATH", "rfa.db")
-
 # Pasta onde os .docx gerados serão salvos
+# (nome + impressão digital dos dados: o mesmo arquivo é reaproveitado enquanto nada mudar)
 CONSELHO_OUT_DIR = os.path.join("static", "conselhos_gerados")
 os.makedirs(CONSELHO_OUT_DIR, exist_ok=True)
 
+# Processos usados na exportação da escola inteira (uma turma por processo)
+CONSELHO_PROCESSOS = int(os.environ.get("RFA_CONSELHO_PROCESSOS", str(min(4, os.cpu_count() or 1))))
+
 # Caminho padrão do MODELO (mantenha no root do projeto ou configure variável de ambiente)
 MODELO_DOCX_PATH = os.environ.get("CONSELHO_MODELO_PATH", "MODELO CONSELHO DE CLASSE.docx")
 
@@ -94,35 +110,51 @@ def _as_int(v, default=None):
         return default
 
 
-def conectar_bd():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Catálogo do esquema (tabela -> colunas), lido uma vez por processo.
+# Só muda com migração: apos_migrar() / ensure_conselho_tables() descartam e a próxima
+# consulta relê tudo com UMA query.
+_catalogo: Optional[Dict[str, frozenset]] = None
+_catalogo_lock = threading.Lock()
+
+
+def _catalogo_schema() -> Dict[str, frozenset]:
+    global _catalogo
+    catalogo = _catalogo
+    if catalogo is not None:
+        return catalogo
+
+    with _catalogo_lock:
+        if _catalogo is None:
+            conn = conectar_bd()
+            cur = conn.cursor()
+            try:
+                cur.execute("""
+                    SELECT m.name AS tabela, p.name AS coluna
+                    FROM sqlite_master m, pragma_table_info(m.name) p
+                    WHERE m.type = 'table'
+                """)
+                colunas: Dict[str, set] = {}
+                for r in cur.fetchall():
+                    colunas.setdefault(r["tabela"], set()).add(r["coluna"])
+            finally:
+                cur.close()
+                conn.close()
+            _catalogo = {t: frozenset(c) for t, c in colunas.items()}
+        return _catalogo
+
+
+@apos_migrar
+def recarregar_catalogo():
+    global _catalogo
+    _catalogo = None
 
 
 def _tabela_existe(nome: str) -> bool:
-    conn = conectar_bd()
-    cur = conn.cursor()
-    try:
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=? LIMIT 1", (nome,))
-        return cur.fetchone() is not None
-    finally:
-        cur.close()
-        conn.close()
+    return nome in _catalogo_schema()
 
 
 def _coluna_existe(tabela: str, coluna: str) -> bool:
-    if not _tabela_existe(tabela):
-        return False
-    conn = conectar_bd()
-    cur = conn.cursor()
-    try:
-        cur.execute(f"PRAGMA table_info({tabela})")
-        cols = [r[1] for r in cur.fetchall()]  # r[1] = nome da coluna
-        return coluna in cols
-    finally:
-        cur.close()
-        conn.close()
+    return coluna in _catalogo_schema().get(tabela, ())
 
 
 def _coluna_disciplina_ptd() -> Optional[str]:
@@ -130,15 +162,48 @@ def _coluna_disciplina_ptd() -> Optional[str]:
     Descobre qual coluna de disciplina existe em professor_turmas_disciplina.
     Prioriza 'disciplina_abrev'. Se não existir, tenta 'disciplina'.
     """
-    if not _tabela_existe("professor_turmas_disciplina"):
+    colunas = _catalogo_schema().get("professor_turmas_disciplina")
+    if not colunas:
         return None
-    if _coluna_existe("professor_turmas_disciplina", "disciplina_abrev"):
+    if "disciplina_abrev" in colunas:
         return "disciplina_abrev"
-    if _coluna_existe("professor_turmas_disciplina", "disciplina"):
+    if "disciplina" in colunas:
         return "disciplina"
     return None
 
 
+def _montar_abrevs_possiveis() -> Dict[str, List[str]]:
+    """
+    Tabela fixa (montada no import) para _abrevs_possiveis_para:
+    'LP' -> ['LP', 'Portugues', 'Português'] e 'Português' -> ['Português', 'LP', 'Portugues'].
+    """
+    # reverse map: "LP" -> ["Portugues", "Português"]
+    rev: Dict[str, List[str]] = {}
+    for k, v in DISCIPLINA_ABREV.items():
+        rev.setdefault(v, []).append(k)
+
+    tabela: Dict[str, List[str]] = {}
+
+    # Se o valor já é uma abrev (LP/MAT...), agrega nomes.
+    for ab, nomes in rev.items():
+        tabela[ab] = [ab] + nomes
+
+    # Se o valor é um nome (Português), agrega abrev correspondente (sem duplicados).
+    for nome, ab in DISCIPLINA_ABREV.items():
+        if nome in tabela:
+            continue
+        out = []
+        for x in [nome, ab] + rev.get(ab, []):
+            if x not in out:
+                out.append(x)
+        tabela[nome] = out
+
+    return tabela
+
+
+_ABREVS_POSSIVEIS = _montar_abrevs_possiveis()
+
+
 def _abrevs_possiveis_para(valor: str) -> List[str]:
     """
     Monta lista de valores possíveis pra comparar no banco:
@@ -148,34 +213,7 @@ def _abrevs_possiveis_para(valor: str) -> List[str]:
     valor = (valor or "").strip()
     if not valor:
         return []
-
-    possiveis = [valor]
-
-    # reverse map: "LP" -> ["Portugues", "Português"]
-    rev: Dict[str, List[str]] = {}
-    for k, v in DISCIPLINA_ABREV.items():
-        rev.setdefault(v, []).append(k)
-
-    # Se o valor já é uma abrev (LP/MAT...), agrega nomes.
-    if valor in rev:
-        possiveis.extend(rev.get(valor, []))
-        return possiveis
-
-    # Se o valor é um nome (Português), agrega abrev correspondente.
-    ab = DISCIPLINA_ABREV.get(valor)
-    if ab and ab not in possiveis:
-        possiveis.append(ab)
-        possiveis.extend(rev.get(ab, []))
-
-    # remove duplicados preservando ordem
-    out = []
-    seen = set()
-    for x in possiveis:
-        x = (x or "").strip()
-        if x and x not in seen:
-            seen.add(x)
-            out.append(x)
-    return out
+    return list(_ABREVS_POSSIVEIS.get(valor, [valor]))
 
 
 def ensure_conselho_tables():
@@ -272,6 +310,7 @@ def ensure_conselho_tables():
                     pass
 
         conn.commit()
+        recarregar_catalogo()
     finally:
         cur.close()
         conn.close()
@@ -416,7 +455,7 @@ def _alunos_da_turma(turma_id: int):
     conn = conectar_bd()
     cur = conn.cursor()
     try:
-        cur.execute("SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome", (turma_id,))
+        cur.execute(SQL_ALUNOS_DA_TURMA, (turma_id,))
         return cur.fetchall()
     finally:
         cur.close()
@@ -479,6 +518,18 @@ def _aluno_nome(aluno_id: int) -> str:
         conn.close()
 
 
+def _payload_registro(r) -> Dict[str, Any]:
+    try:
+        asp = json.loads(r["aspectos_json"] or "{}")
+    except Exception:
+        asp = {}
+    return {
+        "aspectos": asp,
+        "atualizado_em": r["atualizado_em"],
+        "professor_id": r["professor_id"],
+    }
+
+
 def _registros_por_aluno(turma_id: int, aluno_id: int, bimestre: int, ano: int) -> Dict[str, Dict[str, Any]]:
     conn = conectar_bd()
     cur = conn.cursor()
@@ -489,19 +540,7 @@ def _registros_por_aluno(turma_id: int, aluno_id: int, bimestre: int, ano: int)
             WHERE turma_id=? AND aluno_id=? AND bimestre=? AND ano=?
         """, (turma_id, aluno_id, bimestre, ano))
         rows = cur.fetchall()
-
-        out: Dict[str, Dict[str, Any]] = {}
-        for r in rows:
-            try:
-                asp = json.loads(r["aspectos_json"] or "{}")
-            except Exception:
-                asp = {}
-            out[r["disciplina_abrev"]] = {
-                "aspectos": asp,
-                "atualizado_em": r["atualizado_em"],
-                "professor_id": r["professor_id"],
-            }
-        return out
+        return {r["disciplina_abrev"]: _payload_registro(r) for r in rows}
     finally:
         cur.close()
         conn.close()
@@ -526,6 +565,58 @@ def _observacao_moderador(turma_id: int, aluno_id: int, bimestre: int, ano: int)
         conn.close()
 
 
+_SQL_REGISTROS_TURMA = indices.consulta_quente(
+    "conselho: registros da turma no bimestre", "conselhos_registros", "conselhos_registros",
+    """
+        SELECT aluno_id, disciplina_abrev, aspectos_json, atualizado_em, professor_id
+        FROM conselhos_registros
+        WHERE turma_id=? AND bimestre=? AND ano=?
+    """,
+    (1, 1, 2026),
+)
+
+
+def _dados_conselho_turma(turma_id: int, bimestre: int, ano: int) -> Dict[str, Any]:
+    """
+    Tudo o que a turma precisa para progresso e DOCX, em 4 consultas (independe do nº de alunos):
+      turma_nome, alunos, registros[aluno_id][abrev] e observacoes[aluno_id].
+    """
+    conn = conectar_bd()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT nome, turno FROM turmas WHERE id = ? LIMIT 1", (turma_id,))
+        row = cur.fetchone()
+        turma_nome = f"{row['nome']} ({row['turno']})" if row else ""
+
+        cur.execute(SQL_ALUNOS_DA_TURMA, (turma_id,))
+        alunos = cur.fetchall()
+
+        cur.execute(_SQL_REGISTROS_TURMA, (turma_id, bimestre, ano))
+        registros: Dict[int, Dict[str, Dict[str, Any]]] = {}
+        for r in cur.fetchall():
+            registros.setdefault(r["aluno_id"], {})[r["disciplina_abrev"]] = _payload_registro(r)
+
+        cur.execute("""
+            SELECT aluno_id, observacoes, atualizado_em
+            FROM conselhos_observacoes
+            WHERE turma_id=? AND bimestre=? AND ano=?
+        """, (turma_id, bimestre, ano))
+        observacoes = {
+            r["aluno_id"]: {"observacoes": r["observacoes"] or "", "atualizado_em": r["atualizado_em"]}
+            for r in cur.fetchall()
+        }
+
+        return {
+            "turma_nome": turma_nome,
+            "alunos": alunos,
+            "registros": registros,
+            "observacoes": observacoes,
+        }
+    finally:
+        cur.close()
+        conn.close()
+
+
 def _disciplinas_esperadas_turma_abrev(turma_id: int) -> List[str]:
     """
     Para o status do moderador ficar correto:
@@ -582,47 +673,38 @@ def _disciplinas_esperadas_turma_abrev(turma_id: int) -> List[str]:
         conn.close()
 
 
-def _progressos_turma(turma_id: int, bimestre: int, ano: int) -> Dict[str, Any]:
-    alunos = _alunos_da_turma(turma_id)
+def _progressos_turma(turma_id: int, bimestre: int, ano: int, dados: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    dados = dados or _dados_conselho_turma(turma_id, bimestre, ano)
+    alunos = dados["alunos"]
     esperadas = _disciplinas_esperadas_turma_abrev(turma_id)
     total_disc = len(esperadas)
 
     progresso_alunos = []
     feitos = 0
 
-    conn = conectar_bd()
-    cur = conn.cursor()
-    try:
-        for a in alunos:
-            cur.execute("""
-                SELECT COUNT(DISTINCT disciplina_abrev) AS total
-                FROM conselhos_registros
-                WHERE turma_id=? AND aluno_id=? AND bimestre=? AND ano=?
-            """, (turma_id, a["id"], bimestre, ano))
-            qtd = cur.fetchone()["total"] or 0
+    for a in alunos:
+        qtd = len(dados["registros"].get(a["id"], {}))
 
-            ok = (total_disc > 0 and qtd >= total_disc)
-            if ok:
-                feitos += 1
+        ok = (total_disc > 0 and qtd >= total_disc)
+        if ok:
+            feitos += 1
 
-            progresso_alunos.append({
-                "aluno_id": a["id"],
-                "aluno_nome": a["nome"],
-                "qtd": qtd,
-                "total": total_disc,
-                "ok": ok,
-            })
+        progresso_alunos.append({
+            "aluno_id": a["id"],
+            "aluno_nome": a["nome"],
+            "qtd": qtd,
+            "total": total_disc,
+            "ok": ok,
+        })
 
-        return {
-            "alunos": progresso_alunos,
-            "feitos": feitos,
-            "total_alunos": len(alunos),
-            "disciplinas_esperadas": esperadas,
-            "total_disciplinas": total_disc
-        }
-    finally:
-        cur.close()
-        conn.close()
+    return {
+        "alunos": progresso_alunos,
+        "feitos": feitos,
+        "total_alunos": len(alunos),
+        "disciplinas_esperadas": esperadas,
+        "total_disciplinas": total_disc,
+        "turma_nome": dados["turma_nome"],
+    }
 
 
 # =========================
@@ -642,116 +724,388 @@ def _set_line_value(paragraph, label: str, value: str):
             paragraph.add_run(new_txt)
 
 
-def _preencher_doc_modelo(doc: Document, turma_id: int, aluno_id: int, bimestre: int, ano: int):
-    """Preenche um Document(modelo) para UM aluno."""
-    if not doc.tables:
-        raise RuntimeError("Modelo nao possui tabelas. Verifique o arquivo MODELO CONSELHO DE CLASSE.docx")
+class _ModeloConselho:
+    """
+    MODELO CONSELHO DE CLASSE.docx já lido e analisado:
+    - blob: bytes do .docx (Document(BytesIO(blob)) sem tocar no disco);
+    - corpo: XML do body original, para cada aluno receber uma cópia limpa (deepcopy);
+    - col_index / row_index: posições das colunas de disciplina e linhas dos ASPECTOS;
+    - paragrafos_*: índices dos parágrafos de cabeçalho / TURMA: / ESTUDANTE:.
+    """
 
-    turma_nome = _turma_nome(turma_id)
-    aluno_nome = _aluno_nome(aluno_id)
+    def __init__(self, chave, blob: bytes):
+        self.chave = chave
+        self.blob = blob
+
+        doc = Document(BytesIO(blob))
+        if not doc.tables:
+            raise RuntimeError("Modelo nao possui tabelas. Verifique o arquivo MODELO CONSELHO DE CLASSE.docx")
+        self.corpo = deepcopy(doc.element.body)
+
+        tabela = doc.tables[0]
+        header = [tabela.cell(0, c).text.strip().replace("\n", " ") for c in range(len(tabela.columns))]
+        self.col_index = {h: i for i, h in enumerate(header) if h in COLUNAS_MODELO}
+
+        self.row_index: Dict[str, int] = {}
+        for r in range(1, len(tabela.rows)):
+            label = tabela.cell(r, 0).text.strip().replace("\n", " ")
+            for key, nome in ASPECTOS:
+                if label == nome:
+                    self.row_index[key] = r
+
+        self.paragrafos_cabecalho = []
+        self.paragrafos_turma = []
+        self.paragrafos_estudante = []
+        for i, par in enumerate(doc.paragraphs):
+            txt = par.text or ""
+            if "CONSELHO DE CLASSE" in txt and "BIMESTRE" in txt:
+                self.paragrafos_cabecalho.append(i)
+            if "TURMA:" in txt:
+                self.paragrafos_turma.append(i)
+            if "ESTUDANTE:" in txt:
+                self.paragrafos_estudante.append(i)
+
+        self.tem_observacoes = len(doc.tables) > 1
+
+    def novo_documento(self) -> Document:
+        """Document a partir dos bytes em cache (uma leitura do pacote; use recarregar_corpo() por aluno)."""
+        return Document(BytesIO(self.blob))
+
+    def recarregar_corpo(self, doc: Document):
+        """Troca o body de `doc` por uma cópia limpa do body do modelo."""
+        body = doc.element.body
+        for el in list(body):
+            body.remove(el)
+        for el in self.corpo:
+            body.append(deepcopy(el))
+
+
+_modelo_cache: Optional[_ModeloConselho] = None
+_modelo_lock = threading.Lock()
+
+
+def _modelo_conselho() -> _ModeloConselho:
+    """Modelo analisado uma vez por (caminho, mtime, tamanho); trocar o arquivo recarrega."""
+    global _modelo_cache
+    if not os.path.exists(MODELO_DOCX_PATH):
+        raise FileNotFoundError(f"Modelo nao encontrado: {MODELO_DOCX_PATH}")
 
-    registros = _registros_por_aluno(turma_id, aluno_id, bimestre, ano)
-    obs = _observacao_moderador(turma_id, aluno_id, bimestre, ano)
+    st = os.stat(MODELO_DOCX_PATH)
+    chave = (os.path.abspath(MODELO_DOCX_PATH), st.st_mtime_ns, st.st_size)
+    with _modelo_lock:
+        if _modelo_cache is None or _modelo_cache.chave != chave:
+            with open(MODELO_DOCX_PATH, "rb") as f:
+                _modelo_cache = _ModeloConselho(chave, f.read())
+        return _modelo_cache
 
-    # Atualiza cabeçalho
-    for p in doc.paragraphs:
-        if "CONSELHO DE CLASSE" in (p.text or "") and "BIMESTRE" in (p.text or ""):
-            new_txt = f"CONSELHO DE CLASSE {bimestre}o BIMESTRE /{ano}"
-            for r in p.runs:
-                r.text = ""
-            if p.runs:
-                p.runs[0].text = new_txt
-            else:
-                p.add_run(new_txt)
 
-    # TURMA / ESTUDANTE
-    for p in doc.paragraphs:
-        _set_line_value(p, "TURMA:", turma_nome)
-        _set_line_value(p, "ESTUDANTE:", aluno_nome)
+def _set_texto_paragrafo(paragraph, new_txt: str):
+    for r in paragraph.runs:
+        r.text = ""
+    if paragraph.runs:
+        paragraph.runs[0].text = new_txt
+    else:
+        paragraph.add_run(new_txt)
 
-    tabela = doc.tables[0]
 
-    header = [tabela.cell(0, c).text.strip().replace("\n", " ") for c in range(len(tabela.columns))]
-    col_index = {h: i for i, h in enumerate(header) if h in COLUNAS_MODELO}
+def _preencher_doc_modelo(
+    doc: Document,
+    modelo: _ModeloConselho,
+    turma_nome: str,
+    aluno_nome: str,
+    registros: Dict[str, Dict[str, Any]],
+    obs: Dict[str, Any],
+    bimestre: int,
+    ano: int,
+):
+    """Preenche UM aluno em `doc`, cujo body deve ser uma cópia limpa do modelo. Não consulta o banco."""
+    paragrafos = doc.paragraphs
 
-    row_index: Dict[str, int] = {}
-    for r in range(1, len(tabela.rows)):
-        label = tabela.cell(r, 0).text.strip().replace("\n", " ")
-        for key, nome in ASPECTOS:
-            if label == nome:
-                row_index[key] = r
+    # Atualiza cabeçalho
+    for i in modelo.paragrafos_cabecalho:
+        _set_texto_paragrafo(paragrafos[i], f"CONSELHO DE CLASSE {bimestre}o BIMESTRE /{ano}")
 
-    # Limpa tudo (evita “herdar X” do modelo)
+    # TURMA / ESTUDANTE
+    for i in modelo.paragrafos_turma:
+        _set_line_value(paragrafos[i], "TURMA:", turma_nome)
+    for i in modelo.paragrafos_estudante:
+        _set_line_value(paragrafos[i], "ESTUDANTE:", aluno_nome)
+
+    tabelas = doc.tables
+    linhas = tabelas[0].rows
+    col_index = modelo.col_index
+
+    # Limpa tudo (evita “herdar X” do modelo) e aplica X onde foi marcado
     for asp_key, _asp_name in ASPECTOS:
-        rr = row_index.get(asp_key)
+        rr = modelo.row_index.get(asp_key)
         if rr is None:
             continue
-        for col in col_index.values():
-            tabela.cell(rr, col).text = ""
-
-    # Aplica X onde foi marcado
-    for disc_abrev, payload in registros.items():
-        if disc_abrev not in col_index:
-            continue
-        c = col_index[disc_abrev]
-        aspectos = payload.get("aspectos", {}) or {}
-        for asp_key, _asp_name in ASPECTOS:
-            r = row_index.get(asp_key)
-            if r is None:
-                continue
-            marcar = bool(aspectos.get(asp_key))
-            tabela.cell(r, c).text = "X" if marcar else ""
+        celulas = linhas[rr].cells
+        for disc_abrev, c in col_index.items():
+            aspectos = (registros.get(disc_abrev) or {}).get("aspectos", {}) or {}
+            celulas[c].text = "X" if aspectos.get(asp_key) else ""
 
     # Observações em segunda tabela (se existir)
-    if len(doc.tables) > 1:
-        obs_tbl = doc.tables[1]
-        cell = obs_tbl.cell(0, 0)
+    if modelo.tem_observacoes:
+        cell = tabelas[1].cell(0, 0)
         cell.text = "Observacoes:\n" + (obs.get("observacoes") or "").strip()
 
 
-def _render_docx_conselho(turma_id: int, aluno_id: int, bimestre: int, ano: int) -> str:
-    if not os.path.exists(MODELO_DOCX_PATH):
-        raise FileNotFoundError(f"Modelo nao encontrado: {MODELO_DOCX_PATH}")
+# =========================
+# Cache dos DOCX gerados (impressão digital)
+# =========================
+
+def _escopo_conselho(turma_id: int, bimestre: int, ano: int) -> str:
+    """Escopo em cache_versoes; as rotas que gravam registros/observações incrementam."""
+    return f"conselho:{turma_id}:{bimestre}:{ano}"
+
+
+def _impressao_digital(turma_id: int, bimestre: int, ano: int, aluno_id: Optional[int] = None) -> str:
+    """
+    Hash de tudo que entra no DOCX: modelo (caminho/mtime/tamanho), versão do escopo,
+    nomes de turma/alunos e um resumo (qtd, último atualizado_em, tamanho) dos registros
+    e observações. Poucas consultas agregadas, sem montar o documento.
+    """
+    filtro_aluno = " AND aluno_id = ?" if aluno_id else ""
+    extra = (aluno_id,) if aluno_id else ()
+
+    conn = conectar_bd()
+    cur = conn.cursor()
+    try:
+        partes = [_modelo_conselho().chave, cache_local.versao(conn, _escopo_conselho(turma_id, bimestre, ano))]
+
+        cur.execute("SELECT nome, turno FROM turmas WHERE id = ?", (turma_id,))
+        partes.append(tuple(cur.fetchone() or ()))
+
+        if aluno_id:
+            cur.execute("SELECT id, nome FROM alunos WHERE id = ?", (aluno_id,))
+        else:
+            cur.execute(SQL_ALUNOS_DA_TURMA, (turma_id,))
+        partes.append([tuple(r) for r in cur.fetchall()])
+
+        cur.execute(f"""
+            SELECT COUNT(*), MAX(atualizado_em), SUM(LENGTH(aspectos_json))
+            FROM conselhos_registros
+            WHERE turma_id=? AND bimestre=? AND ano=?{filtro_aluno}
+        """, (turma_id, bimestre, ano) + extra)
+        partes.append(tuple(cur.fetchone()))
+
+        cur.execute(f"""
+            SELECT COUNT(*), MAX(atualizado_em), SUM(LENGTH(observacoes))
+            FROM conselhos_observacoes
+            WHERE turma_id=? AND bimestre=? AND ano=?{filtro_aluno}
+        """, (turma_id, bimestre, ano) + extra)
+        partes.append(tuple(cur.fetchone()))
+    finally:
+        cur.close()
+        conn.close()
+
+    bruto = json.dumps(partes, default=str, ensure_ascii=False)
+    return hashlib.sha1(bruto.encode("utf-8")).hexdigest()
 
-    doc = Document(MODELO_DOCX_PATH)
-    _preencher_doc_modelo(doc, turma_id, aluno_id, bimestre, ano)
 
-    out_name = f"conselho_t{turma_id}_a{aluno_id}_b{bimestre}_{ano}.docx"
-    out_path = os.path.join(CONSELHO_OUT_DIR, out_name)
-    doc.save(out_path)
+def _docx_em_cache(nome_base: str, impressao: str, montar) -> str:
+    """
+    Devolve o caminho de <nome_base>_<impressao>.docx, gerando com montar() só se ainda
+    não existir. Versões antigas do mesmo nome_base são apagadas.
+    """
+    out_path = os.path.join(CONSELHO_OUT_DIR, f"{nome_base}_{impressao[:16]}.docx")
+    if os.path.exists(out_path):
+        return out_path
+
+    tmp_path = f"{out_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    montar().save(tmp_path)
+    os.replace(tmp_path, out_path)
+
+    for antigo in glob.glob(os.path.join(CONSELHO_OUT_DIR, f"{glob.escape(nome_base)}_*.docx")):
+        if antigo != out_path:
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
     return out_path
 
 
-def _render_docx_turma_unico(turma_id: int, bimestre: int, ano: int) -> str:
-    """Gera um ÚNICO DOCX com TODOS os alunos da turma (1 aluno por página)."""
-    if not os.path.exists(MODELO_DOCX_PATH):
-        raise FileNotFoundError(f"Modelo nao encontrado: {MODELO_DOCX_PATH}")
+def _montar_docx_conselho(turma_id: int, aluno_id: int, bimestre: int, ano: int) -> Document:
+    modelo = _modelo_conselho()
+    doc = modelo.novo_documento()
+    _preencher_doc_modelo(
+        doc, modelo,
+        _turma_nome(turma_id),
+        _aluno_nome(aluno_id),
+        _registros_por_aluno(turma_id, aluno_id, bimestre, ano),
+        _observacao_moderador(turma_id, aluno_id, bimestre, ano),
+        bimestre, ano,
+    )
+    return doc
 
-    alunos = _alunos_da_turma(turma_id)
+
+def _render_docx_conselho(turma_id: int, aluno_id: int, bimestre: int, ano: int):
+    """DOCX de um aluno. Devolve (caminho, impressao_digital)."""
+    impressao = _impressao_digital(turma_id, bimestre, ano, aluno_id)
+    out_path = _docx_em_cache(
+        f"conselho_t{turma_id}_a{aluno_id}_b{bimestre}_{ano}",
+        impressao,
+        lambda: _montar_docx_conselho(turma_id, aluno_id, bimestre, ano),
+    )
+    return out_path, impressao
+
+
+def _montar_docx_turma(turma_id: int, bimestre: int, ano: int) -> Document:
+    """Monta (sem salvar) um DOCX com TODOS os alunos da turma (1 aluno por página)."""
+    modelo = _modelo_conselho()
+
+    dados = _dados_conselho_turma(turma_id, bimestre, ano)
+    alunos = dados["alunos"]
     if not alunos:
         raise RuntimeError("Turma sem alunos para gerar.")
 
+    def _preencher(doc, aluno):
+        _preencher_doc_modelo(
+            doc, modelo,
+            dados["turma_nome"],
+            aluno["nome"],
+            dados["registros"].get(aluno["id"], {}),
+            dados["observacoes"].get(aluno["id"], {"observacoes": "", "atualizado_em": None}),
+            bimestre, ano,
+        )
+
     # 1) Primeiro aluno vira o documento mestre
-    master = Document(MODELO_DOCX_PATH)
-    _preencher_doc_modelo(master, turma_id, alunos[0]["id"], bimestre, ano)
+    master = modelo.novo_documento()
+    _preencher(master, alunos[0])
 
-    # 2) Demais alunos: cria doc temp preenchido e “anexa” no master com quebra de página
+    # 2) Demais alunos: um único doc de rascunho recebe uma cópia limpa do body do modelo,
+    #    é preenchido e seus elementos são MOVIDOS para o master com quebra de página
+    temp = modelo.novo_documento()
     for a in alunos[1:]:
-        temp = Document(MODELO_DOCX_PATH)
-        _preencher_doc_modelo(temp, turma_id, a["id"], bimestre, ano)
+        modelo.recarregar_corpo(temp)
+        _preencher(temp, a)
+        _anexar_corpo(master, temp)
 
-        master.add_page_break()
+    return master
 
-        # Copia elementos do body (exceto sectPr final)
-        for el in list(temp.element.body):
-            if el.tag.endswith("}sectPr"):
-                continue
-            master.element.body.append(deepcopy(el))
 
-    out_name = f"conselho_TURMA_{turma_id}_b{bimestre}_{ano}.docx"
-    out_path = os.path.join(CONSELHO_OUT_DIR, out_name)
-    master.save(out_path)
-    return out_path
+def _anexar_corpo(master: Document, doc: Document):
+    """Quebra de página no master e MOVE os elementos do body de `doc` (exceto sectPr final)."""
+    master.add_page_break()
+    for el in list(doc.element.body):
+        if el.tag.endswith("}sectPr"):
+            continue
+        master.element.body.append(el)
+
+
+def _render_docx_turma_unico(turma_id: int, bimestre: int, ano: int):
+    """Um ÚNICO DOCX com TODOS os alunos da turma (1 aluno por página). Devolve (caminho, impressao_digital)."""
+    impressao = _impressao_digital(turma_id, bimestre, ano)
+    out_path = _docx_em_cache(
+        f"conselho_TURMA_{turma_id}_b{bimestre}_{ano}",
+        impressao,
+        lambda: _montar_docx_turma(turma_id, bimestre, ano),
+    )
+    return out_path, impressao
+
+
+# =========================
+# EXPORTAÇÃO DA ESCOLA (fila + processos)
+# =========================
+
+def _docx_turma_bytes(turma_id: int, bimestre: int, ano: int):
+    """Roda num processo do pool: devolve (turma_id, bytes do DOCX ou None, erro)."""
+    try:
+        out_path, _impressao = _render_docx_turma_unico(turma_id, bimestre, ano)
+        with open(out_path, "rb") as f:
+            return turma_id, f.read(), None
+    except Exception as e:
+        return turma_id, None, str(e) or e.__class__.__name__
+
+
+def _nome_arquivo_turma(turma, bimestre: int, ano: int) -> str:
+    bruto = f"{turma['nome']}_{turma['turno']}"
+    limpo = "".join(c if c.isalnum() or c in "-_" else "_" for c in bruto).strip("_")
+    return f"conselho_{limpo or turma['id']}_b{bimestre}_{ano}.docx"
+
+
+@fila_jobs.tipo_job("conselho_escola")
+def _exportar_conselho_escola(destino: str, bimestre: int, ano: int, formato: str = "zip"):
+    """
+    Gera o conselho de TODAS as turmas, cada turma num processo do pool.
+    formato="zip": um DOCX por turma, gravado no ZIP assim que a turma fica pronta.
+    formato="docx": um único DOCX com as turmas na ordem da lista (turno, nome).
+    O andamento por turma vai para o job (fila_jobs.informar_progresso).
+    """
+    conn = conectar_bd()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT t.id, t.nome, t.turno
+            FROM turmas t
+            WHERE EXISTS (SELECT 1 FROM alunos a WHERE a.turma_id = t.id)
+            ORDER BY t.turno, t.nome
+        """)
+        turmas = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+    if not turmas:
+        raise RuntimeError("Nenhuma turma com alunos para gerar.")
+
+    progresso = {
+        "total": len(turmas),
+        "feitas": 0,
+        "turmas": [{"id": t["id"], "nome": f"{t['nome']} ({t['turno']})", "status": "fila"} for t in turmas],
+    }
+    posicao = {t["id"]: i for i, t in enumerate(turmas)}
+    fila_jobs.informar_progresso(progresso)
+
+    def _registrar(turma_id, erro):
+        item = progresso["turmas"][posicao[turma_id]]
+        item["status"] = "erro" if erro else "ok"
+        if erro:
+            item["erro"] = erro
+        progresso["feitas"] += 1
+        fila_jobs.informar_progresso(progresso)
+
+    qtd_processos = max(1, min(CONSELHO_PROCESSOS, len(turmas)))
+    with processos.pool_processos(qtd_processos) as pool:
+        futuros = [pool.submit(_docx_turma_bytes, t["id"], bimestre, ano) for t in turmas]
+
+        if formato == "docx":
+            resultados = {}
+            for fut in as_completed(futuros):
+                turma_id, dados, erro = fut.result()
+                resultados[turma_id] = dados
+                _registrar(turma_id, erro)
+
+            master = None
+            for t in turmas:
+                dados = resultados.pop(t["id"], None)
+                if not dados:
+                    continue
+                doc = Document(BytesIO(dados))
+                if master is None:
+                    master = doc
+                else:
+                    _anexar_corpo(master, doc)
+            if master is None:
+                raise RuntimeError("Nenhuma turma pôde ser gerada.")
+            master.save(destino)
+            return
+
+        gerados = 0
+        with zipfile.ZipFile(destino, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for fut in as_completed(futuros):
+                turma_id, dados, erro = fut.result()
+                if dados:
+                    zf.writestr(_nome_arquivo_turma(turmas[posicao[turma_id]], bimestre, ano), dados)
+                    gerados += 1
+                _registrar(turma_id, erro)
+
+            erros = [f"{t['nome']}: {t['erro']}" for t in progresso["turmas"] if t["status"] == "erro"]
+            if erros:
+                zf.writestr("ERROS.txt", "\n".join(erros) + "\n")
+        if not gerados:
+            raise RuntimeError("Nenhuma turma pôde ser gerada.")
 
 
 # =========================
@@ -914,6 +1268,7 @@ def conselho_professor():
                     aspectos_json=excluded.aspectos_json,
                     atualizado_em=datetime('now','localtime')
             """, (professor_id, turma_id_i, aluno_id_i, disc, bimestre, ano, json.dumps(aspectos, ensure_ascii=False)))
+            cache_local.incrementar(conn, _escopo_conselho(turma_id_i, bimestre, ano))
             conn.commit()
             flash("Conselho salvo com sucesso!")
         except Exception as e:
@@ -1149,7 +1504,13 @@ def conselho_moderador():
     bimestre = _as_int(request.args.get("bimestre", "1"), 1) or 1
     ano = _as_int(request.args.get("ano", str(datetime.now().year)), datetime.now().year) or datetime.now().year
 
-    return render_template("conselho_moderador.html", turmas=turmas, bimestre=bimestre, ano=ano)
+    return render_template(
+        "conselho_moderador.html",
+        turmas=turmas,
+        bimestre=bimestre,
+        ano=ano,
+        job_id=request.args.get("job"),
+    )
 
 
 @bp_conselho.route("/conselho/moderador/turma/<int:turma_id>", methods=["GET", "POST"])
@@ -1179,6 +1540,7 @@ def conselho_moderador_turma(turma_id):
                 ON CONFLICT(turma_id, aluno_id, bimestre, ano)
                 DO UPDATE SET observacoes=excluded.observacoes, atualizado_em=datetime('now','localtime')
             """, (turma_id, aluno_id, bimestre, ano, observacoes))
+            cache_local.incrementar(conn, _escopo_conselho(turma_id, bimestre, ano))
             conn.commit()
             flash("Observacoes salvas.")
         except Exception as e:
@@ -1193,7 +1555,7 @@ def conselho_moderador_turma(turma_id):
     return render_template(
         "conselho_moderador_turma.html",
         turma_id=turma_id,
-        turma_nome=_turma_nome(turma_id),
+        turma_nome=progresso["turma_nome"],
         bimestre=bimestre,
         ano=ano,
         progresso=progresso
@@ -1229,43 +1591,59 @@ def conselho_moderador_ver(turma_id, aluno_id):
     )
 
 
-# ✅ INDIVIDUAL: gera e baixa direto
-@bp_conselho.route("/conselho/moderador/gerar/<int:turma_id>/<int:aluno_id>", methods=["POST"])
+def _enviar_docx(out_path: str, impressao: str, filename: str):
+    # ETag = impressão digital; GET com If-None-Match/If-Modified-Since recebe 304
+    return send_file(out_path, as_attachment=True, download_name=filename, etag=impressao, conditional=True)
+
+
+# ✅ INDIVIDUAL: gera (ou reaproveita) e baixa direto
+@bp_conselho.route("/conselho/moderador/gerar/<int:turma_id>/<int:aluno_id>", methods=["GET", "POST"])
 def conselho_moderador_gerar(turma_id, aluno_id):
     if not _login_required("moderador"):
         return redirect(url_for("login"))
 
-    bimestre = _as_int(request.form.get("bimestre"), 1) or 1
-    ano = _as_int(request.form.get("ano"), datetime.now().year) or datetime.now().year
+    bimestre = _as_int(request.values.get("bimestre"), 1) or 1
+    ano = _as_int(request.values.get("ano"), datetime.now().year) or datetime.now().year
 
     try:
-        out_path = _render_docx_conselho(turma_id, aluno_id, bimestre, ano)
-        filename = os.path.basename(out_path)
-        return send_file(out_path, as_attachment=True, download_name=filename)
+        out_path, impressao = _render_docx_conselho(turma_id, aluno_id, bimestre, ano)
+        return _enviar_docx(out_path, impressao, f"conselho_t{turma_id}_a{aluno_id}_b{bimestre}_{ano}.docx")
     except Exception as e:
         flash(f"Erro ao gerar Word individual: {e}")
         return redirect(url_for("conselho.conselho_moderador_turma", turma_id=turma_id, bimestre=bimestre, ano=ano))
 
 
-# ✅ TURMA: gera um único Word e baixa direto
-@bp_conselho.route("/conselho/moderador/gerar_turma/<int:turma_id>", methods=["POST"])
+# ✅ TURMA: gera (ou reaproveita) um único Word e baixa direto
+@bp_conselho.route("/conselho/moderador/gerar_turma/<int:turma_id>", methods=["GET", "POST"])
 def conselho_moderador_gerar_turma(turma_id):
     if not _login_required("moderador"):
         return redirect(url_for("login"))
 
-    bimestre = _as_int(request.form.get("bimestre"), 1) or 1
-    ano = _as_int(request.form.get("ano"), datetime.now().year) or datetime.now().year
+    bimestre = _as_int(request.values.get("bimestre"), 1) or 1
+    ano = _as_int(request.values.get("ano"), datetime.now().year) or datetime.now().year
 
     try:
-        out_path = _render_docx_turma_unico(turma_id, bimestre, ano)
-        filename = os.path.basename(out_path)
-        return send_file(out_path, as_attachment=True, download_name=filename)
+        out_path, impressao = _render_docx_turma_unico(turma_id, bimestre, ano)
+        return _enviar_docx(out_path, impressao, f"conselho_TURMA_{turma_id}_b{bimestre}_{ano}.docx")
     except Exception as e:
         flash(f"Erro ao gerar Word da turma: {e}")
         return redirect(url_for("conselho.conselho_moderador_turma", turma_id=turma_id, bimestre=bimestre, ano=ano))
 
 
-# =========================
-# Inicialização do módulo
-# =========================
-ensure_conselho_tables()
\ No newline at end of file
+# ✅ ESCOLA: vai para a fila (fila_jobs); a tela do moderador acompanha turma a turma
+@bp_conselho.route("/conselho/moderador/gerar_escola", methods=["POST"])
+def conselho_moderador_gerar_escola():
+    if not _login_required("moderador"):
+        return redirect(url_for("login"))
+
+    bimestre = _as_int(request.form.get("bimestre"), 1) or 1
+    ano = _as_int(request.form.get("ano"), datetime.now().year) or datetime.now().year
+    formato = "docx" if request.form.get("formato") == "docx" else "zip"
+
+    job_id, _novo = fila_jobs.enfileirar(
+        "conselho_escola",
+        {"bimestre": bimestre, "ano": ano, "formato": formato},
+        f"conselho_escola_b{bimestre}_{ano}.{formato}",
+        criado_por=session.get("usuario"),
+    )
+    return redirect(url_for("conselho.conselho_moderador", bimestre=bimestre, ano=ano, job=job_id))
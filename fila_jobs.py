@@ -0,0 +1,329 @@
+# fila_jobs.py
+# Fila local de tarefas pesadas (relatórios) fora do ciclo da requisição
+#
+# - A rota chama enfileirar(tipo, parametros, nome_arquivo) e responde na hora com o id.
+# - Um pool de threads por worker (RFA_JOBS_WORKERS, padrão 2) executa a função registrada
+#   com @tipo_job("nome"), que grava o resultado direto no arquivo em PASTA_JOBS.
+# - O estado fica na tabela jobs (rfa.db), então qualquer worker do gunicorn responde
+#   /jobs/<id> (status em JSON) e /jobs/<id>/download.
+# - Pedidos idênticos (mesmo tipo + mesmos parâmetros) enquanto o primeiro ainda está na
+#   fila/executando reaproveitam o mesmo job.
+# - Cada job guarda o worker dono (host:pid). Job de worker que morreu vira 'erro' na
+#   próxima limpeza; se o dono não dá para verificar (outro host), vale o último sinal de
+#   vida (batimento_em: início e cada informar_progresso) mais antigo que JOBS_TIMEOUT_MIN.
+#   Job longo de worker vivo nunca é cortado. Arquivos e registros somem depois de JOBS_RETENCAO_H.
+# - Jobs longos podem chamar informar_progresso({...}); o dicionário aparece em /jobs/<id>.
+
+import hashlib
+import json
+import mimetypes
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import Blueprint, jsonify, send_file, session, url_for
+
+import banco
+from migracoes import migracao
+
+bp_jobs = Blueprint("jobs", __name__)
+
+PASTA_JOBS = os.environ.get(
+    "RFA_JOBS_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(banco.DB_PATH)), "jobs_gerados"),
+)
+MAX_WORKERS = int(os.environ.get("RFA_JOBS_WORKERS", "2"))
+JOBS_TIMEOUT_MIN = int(os.environ.get("RFA_JOBS_TIMEOUT_MIN", "30"))
+JOBS_RETENCAO_H = int(os.environ.get("RFA_JOBS_RETENCAO_H", "24"))
+
+FMT = "%Y-%m-%d %H:%M:%S"
+
+# tipo -> função(destino, **parametros); grava o arquivo em `destino`
+TIPOS = {}
+
+_app = None
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+_atual = threading.local()  # job em execução nesta thread (para informar_progresso)
+
+
+def tipo_job(nome: str):
+    """Decorator: registra fn(destino, **parametros) como executora do tipo `nome`."""
+    def decorator(fn):
+        TIPOS[nome] = fn
+        return fn
+    return decorator
+
+
+@migracao(5, "Tabela jobs (fila de relatórios em segundo plano)")
+def _migracao_jobs(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            tipo TEXT NOT NULL,
+            chave TEXT NOT NULL,
+            parametros TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'fila',
+            nome_arquivo TEXT,
+            caminho TEXT,
+            erro TEXT,
+            criado_por TEXT,
+            criado_em TEXT NOT NULL,
+            iniciado_em TEXT,
+            concluido_em TEXT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_chave_status ON jobs (chave, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_criado_em ON jobs (criado_em)")
+    conn.commit()
+
+
+@migracao(6, "Coluna jobs.progresso (andamento de jobs longos)")
+def _migracao_jobs_progresso(conn):
+    colunas = {r[1] for r in conn.execute("PRAGMA table_info(jobs)").fetchall()}
+    if "progresso" not in colunas:
+        conn.execute("ALTER TABLE jobs ADD COLUMN progresso TEXT")
+    conn.commit()
+
+
+@migracao(14, "Colunas jobs.dono e jobs.batimento_em (jobs presos só de worker morto)")
+def _migracao_jobs_dono(conn):
+    colunas = {r[1] for r in conn.execute("PRAGMA table_info(jobs)").fetchall()}
+    if "dono" not in colunas:
+        conn.execute("ALTER TABLE jobs ADD COLUMN dono TEXT")
+    if "batimento_em" not in colunas:
+        conn.execute("ALTER TABLE jobs ADD COLUMN batimento_em TEXT")
+    conn.commit()
+
+
+def _agora() -> str:
+    return datetime.now().strftime(FMT)
+
+
+def _chave(tipo: str, parametros: dict, criado_por: str = None) -> str:
+    # o dono entra na chave: só quem criou o job pode ler/baixar (_job_do_usuario)
+    bruto = json.dumps([tipo, parametros, criado_por], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(bruto.encode("utf-8")).hexdigest()
+
+
+def _dono() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _dono_vivo(dono):
+    """True/False se o processo dono está vivo; None se não dá para saber (outro host, sem dono)."""
+    host, _, pid = (dono or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _pool() -> ThreadPoolExecutor:
+    # um pool por processo: threads não sobrevivem ao fork do gunicorn --preload
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="jobs")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _limpar(conn):
+    """Marca como erro os jobs de worker morto e apaga os vencidos (registro + arquivo)."""
+    limite_preso = (datetime.now() - timedelta(minutes=JOBS_TIMEOUT_MIN)).strftime(FMT)
+    abertos = conn.execute(
+        "SELECT id, dono, IFNULL(batimento_em, criado_em) AS batimento FROM jobs WHERE status IN ('fila', 'executando')"
+    ).fetchall()
+    presos = []
+    for job in abertos:
+        vivo = _dono_vivo(job["dono"])
+        if vivo is False or (vivo is None and job["batimento"] < limite_preso):
+            presos.append((job["id"],))
+    conn.executemany("""
+        UPDATE jobs SET status = 'erro', erro = 'Interrompido (servidor reiniciado).'
+        WHERE id = ? AND status IN ('fila', 'executando')
+    """, presos)
+
+    limite_retencao = (datetime.now() - timedelta(hours=JOBS_RETENCAO_H)).strftime(FMT)
+    vencidos = conn.execute(
+        "SELECT id, caminho FROM jobs WHERE criado_em < ?", (limite_retencao,)
+    ).fetchall()
+    for job in vencidos:
+        if job["caminho"]:
+            try:
+                os.remove(job["caminho"])
+            except OSError:
+                pass
+    if vencidos:
+        conn.execute("DELETE FROM jobs WHERE criado_em < ?", (limite_retencao,))
+
+
+def enfileirar(tipo: str, parametros: dict, nome_arquivo: str, criado_por: str = None):
+    """
+    Coloca um job na fila. Devolve (job_id, novo). Se o mesmo usuário já tem um
+    job idêntico na fila/executando, devolve o id dele com novo=False.
+    """
+    if tipo not in TIPOS:
+        raise KeyError(f"Tipo de job desconhecido: {tipo}")
+
+    if banco.transacao_aberta_na_requisicao():
+        # o job roda em outra conexão e não enxergaria (ou travaria em) dados sem commit
+        raise RuntimeError("enfileirar() com transação aberta na requisição: faça commit/rollback antes.")
+
+    chave = _chave(tipo, parametros, criado_por)
+    # conexão própria: o commit daqui nunca leva junto o que a requisição deixou pendente
+    conn = banco.conectar_bd_avulsa()
+    try:
+        # serializa a checagem de duplicado entre workers
+        conn.execute("BEGIN IMMEDIATE")
+        _limpar(conn)
+        row = conn.execute("""
+            SELECT id FROM jobs
+            WHERE chave = ? AND status IN ('fila', 'executando')
+            ORDER BY criado_em DESC
+            LIMIT 1
+        """, (chave,)).fetchone()
+        if row:
+            conn.commit()
+            return row["id"], False
+
+        job_id = uuid.uuid4().hex
+        conn.execute("""
+            INSERT INTO jobs (id, tipo, chave, parametros, status, nome_arquivo, criado_por, criado_em, dono)
+            VALUES (?, ?, ?, ?, 'fila', ?, ?, ?, ?)
+        """, (job_id, tipo, chave, json.dumps(parametros, ensure_ascii=False), nome_arquivo, criado_por, _agora(), _dono()))
+        conn.commit()
+    finally:
+        conn.close()
+
+    _pool().submit(_executar, job_id)
+    return job_id, True
+
+
+def _executar(job_id: str):
+    with _app.app_context():
+        conn = banco.conectar_bd()
+        try:
+            job = conn.execute("SELECT tipo, parametros FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not job:
+                return
+            agora = _agora()
+            conn.execute(
+                "UPDATE jobs SET status = 'executando', iniciado_em = ?, batimento_em = ?, dono = ? WHERE id = ?",
+                (agora, agora, _dono(), job_id),
+            )
+            conn.commit()
+
+            inicio = time.perf_counter()
+            try:
+                os.makedirs(PASTA_JOBS, exist_ok=True)
+                caminho = os.path.join(PASTA_JOBS, job_id)
+                _atual.job_id = job_id
+                try:
+                    TIPOS[job["tipo"]](caminho + ".tmp", **json.loads(job["parametros"]))
+                finally:
+                    _atual.job_id = None
+                os.replace(caminho + ".tmp", caminho)
+                conn.execute(
+                    "UPDATE jobs SET status = 'concluido', caminho = ?, concluido_em = ? WHERE id = ?",
+                    (caminho, _agora(), job_id),
+                )
+                status = "concluido"
+            except Exception as e:
+                traceback.print_exc()
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.execute(
+                    "UPDATE jobs SET status = 'erro', erro = ?, concluido_em = ? WHERE id = ?",
+                    (str(e) or e.__class__.__name__, _agora(), job_id),
+                )
+                status = "erro"
+            conn.commit()
+            print(f"[JOBS] {job['tipo']} {job_id}: {status} em {int((time.perf_counter() - inicio) * 1000)} ms")
+        finally:
+            conn.close()
+
+
+def informar_progresso(dados: dict):
+    """Chamado de dentro de uma função de job: grava o andamento (JSON) no job atual."""
+    job_id = getattr(_atual, "job_id", None)
+    if not job_id:
+        return
+    conn = banco.conectar_bd()
+    try:
+        conn.execute(
+            "UPDATE jobs SET progresso = ?, batimento_em = ? WHERE id = ?",
+            (json.dumps(dados, ensure_ascii=False), _agora(), job_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def buscar(job_id: str):
+    conn = banco.conectar_bd()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def _job_do_usuario(job_id: str):
+    job = buscar(job_id)
+    if not job or "usuario" not in session:
+        return None
+    if job["criado_por"] and job["criado_por"] != session.get("usuario"):
+        return None
+    return job
+
+
+# =========================
+# Rotas
+# =========================
+
+@bp_jobs.route("/jobs/<job_id>")
+def status_job(job_id):
+    job = _job_do_usuario(job_id)
+    if not job:
+        return jsonify({"erro": "Job não encontrado."}), 404
+
+    return jsonify({
+        "id": job["id"],
+        "tipo": job["tipo"],
+        "status": job["status"],
+        "erro": job["erro"],
+        "criado_em": job["criado_em"],
+        "iniciado_em": job["iniciado_em"],
+        "concluido_em": job["concluido_em"],
+        "progresso": json.loads(job["progresso"]) if job.get("progresso") else None,
+        "download": url_for("jobs.download_job", job_id=job["id"]) if job["status"] == "concluido" else None,
+    })
+
+
+@bp_jobs.route("/jobs/<job_id>/download")
+def download_job(job_id):
+    job = _job_do_usuario(job_id)
+    if not job or job["status"] != "concluido" or not job["caminho"] or not os.path.exists(job["caminho"]):
+        return jsonify({"erro": "Arquivo não disponível."}), 404
+
+    mimetype = mimetypes.guess_type(job["nome_arquivo"] or "")[0] or "application/octet-stream"
+    return send_file(job["caminho"], as_attachment=True, download_name=job["nome_arquivo"], mimetype=mimetype)
+
+
+def init_app(app):
+    global _app
+    _app = app
+    app.register_blueprint(bp_jobs)
@@ -0,0 +1,396 @@
+from __future__ import annotations
+# importacao_alunos.py
+# Blueprint: importação EM LOTE de estudantes a partir dos PDFs de enturmação (SEEDF/CRE)
+#
+# Fluxo (moderador):
+#   1) envia vários PDFs (ou um ZIP com eles) em /alunos/importar_lote;
+#   2) cada PDF é lido página por página num pool de processos; a turma é detectada pelo
+#      cabeçalho ("Turma: ... Turno: ...") ou, na falta, pelo nome do arquivo;
+#   3) a tela mostra a prévia (novos / já cadastrados / turma não reconhecida) sem gravar nada;
+#   4) ao confirmar, tudo entra numa única transação com executemany.
+# A prévia não fica no servidor: os nomes de cada arquivo voltam no próprio formulário,
+# então qualquer worker do gunicorn processa a confirmação.
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import unicodedata
+import zipfile
+from io import BytesIO
+
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+
+import processos
+from banco import conectar_bd
+from cache_local import CacheLRU
+
+bp_importacao = Blueprint("importacao_alunos", __name__, template_folder="templates")
+
+# Processos para ler os PDFs (um PDF por tarefa)
+PROCESSOS_IMPORTACAO = int(os.environ.get("RFA_IMPORTACAO_PROCESSOS", str(min(4, os.cpu_count() or 1))))
+MAX_ARQUIVOS = 200
+
+# PDFs já lidos, por hash do conteúdo. LRU simples, de cada worker: o hash já identifica
+# o arquivo, então não há versão no banco a conferir; outro worker só relê o PDF uma vez.
+_cache_pdfs = CacheLRU(64)
+
+# Linha de estudante: "123456 NOME COMPLETO (61) 9..."
+RE_LINHA_ALUNO = re.compile(r"^\s*\d+\s+(.+?)\s*(?:\(|$)")
+RE_ESPACOS = re.compile(r"\s{2,}")
+# Cabeçalho: "Turma: 5º ANO A" / "Turno: MATUTINO" (na mesma linha ou em linhas separadas)
+RE_TURMA = re.compile(r"\bTURMA\s*[:\-]\s*(.+?)(?=\s+TURNO\b|\s{2,}|$)", re.IGNORECASE)
+RE_TURNO = re.compile(r"\bTURNO\s*[:\-]\s*([A-Za-zÀ-ÿ]+)", re.IGNORECASE)
+
+
+# =========================
+# Leitura do PDF (roda nos processos do pool)
+# =========================
+
+def _paginas_pdf(dados: bytes):
+    """
+    Texto de cada página, uma por vez (nada de juntar o documento inteiro).
+    pdfplumber por padrão; só a página que falhar é relida com PyPDF2.
+    Se o pdfplumber nem abrir o arquivo, tudo vai pelo PyPDF2.
+    """
+    leitor_pypdf = None
+
+    def _pagina_pypdf(indice):
+        nonlocal leitor_pypdf
+        if leitor_pypdf is None:
+            from PyPDF2 import PdfReader
+            leitor_pypdf = PdfReader(BytesIO(dados))
+        return leitor_pypdf.pages[indice].extract_text() or ""
+
+    try:
+        import pdfplumber
+        pdf = pdfplumber.open(BytesIO(dados))
+    except Exception:
+        pdf = None
+
+    if pdf is None:
+        from PyPDF2 import PdfReader
+        for p in PdfReader(BytesIO(dados)).pages:
+            yield p.extract_text() or ""
+        return
+
+    with pdf:
+        for indice, page in enumerate(pdf.pages):
+            try:
+                texto = page.extract_text() or ""
+            except Exception:
+                texto = _pagina_pypdf(indice)
+            finally:
+                page.flush_cache()
+            yield texto
+
+
+def nomes_da_pagina(texto: str):
+    """Nomes de estudantes de uma página (código, telefone e cabeçalhos são ignorados)."""
+    for raw in texto.splitlines():
+        linha = (raw or "").strip()
+        if not linha:
+            continue
+        m = RE_LINHA_ALUNO.match(linha)
+        if not m:
+            continue
+        candidato = m.group(1).strip()
+        # cabeçalho da tabela ("Código Nome do Estudante/Nome Social Telefone")
+        if "NOME DO ESTUDANTE" in candidato.upper():
+            continue
+        yield RE_ESPACOS.sub(" ", candidato).strip()
+
+
+def _cabecalho_turma(texto: str):
+    """(turma, turno) lidos do cabeçalho da página; strings vazias se não achar."""
+    turma = turno = ""
+    for linha in texto.splitlines():
+        if not turma:
+            m = RE_TURMA.search(linha)
+            if m:
+                turma = m.group(1).strip(" -:")
+        if not turno:
+            m = RE_TURNO.search(linha)
+            if m:
+                turno = m.group(1).strip()
+        if turma and turno:
+            break
+    return turma, turno
+
+
+def nomes_do_pdf(dados: bytes, info: dict | None = None):
+    """
+    Gera os nomes (sem repetidos, na ordem do PDF) à medida que as páginas são lidas.
+    Se `info` vier, recebe "paginas" e, do primeiro cabeçalho que tiver, "turma"/"turno".
+    """
+    vistos = set()
+    for texto in _paginas_pdf(dados):
+        if info is not None:
+            info["paginas"] += 1
+            if not info["turma"]:
+                info["turma"], turno = _cabecalho_turma(texto)
+                info["turno"] = info["turno"] or turno
+        for nome in nomes_da_pagina(texto):
+            chave = nome.upper()
+            if chave not in vistos:
+                vistos.add(chave)
+                yield nome
+
+
+def analisar_pdf(nome_arquivo: str, dados: bytes) -> dict:
+    """Lê um PDF de enturmação. Devolve {arquivo, turma, turno, nomes, paginas, erro}."""
+    resultado = {"arquivo": nome_arquivo, "turma": "", "turno": "", "nomes": [], "paginas": 0, "erro": None}
+    try:
+        for nome in nomes_do_pdf(dados, resultado):
+            resultado["nomes"].append(nome)
+    except Exception as e:
+        resultado["erro"] = f"Não foi possível ler o PDF: {e}"
+    return resultado
+
+
+def _hash_pdf(dados: bytes) -> str:
+    return hashlib.sha1(dados).hexdigest()
+
+
+def _do_cache(chave: str, nome_arquivo: str):
+    em_cache = _cache_pdfs.get(chave)
+    if em_cache is None:
+        return None
+    return dict(em_cache, arquivo=nome_arquivo, nomes=list(em_cache["nomes"]))
+
+
+def _guardar_no_cache(chave: str, resultado: dict):
+    if not resultado["erro"]:
+        _cache_pdfs.set(chave, dict(resultado, nomes=tuple(resultado["nomes"])))
+
+
+def analisar_pdf_em_cache(nome_arquivo: str, dados: bytes) -> dict:
+    """analisar_pdf() com cache por hash do arquivo (reenviar a mesma lista é imediato)."""
+    chave = _hash_pdf(dados)
+    resultado = _do_cache(chave, nome_arquivo)
+    if resultado is None:
+        resultado = analisar_pdf(nome_arquivo, dados)
+        _guardar_no_cache(chave, resultado)
+    return resultado
+
+
+# =========================
+# Turma detectada -> turma do banco
+# =========================
+
+def _normalizar(txt: str) -> str:
+    """'5º Ano A' -> '5A' (sem acento, sem símbolos, sem a palavra ANO, maiúsculo)."""
+    # º/ª antes do NFKD (que os transformaria em "o"/"a")
+    txt = (txt or "").replace("º", " ").replace("ª", " ").replace("°", " ")
+    txt = unicodedata.normalize("NFKD", txt)
+    txt = "".join(c for c in txt if not unicodedata.combining(c))
+    txt = re.sub(r"\bANOS?\b", "", txt.upper())
+    return re.sub(r"[^0-9A-Z]", "", txt)
+
+
+def _turma_correspondente(texto_turma: str, texto_turno: str, turmas) -> int | None:
+    alvo = _normalizar(texto_turma)
+    if not alvo:
+        return None
+    turno = _normalizar(texto_turno)
+
+    exatas = [t for t in turmas if _normalizar(t["nome"]) == alvo]
+    if not exatas:
+        # cabeçalho com texto a mais ("5º ANO A - ENSINO FUNDAMENTAL"): maior nome contido
+        contidas = [t for t in turmas if _normalizar(t["nome"]) and _normalizar(t["nome"]) in alvo]
+        if contidas:
+            maior = max(len(_normalizar(t["nome"])) for t in contidas)
+            exatas = [t for t in contidas if len(_normalizar(t["nome"])) == maior]
+
+    if turno:
+        mesmo_turno = [t for t in exatas if _normalizar(t["turno"]) == turno]
+        if mesmo_turno:
+            exatas = mesmo_turno
+    return exatas[0]["id"] if len(exatas) == 1 else None
+
+
+def _turma_pelo_arquivo(nome_arquivo: str, turmas) -> int | None:
+    base = os.path.splitext(os.path.basename(nome_arquivo))[0]
+    return _turma_correspondente(base, "", turmas)
+
+
+# =========================
+# Upload -> PDFs
+# =========================
+
+def _pdfs_do_upload(arquivos):
+    """Lista de (nome, bytes) com os PDFs enviados, abrindo ZIPs."""
+    pdfs = []
+    for f in arquivos:
+        if not f or not f.filename:
+            continue
+        dados = f.read()
+        nome = f.filename
+        if nome.lower().endswith(".zip"):
+            with zipfile.ZipFile(BytesIO(dados)) as zf:
+                for info in zf.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+                        continue
+                    pdfs.append((os.path.basename(info.filename), zf.read(info)))
+        elif nome.lower().endswith(".pdf"):
+            pdfs.append((nome, dados))
+    return pdfs
+
+
+def _analisar_todos(pdfs) -> list:
+    """Resultados na ordem dos arquivos; só os PDFs fora do cache vão para o pool."""
+    chaves = [_hash_pdf(dados) for _nome, dados in pdfs]
+    resultados = [_do_cache(chave, nome) for chave, (nome, _dados) in zip(chaves, pdfs)]
+    faltando = [i for i, r in enumerate(resultados) if r is None]
+
+    if len(faltando) == 1:
+        i = faltando[0]
+        resultados[i] = analisar_pdf(*pdfs[i])
+    elif faltando:
+        qtd_processos = max(1, min(PROCESSOS_IMPORTACAO, len(faltando)))
+        with processos.pool_processos(qtd_processos) as pool:
+            lidos = pool.map(analisar_pdf, *zip(*(pdfs[i] for i in faltando)))
+            for i, r in zip(faltando, lidos):
+                resultados[i] = r
+
+    for i in faltando:
+        _guardar_no_cache(chaves[i], resultados[i])
+    return resultados
+
+
+def _nomes_existentes(cur, turma_ids) -> dict:
+    """turma_id -> set(NOME EM MAIÚSCULAS) já cadastrados (uma consulta)."""
+    existentes = {tid: set() for tid in turma_ids}
+    if not turma_ids:
+        return existentes
+    marcadores = ",".join("?" * len(turma_ids))
+    cur.execute(f"SELECT turma_id, nome FROM alunos WHERE turma_id IN ({marcadores})", list(turma_ids))
+    for r in cur.fetchall():
+        existentes[r["turma_id"]].add((r["nome"] or "").strip().upper())
+    return existentes
+
+
+def _montar_previa(resultados, turmas, cur) -> list:
+    for r in resultados:
+        r["turma_id"] = (
+            _turma_correspondente(r["turma"], r["turno"], turmas)
+            or _turma_pelo_arquivo(r["arquivo"], turmas)
+        )
+
+    existentes = _nomes_existentes(cur, {r["turma_id"] for r in resultados if r["turma_id"]})
+    for r in resultados:
+        ja = existentes.get(r["turma_id"], set())
+        r["novos"] = [n for n in r["nomes"] if n.upper() not in ja]
+        r["repetidos"] = [n for n in r["nomes"] if n.upper() in ja]
+        r["nomes_json"] = json.dumps(r["nomes"], ensure_ascii=False)
+    return resultados
+
+
+# =========================
+# Rotas
+# =========================
+
+def _moderador() -> bool:
+    return "usuario" in session and session.get("tipo") == "moderador"
+
+
+@bp_importacao.route("/alunos/importar_lote", methods=["GET", "POST"])
+def importar_lote():
+    if not _moderador():
+        flash("Acesso não autorizado.")
+        return redirect(url_for("login"))
+
+    conn = conectar_bd()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT id, nome, turno FROM turmas ORDER BY turno, nome")
+        turmas = cur.fetchall()
+
+        if request.method == "GET":
+            return render_template("importar_alunos_lote.html", turmas=turmas, previa=None)
+
+        try:
+            pdfs = _pdfs_do_upload(request.files.getlist("arquivos"))
+        except zipfile.BadZipFile:
+            flash("O ZIP enviado está corrompido.")
+            return redirect(url_for("importacao_alunos.importar_lote"))
+
+        if not pdfs:
+            flash("Envie pelo menos um PDF de enturmação (ou um ZIP com os PDFs).")
+            return redirect(url_for("importacao_alunos.importar_lote"))
+        if len(pdfs) > MAX_ARQUIVOS:
+            flash(f"Envie no máximo {MAX_ARQUIVOS} PDFs por vez.")
+            return redirect(url_for("importacao_alunos.importar_lote"))
+
+        previa = _montar_previa(_analisar_todos(pdfs), turmas, cur)
+        print(f"[IMPORTACAO] {len(pdfs)} PDF(s) analisados, {sum(len(r['nomes']) for r in previa)} nome(s)")
+        return render_template("importar_alunos_lote.html", turmas=turmas, previa=previa)
+    finally:
+        cur.close()
+        conn.close()
+
+
+@bp_importacao.route("/alunos/importar_lote/confirmar", methods=["POST"])
+def confirmar_importacao():
+    if not _moderador():
+        flash("Acesso não autorizado.")
+        return redirect(url_for("login"))
+
+    # turma_id -> nomes (na ordem dos PDFs), vindos da prévia
+    por_turma: dict = {}
+    total_arquivos = int(request.form.get("total") or 0)
+    for i in range(total_arquivos):
+        try:
+            turma_id = int(request.form.get(f"turma_{i}") or 0)
+            nomes = json.loads(request.form.get(f"nomes_{i}") or "[]")
+        except (ValueError, TypeError):
+            continue
+        if not turma_id or not isinstance(nomes, list):
+            continue
+        por_turma.setdefault(turma_id, []).extend(str(n).strip() for n in nomes if str(n).strip())
+
+    if not por_turma:
+        flash("Nenhum arquivo com turma definida para importar.")
+        return redirect(url_for("importacao_alunos.importar_lote"))
+
+    conn = conectar_bd()
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"SELECT id FROM turmas WHERE id IN ({','.join('?' * len(por_turma))})", list(por_turma)
+        )
+        validas = {r["id"] for r in cur.fetchall()}
+        existentes = _nomes_existentes(cur, validas)
+
+        novos = []
+        for turma_id, nomes in por_turma.items():
+            if turma_id not in validas:
+                continue
+            vistos = existentes[turma_id]
+            for nome in nomes:
+                chave = nome.upper()
+                if chave in vistos:
+                    continue
+                vistos.add(chave)
+                novos.append((nome, turma_id))
+
+        if not novos:
+            flash("Nenhum aluno novo para cadastrar (todos já existiam nas turmas).")
+            return redirect(url_for("importacao_alunos.importar_lote"))
+
+        try:
+            cur.executemany("INSERT INTO alunos (nome, turma_id) VALUES (?, ?)", novos)
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            flash(f"Erro ao importar alunos (nada foi gravado): {e}")
+            return redirect(url_for("importacao_alunos.importar_lote"))
+
+        turmas_afetadas = len({tid for _n, tid in novos})
+        print(f"[IMPORTACAO] {len(novos)} aluno(s) cadastrados em {turmas_afetadas} turma(s)")
+        flash(f"Importação concluída: {len(novos)} aluno(s) cadastrado(s) em {turmas_afetadas} turma(s).")
+        return redirect(url_for("importacao_alunos.importar_lote"))
+    finally:
+        cur.close()
+        conn.close()
@@ -0,0 +1,255 @@
+# indices.py
+# Índices secundários das tabelas "quentes" + verificação de plano de consulta
+#
+# - INDICES: lista mantida de índices (nome, tabela, colunas). Cada um acompanha um
+#   WHERE/ORDER BY real das rotas (comentário ao lado).
+# - A migração 2 cria todos; novos índices entram em uma NOVA migração chamando criar_indices().
+#   Tabela que não existia na hora é pulada: a verificação acusa o índice que faltar
+#   depois que ela aparecer (flask --app app indices criar resolve).
+# - CONSULTAS_QUENTES: as consultas das rotas mais acessadas, registradas pelo próprio
+#   módulo da rota com consulta_quente() (a mesma constante/montagem que a rota executa),
+#   com a tabela que NÃO pode ser lida por inteiro. A verificação roda EXPLAIN QUERY PLAN
+#   em cada uma e falha se aparecer um "SCAN <tabela>" sem índice.
+#       flask --app app indices verificar     (sai com código 1 se houver regressão)
+
+import sqlite3
+import sys
+
+import click
+
+import banco
+from migracoes import migracao
+
+# (nome, tabela, colunas)
+INDICES = [
+    # alunos WHERE turma_id = ? ORDER BY nome (seleções de turma em quase todas as telas)
+    ("idx_alunos_turma_nome", "alunos", "turma_id, nome"),
+
+    # notificações/estatísticas do professor: professor_id + visualizado, ORDER BY data_criacao
+    ("idx_recados_aluno_prof_visto", "recados_aluno", "professor_id, visualizado, data_criacao"),
+    # área do responsável: WHERE ra.aluno_id = ? ORDER BY ra.data_criacao DESC
+    ("idx_recados_aluno_aluno_data", "recados_aluno", "aluno_id, data_criacao"),
+
+    # calendário/notificações: WHERE professor_id = ? ... ORDER BY data_avaliacao
+    ("idx_avaliacoes_prof_data", "avaliacoes_bimestrais", "professor_id, data_avaliacao"),
+    # área do responsável: WHERE turma_id = ? ORDER BY ano DESC, bimestre, data_avaliacao
+    ("idx_avaliacoes_turma_ano_bim", "avaliacoes_bimestrais", "turma_id, ano, bimestre, data_avaliacao"),
+
+    # planejamentos da turma (JOIN planejamentos_turmas ... WHERE pt.turma_id = ?)
+    ("idx_planejamentos_turmas_turma", "planejamentos_turmas", "turma_id, planejamento_id"),
+    # itens: WHERE planejamento_id IN (...) ORDER BY planejamento_id, id
+    ("idx_planejamento_itens_plan", "planejamento_itens", "planejamento_id"),
+
+    # ocorrências da turma (com ou sem aluno) ORDER BY data DESC
+    ("idx_ocorrencias_turma_aluno", "ocorrencias", "turma_id, aluno_id, data"),
+    # área do responsável: WHERE aluno_id = ? ORDER BY data DESC
+    ("idx_ocorrencias_aluno_data", "ocorrencias", "aluno_id, data"),
+
+    # atestados do aluno (área do responsável)
+    ("idx_atestados_aluno", "atestados", "aluno_id, data_atestado"),
+
+    # biblioteca: WHERE status = 'Emprestado' [AND data_emprestimo = ?] ORDER BY data_emprestimo DESC
+    ("idx_emprestimos_status_data", "emprestimos_biblioteca", "status, data_emprestimo"),
+    # biblioteca: empréstimos do mês / últimos 30 dias (faixa em data_emprestimo)
+    ("idx_emprestimos_data", "emprestimos_biblioteca", "data_emprestimo, turma_id"),
+    # histórico do estudante / da turma: WHERE aluno_id|turma_id = ? ORDER BY data_emprestimo DESC, id DESC
+    # (páginas por marcador; o id vem de graça no fim de todo índice do SQLite)
+    ("idx_emprestimos_aluno_data", "emprestimos_biblioteca", "aluno_id, data_emprestimo"),
+    ("idx_emprestimos_turma_data", "emprestimos_biblioteca", "turma_id, data_emprestimo"),
+
+    # logs de acesso: faixa de datas + ORDER BY data_hora DESC
+    ("idx_logs_acessos_data", "logs_acessos", "data_hora"),
+
+    # conselho: tudo de uma turma em (bimestre, ano), agrupado por aluno
+    ("idx_conselhos_registros_turma_bim", "conselhos_registros", "turma_id, bimestre, ano, aluno_id, disciplina_abrev"),
+]
+
+
+# (descrição, tabela que não pode sofrer SCAN, nome dela no plano (alias), sql, parâmetros de exemplo)
+# Preenchida pelos módulos das rotas com consulta_quente(), ao lado da SQL que a rota executa.
+CONSULTAS_QUENTES = []
+
+
+def consulta_quente(descricao: str, tabela: str, alvo: str, sql, params=()):
+    """
+    Registra uma consulta de rota para a verificação e devolve `sql` (registra na mesma
+    linha em que a constante da rota é definida).
+    `sql` também pode ser fn(cursor) que roda a montagem real da rota (SQL dinâmica):
+    a verificação passa um cursor que só grava o que seria executado.
+    """
+    CONSULTAS_QUENTES.append((descricao, tabela, alvo, sql, tuple(params)))
+    return sql
+
+
+class _CursorGravador:
+    """Cursor que não executa: guarda (sql, params) e devolve resultado vazio."""
+
+    def __init__(self):
+        self.consultas = []
+
+    def execute(self, sql, params=()):
+        self.consultas.append((sql, tuple(params)))
+        return self
+
+    def fetchall(self):
+        return []
+
+    def fetchone(self):
+        return None
+
+    def close(self):
+        pass
+
+
+def _tabela_existe(conn, tabela: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=? LIMIT 1", (tabela,)
+    ).fetchone()
+    return row is not None
+
+
+def _colunas(conn, tabela: str) -> set:
+    return {r[1] for r in conn.execute(f"PRAGMA table_info({tabela})").fetchall()}
+
+
+def criar_indices(conn, indices=None) -> list:
+    """
+    Cria (IF NOT EXISTS) os índices cujas tabelas/colunas existem neste banco.
+    Tabelas antigas que não existirem (ex.: ocorrencias em banco novo) são puladas.
+    Devolve os nomes criados/confirmados.
+    """
+    feitos = []
+    for nome, tabela, colunas in (indices or INDICES):
+        if not _tabela_existe(conn, tabela):
+            continue
+        cols = [c.strip() for c in colunas.split(",")]
+        if not set(cols) <= _colunas(conn, tabela):
+            continue
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {nome} ON {tabela} ({colunas})")
+        feitos.append(nome)
+    conn.commit()
+    return feitos
+
+
+@migracao(2, "Índices das colunas de filtro/ordenação das rotas mais acessadas")
+def _migracao_indices(conn):
+    criar_indices(conn)
+
+
+@migracao(12, "Índices do histórico da biblioteca (aluno/turma + data do empréstimo)")
+def _migracao_indices_historico_biblioteca(conn):
+    criar_indices(conn, [i for i in INDICES if i[0] in ("idx_emprestimos_aluno_data", "idx_emprestimos_turma_data")])
+
+
+@migracao(16, "Índices que a migração 2 pulou (tabelas criadas depois dela)")
+def _migracao_indices_pulados(conn):
+    criar_indices(conn)
+
+
+def indices_faltando(conn) -> list:
+    """(nome, tabela) dos INDICES ausentes em tabelas que existem neste banco."""
+    existentes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall()}
+    return [
+        (nome, tabela) for nome, tabela, _colunas in INDICES
+        if nome not in existentes and _tabela_existe(conn, tabela)
+    ]
+
+
+def _scan_completo(detalhe: str, alvo: str) -> bool:
+    # SQLite >= 3.36: "SCAN alunos" / "SCAN a USING INDEX ..."; antigos: "SCAN TABLE alunos AS a"
+    partes = detalhe.replace("SCAN TABLE ", "SCAN ").split()
+    if len(partes) < 2 or partes[0] != "SCAN":
+        return False
+    if alvo not in (partes[1], partes[-1]):
+        return False
+    return "USING" not in partes
+
+
+def verificar_planos(conn) -> list:
+    """
+    Roda EXPLAIN QUERY PLAN nas CONSULTAS_QUENTES.
+    Devolve lista de (descricao, status, plano) com status 'ok', 'scan', 'erro'
+    (a consulta ou o montador dela quebrou) ou 'pulada' (tabela não existe neste banco).
+    """
+    resultado = []
+    for descricao, tabela, alvo, sql, params in CONSULTAS_QUENTES:
+        if not _tabela_existe(conn, tabela):
+            resultado.append((descricao, "pulada", [f"tabela {tabela} não existe"]))
+            continue
+        try:
+            if callable(sql):
+                gravador = _CursorGravador()
+                sql(gravador)
+                consultas = gravador.consultas
+            else:
+                consultas = [(sql, params)]
+            plano = []
+            for texto, valores in consultas:
+                plano += [r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + texto, valores).fetchall()]
+        except sqlite3.OperationalError as e:
+            # tabela de um JOIN que este banco ainda não tem: mesmo caso da checagem acima
+            status = "pulada" if str(e).startswith("no such table") else "erro"
+            resultado.append((descricao, status, [str(e)]))
+            continue
+        except Exception as e:
+            resultado.append((descricao, "erro", [f"{e.__class__.__name__}: {e}"]))
+            continue
+
+        status = "scan" if any(_scan_completo(d, alvo) for d in plano) else "ok"
+        resultado.append((descricao, status, plano))
+    return resultado
+
+
+@click.group("indices")
+def cli_indices():
+    """Índices do banco (rfa.db)."""
+
+
+@cli_indices.command("verificar")
+def cli_verificar():
+    """EXPLAIN QUERY PLAN das consultas quentes; falha se alguma fizer SCAN completo, der erro ou faltar índice."""
+    conn = banco.conectar_bd()
+    try:
+        faltando = indices_faltando(conn)
+        resultado = verificar_planos(conn)
+    finally:
+        conn.close()
+
+    for nome, tabela in faltando:
+        click.echo(f"[FALTA] índice {nome} ({tabela})")
+
+    falhas = erros = 0
+    for descricao, status, plano in resultado:
+        marca = {"ok": "OK  ", "scan": "SCAN", "erro": "ERRO", "pulada": "--  "}[status]
+        click.echo(f"[{marca}] {descricao}")
+        if status != "ok":
+            for linha in plano:
+                click.echo(f"         {linha}")
+        if status == "scan":
+            falhas += 1
+        elif status == "erro":
+            erros += 1
+
+    if falhas:
+        click.echo(f"{falhas} consulta(s) quente(s) sem índice.")
+    if erros:
+        click.echo(f"{erros} consulta(s) quente(s) com erro.")
+    if faltando:
+        click.echo(f"{len(faltando)} índice(s) faltando. Rode: flask --app app indices criar")
+    if falhas or erros or faltando:
+        sys.exit(1)
+
+
+@cli_indices.command("criar")
+def cli_criar():
+    """Cria os índices que estiverem faltando (idempotente)."""
+    conn = banco.conectar_bd()
+    try:
+        for nome in criar_indices(conn):
+            click.echo(nome)
+    finally:
+        conn.close()
+
+
+def init_app(app):
+    app.cli.add_command(cli_indices)
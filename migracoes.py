@@ -0,0 +1,198 @@
+# migracoes.py
+# Migrações versionadas do rfa.db
+#
+# - Tabela schema_version guarda quais versões já foram aplicadas.
+# - Cada módulo registra suas migrações com @migracao(versao, "descrição").
+#   A numeração é GLOBAL (app.py e blueprints dividem a mesma sequência).
+# - Na subida de cada worker: uma única consulta (MAX(versao)). Se houver pendentes,
+#   o primeiro worker que pegar o lock de arquivo aplica; os outros esperam e só conferem.
+# - CLI:  flask --app app migracoes status
+#         flask --app app migracoes aplicar
+
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+
+import banco
+
+try:
+    import fcntl
+except ImportError:  # Windows (ambiente de desenvolvimento): roda sem lock
+    fcntl = None
+
+# versao -> (descricao, funcao)
+MIGRACOES = {}
+
+# fn() chamadas depois que este processo aplica alguma migração (ex.: limpar caches de esquema)
+APOS_MIGRAR = []
+
+LOCK_PATH = banco.DB_PATH + ".migracoes.lock"
+
+
+def migracao(versao: int, descricao: str):
+    """Decorator: registra fn(conn) como a migração `versao`."""
+    def decorator(fn):
+        if versao in MIGRACOES:
+            raise RuntimeError(f"Migração {versao} registrada duas vezes ({MIGRACOES[versao][1].__name__} e {fn.__name__})")
+        MIGRACOES[versao] = (descricao, fn)
+        return fn
+    return decorator
+
+
+def apos_migrar(fn):
+    """Decorator: fn() roda depois de cada aplicação de migrações neste processo."""
+    APOS_MIGRAR.append(fn)
+    return fn
+
+
+def versao_mais_recente() -> int:
+    return max(MIGRACOES) if MIGRACOES else 0
+
+
+def _garantir_tabela(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            versao INTEGER PRIMARY KEY,
+            descricao TEXT NOT NULL,
+            aplicada_em TEXT NOT NULL,
+            duracao_ms INTEGER
+        )
+    """)
+    conn.commit()
+
+
+def versao_atual(conn) -> int:
+    try:
+        row = conn.execute("SELECT MAX(versao) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        # banco novo (ou anterior ao controle de versão)
+        return 0
+    return (row[0] or 0) if row else 0
+
+
+def versoes_aplicadas(conn) -> dict:
+    try:
+        rows = conn.execute(
+            "SELECT versao, descricao, aplicada_em, duracao_ms FROM schema_version ORDER BY versao"
+        ).fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    return {r["versao"]: r for r in rows}
+
+
+def pendentes(conn) -> list:
+    aplicadas = versoes_aplicadas(conn)
+    return [v for v in sorted(MIGRACOES) if v not in aplicadas]
+
+
+class _LockArquivo:
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = open(self.caminho, "a+")
+        if fcntl is not None:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._fh.close()
+
+
+def aplicar_pendentes(app, log=print) -> list:
+    """
+    Aplica as migrações pendentes, em ordem, sob lock de arquivo.
+    Roda dentro de app_context: todas as funções de ensure_*/conectar_bd()
+    chamadas pela migração usam a mesma conexão.
+    Devolve a lista de versões aplicadas agora.
+    """
+    aplicadas_agora = []
+    with _LockArquivo(LOCK_PATH), app.app_context():
+        conn = banco.conectar_bd()
+        try:
+            _garantir_tabela(conn)
+            for versao in pendentes(conn):
+                descricao, fn = MIGRACOES[versao]
+                inicio = time.perf_counter()
+                log(f"[MIGRACOES] Aplicando {versao}: {descricao}")
+                fn(conn)
+                duracao_ms = int((time.perf_counter() - inicio) * 1000)
+                conn.execute(
+                    "INSERT INTO schema_version (versao, descricao, aplicada_em, duracao_ms) VALUES (?, ?, ?, ?)",
+                    (versao, descricao, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), duracao_ms),
+                )
+                conn.commit()
+                aplicadas_agora.append(versao)
+        finally:
+            conn.close()
+    if aplicadas_agora:
+        for fn in APOS_MIGRAR:
+            fn()
+    return aplicadas_agora
+
+
+def garantir_atualizado(app) -> int:
+    """
+    Chamado na subida de cada worker. Caminho normal: uma consulta e pronto.
+    Com MIGRACOES_AUTO = False (deploy aplica via CLI), só avisa se houver pendentes.
+    """
+    conn = banco.conectar_bd()
+    try:
+        atual = versao_atual(conn)
+    finally:
+        conn.close()
+
+    alvo = versao_mais_recente()
+    if atual >= alvo:
+        return atual
+
+    if not app.config.get("MIGRACOES_AUTO", True):
+        print(f"[MIGRACOES] Banco na versão {atual}, código espera {alvo}. Rode: flask --app app migracoes aplicar")
+        return atual
+
+    aplicar_pendentes(app)
+    return alvo
+
+
+@click.group("migracoes")
+def cli_migracoes():
+    """Migrações do banco (rfa.db)."""
+
+
+@cli_migracoes.command("status")
+def cli_status():
+    """Lista migrações aplicadas e pendentes."""
+    conn = banco.conectar_bd()
+    try:
+        aplicadas = versoes_aplicadas(conn)
+    finally:
+        conn.close()
+    for versao in sorted(MIGRACOES):
+        descricao, _fn = MIGRACOES[versao]
+        if versao in aplicadas:
+            r = aplicadas[versao]
+            click.echo(f"[x] {versao:04d} {descricao}  ({r['aplicada_em']}, {r['duracao_ms']} ms)")
+        else:
+            click.echo(f"[ ] {versao:04d} {descricao}")
+
+
+@cli_migracoes.command("aplicar")
+def cli_aplicar():
+    """Aplica as migrações pendentes."""
+    feitas = aplicar_pendentes(current_app._get_current_object(), log=click.echo)
+    if not feitas:
+        click.echo("Nenhuma migração pendente.")
+
+
+def init_app(app):
+    app.config.setdefault("MIGRACOES_AUTO", os.environ.get("RFA_MIGRACOES_AUTO", "1") != "0")
+    app.cli.add_command(cli_migracoes)
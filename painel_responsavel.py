@@ -0,0 +1,569 @@
+# painel_responsavel.py
+# Dados da Área do Responsável
+#
+# A página é só uma "casca": cabeçalho (aluno, turma, listas dos filtros e totais) e
+# as seções vazias. Cada seção é buscada sob demanda em /api/responsavel/<secao>,
+# em páginas de LIMITE_PADRAO itens, com paginação por chave (data, id) decrescente:
+#     ?after=<data>|<id>   ->  WHERE (data < ?) OR (data = ? AND id < ?)
+# Assim o custo da primeira tela é o mesmo em fevereiro e em dezembro.
+#
+# Cabeçalho e páginas ficam em cache por worker, validados pela versão 'turma:<id>'
+# em cache_versoes. Triggers incrementam essa versão sempre que um professor grava
+# planejamento, item, avaliação, ocorrência, atestado, recado ou empréstimo da turma.
+
+from datetime import datetime
+
+import cache_local
+import indices
+from migracoes import migracao
+
+LIMITE_PADRAO = 20
+LIMITE_MAXIMO = 100
+
+_cache = cache_local.CacheVersionado(max_itens=512, ttl_s=600)
+_turma_do_aluno = {}
+
+# (tabela, expressão do escopo com {r} = NEW/OLD, origem opcional)
+_TRIGGERS = [
+    ("avaliacoes_bimestrais", "'turma:' || {r}.turma_id", ""),
+    ("recados_aluno", "'turma:' || {r}.turma_id", ""),
+    ("atestados", "'turma:' || {r}.turma_id", ""),
+    ("ocorrencias", "'turma:' || {r}.turma_id", ""),
+    ("emprestimos_biblioteca", "'turma:' || {r}.turma_id", ""),
+    ("planejamentos_turmas", "'turma:' || {r}.turma_id", ""),
+    ("planejamento_itens", "'turma:' || pt.turma_id",
+     "FROM planejamentos_turmas pt WHERE pt.planejamento_id = {r}.planejamento_id"),
+    ("planejamentos", "'turma:' || pt.turma_id",
+     "FROM planejamentos_turmas pt WHERE pt.planejamento_id = {r}.id"),
+    ("alunos", "'turma:' || {r}.turma_id", ""),
+]
+
+
+def criar_triggers(conn):
+    existentes = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()}
+    for tabela, escopo, origem in _TRIGGERS:
+        if tabela not in existentes:
+            continue
+        eventos = [("ins", "INSERT", ["NEW"]), ("upd", "UPDATE", ["OLD", "NEW"]), ("del", "DELETE", ["OLD"])]
+        if tabela == "alunos":
+            # só o que aparece no cabeçalho da turma: troca de turma, nome e exclusão
+            eventos = [("upd", "UPDATE OF turma_id, nome", ["OLD", "NEW"]), ("del", "DELETE", ["OLD"])]
+        for sufixo, evento, refs in eventos:
+            corpo = "\n".join(
+                cache_local.sql_incrementar(escopo.format(r=r), origem.format(r=r)) for r in refs
+            )
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_cv_{tabela}_{sufixo}
+                AFTER {evento} ON {tabela}
+                BEGIN
+                    {corpo}
+                END
+            """)
+    conn.commit()
+
+
+@migracao(4, "Triggers de versão por turma (cache da Área do Responsável)")
+def _migracao_triggers(conn):
+    criar_triggers(conn)
+
+
+@migracao(17, "Trigger de versão dos alunos também na troca de nome")
+def _migracao_trigger_nome_aluno(conn):
+    conn.execute("DROP TRIGGER IF EXISTS trg_cv_alunos_upd")
+    criar_triggers(conn)
+
+
+# =========================
+# Helpers
+# =========================
+
+def _int_ou_none(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _data_br(val, formato="%Y-%m-%d", vazio="-"):
+    if not val:
+        return vazio
+    try:
+        return datetime.strptime(val, formato).strftime("%d/%m/%Y")
+    except ValueError:
+        return val
+
+
+def ler_cursor(after: str):
+    """'2026-03-01|42' -> ('2026-03-01', 42). Cursor vazio -> None; inválido -> ValueError."""
+    if not after:
+        return None
+    chave, sep, id_ = after.rpartition("|")
+    if not sep:
+        raise ValueError("cursor inválido")
+    return chave, int(id_)
+
+
+def _cursor(chave, id_) -> str:
+    return f"{chave or ''}|{id_}"
+
+
+def _keyset(sql: str, params: list, expr: str, col_id: str, after):
+    """Acrescenta a condição de página (expr, id) < cursor, em ordem decrescente."""
+    if after:
+        chave, id_ = after
+        sql += f" AND ({expr} < ? OR ({expr} = ? AND {col_id} < ?))"
+        params += [chave, chave, id_]
+    return sql, params
+
+
+def _filtro_bimestre_mes(coluna: str, valor, sql: str, params: list):
+    """Bimestre derivado do mês da data (ocorrências e recados), como no SQL original."""
+    b = _int_ou_none(valor)
+    if b is not None:
+        sql += f" AND (((CAST(strftime('%m', {coluna}) AS INTEGER) - 1) / 3) + 1) = ?"
+        params.append(b)
+    return sql, params
+
+
+def _filtro_bimestre(coluna: str, valor, sql: str, params: list):
+    b = _int_ou_none(valor)
+    if b is not None:
+        sql += f" AND {coluna} = ?"
+        params.append(b)
+    return sql, params
+
+
+def _filtro_igual(coluna: str, valor, sql: str, params: list):
+    if valor:
+        sql += f" AND {coluna} = ?"
+        params.append(valor)
+    return sql, params
+
+
+def _versao_turma(conn, aluno_id: int):
+    """Versão do cache para o aluno; None se ainda não sabemos a turma dele."""
+    turma_id = _turma_do_aluno.get(aluno_id)
+    if turma_id is None:
+        return None
+    return cache_local.versao(conn, f"turma:{turma_id}")
+
+
+# =========================
+# Cabeçalho (casca da página)
+# =========================
+
+def _montar_cabecalho(cur, aluno_id: int):
+    cur.execute("""
+        SELECT a.nome AS aluno_nome, t.nome AS turma_nome, t.id AS turma_id
+        FROM alunos a
+        JOIN turmas t ON a.turma_id = t.id
+        WHERE a.id = ?
+    """, (aluno_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    turma_id = row["turma_id"]
+    totais = {}
+
+    cur.execute("""
+        SELECT p.disciplina, pr.login, COUNT(DISTINCT p.id) AS total
+        FROM planejamentos p
+        JOIN professores pr ON p.professor_id = pr.id
+        JOIN planejamentos_turmas pt ON pt.planejamento_id = p.id
+        WHERE pt.turma_id = ?
+        GROUP BY p.disciplina, pr.login
+    """, (turma_id,))
+    rows = cur.fetchall()
+    disciplinas_planejamento = sorted({r["disciplina"] for r in rows if r["disciplina"]})
+    professores_planejamento = sorted({r["login"] for r in rows if r["login"]})
+    totais["planejamentos"] = sum(r["total"] for r in rows)
+
+    cur.execute("""
+        SELECT a.disciplina, p.login, COUNT(*) AS total
+        FROM avaliacoes_bimestrais a
+        JOIN professores p ON a.professor_id = p.id
+        WHERE a.turma_id = ?
+        GROUP BY a.disciplina, p.login
+    """, (turma_id,))
+    rows = cur.fetchall()
+    disciplinas_avaliacao = sorted({r["disciplina"] for r in rows if r["disciplina"]})
+    professores_avaliacao = sorted({r["login"] for r in rows if r["login"]})
+    totais["avaliacoes"] = sum(r["total"] for r in rows)
+
+    cur.execute("""
+        SELECT professor, COUNT(*) AS total
+        FROM ocorrencias
+        WHERE aluno_id = ?
+        GROUP BY professor
+    """, (aluno_id,))
+    rows = cur.fetchall()
+    professores_ocorrencia = sorted({r["professor"] for r in rows if r["professor"]})
+    totais["ocorrencias"] = sum(r["total"] for r in rows)
+
+    cur.execute("""
+        SELECT p.login, COUNT(*) AS total
+        FROM recados_aluno ra
+        JOIN professores p ON ra.professor_id = p.id
+        WHERE ra.aluno_id = ?
+          AND IFNULL(ra.excluido_para_responsavel, 0) = 0
+        GROUP BY p.login
+    """, (aluno_id,))
+    rows = cur.fetchall()
+    professores_recado = sorted({r["login"] for r in rows if r["login"]})
+    totais["recados"] = sum(r["total"] for r in rows)
+
+    cur.execute("SELECT COUNT(*) FROM atestados WHERE aluno_id = ?", (aluno_id,))
+    totais["atestados"] = cur.fetchone()[0]
+
+    cur.execute("SELECT COUNT(*) FROM emprestimos_biblioteca WHERE aluno_id = ?", (aluno_id,))
+    totais["biblioteca"] = cur.fetchone()[0]
+
+    return {
+        "aluno_nome": row["aluno_nome"],
+        "turma_nome": row["turma_nome"],
+        "turma_id": turma_id,
+        "totais": totais,
+        "disciplinas_planejamento": disciplinas_planejamento,
+        "professores_planejamento": professores_planejamento,
+        "disciplinas_avaliacao": disciplinas_avaliacao,
+        "professores_avaliacao": professores_avaliacao,
+        "professores_ocorrencia": professores_ocorrencia,
+        "professores_recado": professores_recado,
+    }
+
+
+def carregar_cabecalho(conn, aluno_id: int):
+    """Dados da casca da página. None se o aluno não existir."""
+    chave = ("cabecalho", aluno_id)
+    ver = _versao_turma(conn, aluno_id)
+    if ver is not None:
+        cab = _cache.get(chave, ver)
+        if cab is not None:
+            return cab
+
+    cur = conn.cursor()
+    try:
+        cab = _montar_cabecalho(cur, aluno_id)
+    finally:
+        cur.close()
+    if cab is None:
+        return None
+
+    _turma_do_aluno[aluno_id] = cab["turma_id"]
+    _cache.set(chave, cache_local.versao(conn, f"turma:{cab['turma_id']}"), cab)
+    return cab
+
+
+# =========================
+# Seções (uma página por chamada)
+# =========================
+
+_SQL_ITENS_PLANEJAMENTOS = """
+    SELECT
+        planejamento_id,
+        conteudo,
+        data_inicio,
+        data_fim,
+        forma_avaliacao,
+        pontuacao_total,
+        COALESCE(concluido, 0) AS concluido
+    FROM planejamento_itens
+    WHERE planejamento_id IN ({marcadores})
+    ORDER BY planejamento_id, id
+"""
+indices.consulta_quente(
+    "itens dos planejamentos", "planejamento_itens", "planejamento_itens",
+    lambda cur: cur.execute(_SQL_ITENS_PLANEJAMENTOS.format(marcadores="?, ?"), (1, 2)),
+)
+
+
+def _planejamentos(cur, ctx, filtros, after, limite):
+    expr = "COALESCE(p.criado_em, '')"
+    sql = f"""
+        SELECT
+            p.id,
+            pr.login AS professor_login,
+            p.disciplina,
+            p.bimestre,
+            p.ano,
+            p.criado_em,
+            p.observacoes,
+            {expr} AS chave,
+            GROUP_CONCAT(DISTINCT t.nome || ' (' || t.turno || ')') AS turmas_nomes,
+            SUM(COALESCE(pi.pontuacao_total, 0)) AS total_pontos
+        FROM planejamentos p
+        JOIN professores pr ON p.professor_id = pr.id
+        LEFT JOIN planejamentos_turmas pt ON pt.planejamento_id = p.id
+        LEFT JOIN turmas t              ON t.id = pt.turma_id
+        LEFT JOIN planejamento_itens pi ON pi.planejamento_id = p.id
+        WHERE t.id = ?
+    """
+    params = [ctx["turma_id"]]
+    sql, params = _filtro_bimestre("p.bimestre", filtros.get("bim_plan"), sql, params)
+    sql, params = _filtro_igual("p.disciplina", filtros.get("disciplina_plan"), sql, params)
+    sql, params = _filtro_igual("pr.login", filtros.get("professor_plan"), sql, params)
+    sql, params = _keyset(sql, params, expr, "p.id", after)
+    sql += f"""
+        GROUP BY p.id, pr.login, p.disciplina, p.bimestre, p.ano, p.criado_em, p.observacoes
+        ORDER BY {expr} DESC, p.id DESC
+        LIMIT ?
+    """
+    params.append(limite + 1)
+    cur.execute(sql, params)
+    itens = [dict(r) for r in cur.fetchall()]
+
+    ids = [pl["id"] for pl in itens[:limite]]
+    if ids:
+        cur.execute(_SQL_ITENS_PLANEJAMENTOS.format(marcadores=",".join(["?"] * len(ids))), ids)
+        por_plan = {}
+        for it in cur.fetchall():
+            por_plan.setdefault(it["planejamento_id"], []).append(dict(it))
+        for pl in itens:
+            pl["itens"] = por_plan.get(pl["id"], [])
+    return itens
+
+
+def _avaliacoes(cur, ctx, filtros, after, limite):
+    expr = "COALESCE(a.data_avaliacao, '')"
+    sql = f"""
+        SELECT
+            a.id,
+            a.disciplina,
+            a.bimestre,
+            a.ano,
+            a.tipo_avaliacao,
+            a.descricao_avaliacao,
+            a.conteudos,
+            a.data_avaliacao,
+            a.pontuacao,
+            p.login AS professor_login,
+            {expr} AS chave
+        FROM avaliacoes_bimestrais a
+        JOIN professores p ON a.professor_id = p.id
+        WHERE a.turma_id = ?
+    """
+    params = [ctx["turma_id"]]
+    sql, params = _filtro_bimestre("a.bimestre", filtros.get("bim_av"), sql, params)
+    sql, params = _filtro_igual("a.disciplina", filtros.get("disciplina_av"), sql, params)
+    sql, params = _filtro_igual("p.login", filtros.get("professor_av"), sql, params)
+    sql, params = _keyset(sql, params, expr, "a.id", after)
+    sql += f" ORDER BY {expr} DESC, a.id DESC LIMIT ?"
+    params.append(limite + 1)
+    cur.execute(sql, params)
+
+    itens = []
+    for r in cur.fetchall():
+        d = dict(r)
+        d["data_avaliacao_formatada"] = _data_br(d.get("data_avaliacao"), vazio="Não informada")
+        itens.append(d)
+    return itens
+
+
+def _ocorrencias(cur, ctx, filtros, after, limite):
+    expr = "COALESCE(o.data, '')"
+    sql = f"""
+        SELECT
+            o.id,
+            o.data,
+            o.tipo_ocorrencia,
+            o.motivo,
+            o.total_dias,
+            o.professor,
+            o.chamar_responsavel,
+            COALESCE(o.data_reuniao, 'N/A') AS data_reuniao,
+            COALESCE(o.hora_reuniao, 'N/A') AS hora_reuniao,
+            {expr} AS chave
+        FROM ocorrencias o
+        WHERE o.aluno_id = ?
+    """
+    params = [ctx["aluno_id"]]
+    sql, params = _filtro_bimestre_mes("o.data", filtros.get("bim_oc"), sql, params)
+    sql, params = _filtro_igual("o.professor", filtros.get("professor_oc"), sql, params)
+    sql, params = _keyset(sql, params, expr, "o.id", after)
+    sql += f" ORDER BY {expr} DESC, o.id DESC LIMIT ?"
+    params.append(limite + 1)
+    cur.execute(sql, params)
+
+    itens = []
+    for r in cur.fetchall():
+        d = dict(r)
+        d["data_br"] = _data_br(d.get("data"))
+        reu = d.get("data_reuniao")
+        d["data_reuniao_br"] = _data_br(reu) if reu and reu != "N/A" else ""
+        itens.append(d)
+    return itens
+
+
+def _atestados(cur, ctx, filtros, after, limite):
+    expr = "COALESCE(a.data_atestado, '')"
+    sql = f"""
+        SELECT
+            a.id,
+            a.data_atestado,
+            a.bimestre,
+            a.tipo_atestado,
+            a.total_dias,
+            a.outro_tipo,
+            {expr} AS chave
+        FROM atestados a
+        WHERE a.aluno_id = ?
+    """
+    params = [ctx["aluno_id"]]
+    sql, params = _filtro_bimestre("a.bimestre", filtros.get("bim_atest"), sql, params)
+    sql, params = _keyset(sql, params, expr, "a.id", after)
+    sql += f" ORDER BY {expr} DESC, a.id DESC LIMIT ?"
+    params.append(limite + 1)
+    cur.execute(sql, params)
+
+    itens = []
+    for r in cur.fetchall():
+        d = dict(r)
+        d["data_atestado_br"] = _data_br(d.get("data_atestado"))
+        itens.append(d)
+    return itens
+
+
+def _recados(cur, ctx, filtros, after, limite):
+    expr = "COALESCE(ra.data_criacao, '')"
+    sql = f"""
+        SELECT
+            ra.id,
+            ra.data_criacao,
+            ra.conteudo,
+            ra.visualizado,
+            p.login AS professor_login,
+            t.nome AS turma_nome,
+            (SELECT GROUP_CONCAT(pd.disciplina, ', ')
+             FROM professor_disciplinas pd
+             WHERE pd.professor_id = p.id) AS professor_funcao,
+            {expr} AS chave
+        FROM recados_aluno ra
+        JOIN professores p ON ra.professor_id = p.id
+        JOIN turmas t ON ra.turma_id = t.id
+        WHERE ra.aluno_id = ?
+          AND IFNULL(ra.excluido_para_responsavel, 0) = 0
+    """
+    params = [ctx["aluno_id"]]
+    sql, params = _filtro_bimestre_mes("ra.data_criacao", filtros.get("bim_rec"), sql, params)
+    sql, params = _filtro_igual("p.login", filtros.get("professor_rec"), sql, params)
+    sql, params = _keyset(sql, params, expr, "ra.id", after)
+    # disciplinas do professor em subconsulta (sem GROUP BY ra.id, que fazia o SQLite
+    # varrer recados_aluno em ordem de id em vez de usar idx_recados_aluno_aluno_data)
+    sql += f" ORDER BY {expr} DESC, ra.id DESC LIMIT ?"
+    params.append(limite + 1)
+    cur.execute(sql, params)
+
+    itens = []
+    for r in cur.fetchall():
+        d = dict(r)
+        data_cr = d.get("data_criacao")
+        if data_cr:
+            try:
+                if " " in data_cr:
+                    d["data_criacao_br"] = datetime.strptime(data_cr, "%Y-%m-%d %H:%M:%S").strftime("%d/%m/%Y")
+                else:
+                    d["data_criacao_br"] = datetime.strptime(data_cr, "%Y-%m-%d").strftime("%d/%m/%Y")
+            except Exception:
+                d["data_criacao_br"] = data_cr[:10]
+        else:
+            d["data_criacao_br"] = "-"
+        if not d.get("professor_funcao"):
+            d["professor_funcao"] = "-"
+        itens.append(d)
+    return itens
+
+
+def _biblioteca(cur, ctx, filtros, after, limite):
+    expr = "COALESCE(data_emprestimo, '')"
+    sql = f"""
+        SELECT
+            id,
+            titulo_livro,
+            data_emprestimo,
+            data_prevista_devolucao,
+            data_devolucao,
+            status,
+            devolucao_pontual,
+            {expr} AS chave
+        FROM emprestimos_biblioteca
+        WHERE aluno_id = ?
+    """
+    params = [ctx["aluno_id"]]
+    sql, params = _keyset(sql, params, expr, "id", after)
+    sql += f" ORDER BY {expr} DESC, id DESC LIMIT ?"
+    params.append(limite + 1)
+    cur.execute(sql, params)
+
+    itens = []
+    for r in cur.fetchall():
+        d = dict(r)
+        d["data_emprestimo_br"] = _data_br(d.get("data_emprestimo"))
+        d["data_prevista_devolucao_br"] = _data_br(d.get("data_prevista_devolucao"))
+        d["data_devolucao_br"] = _data_br(d.get("data_devolucao"))
+        itens.append(d)
+    return itens
+
+
+# secao -> (função, filtros que ela usa)
+SECOES = {
+    "planejamentos": (_planejamentos, ("bim_plan", "disciplina_plan", "professor_plan")),
+    "avaliacoes": (_avaliacoes, ("bim_av", "disciplina_av", "professor_av")),
+    "ocorrencias": (_ocorrencias, ("bim_oc", "professor_oc")),
+    "atestados": (_atestados, ("bim_atest",)),
+    "recados": (_recados, ("bim_rec", "professor_rec")),
+    "biblioteca": (_biblioteca, ()),
+}
+
+# Para `flask --app app indices verificar`: a montagem real de cada seção (página seguinte, sem filtros)
+_CTX_EXEMPLO = {"aluno_id": 1, "turma_id": 1}
+_PAGINA_EXEMPLO = ("2026-01-01", 100)
+for _descricao, _secao, _tabela, _alvo in (
+    ("área do responsável: planejamentos da turma", "planejamentos", "planejamentos_turmas", "pt"),
+    ("área do responsável: avaliações da turma", "avaliacoes", "avaliacoes_bimestrais", "a"),
+    ("área do responsável: ocorrências do aluno", "ocorrencias", "ocorrencias", "o"),
+    ("área do responsável: recados do aluno", "recados", "recados_aluno", "ra"),
+):
+    indices.consulta_quente(
+        _descricao, _tabela, _alvo,
+        lambda cur, fn=SECOES[_secao][0]: fn(cur, _CTX_EXEMPLO, {}, _PAGINA_EXEMPLO, LIMITE_PADRAO),
+    )
+
+
+def carregar_secao(conn, aluno_id: int, secao: str, filtros: dict, after: str = "", limite: int = LIMITE_PADRAO):
+    """
+    Uma página de uma seção: {'itens': [...], 'proximo': cursor ou None}.
+    KeyError se a seção não existir; ValueError se o cursor for inválido.
+    None se o aluno não existir.
+    """
+    fn, nomes_filtros = SECOES[secao]
+    cursor = ler_cursor(after)
+    limite = max(1, min(int(limite or LIMITE_PADRAO), LIMITE_MAXIMO))
+    filtros = {k: filtros.get(k, "") for k in nomes_filtros}
+
+    cab = carregar_cabecalho(conn, aluno_id)
+    if cab is None:
+        return None
+
+    chave = ("secao", aluno_id, secao, tuple(sorted(filtros.items())), after or "", limite)
+    ver = cache_local.versao(conn, f"turma:{cab['turma_id']}")
+    pagina = _cache.get(chave, ver)
+    if pagina is not None:
+        return pagina
+
+    ctx = {"aluno_id": aluno_id, "turma_id": cab["turma_id"]}
+    cur = conn.cursor()
+    try:
+        itens = fn(cur, ctx, filtros, cursor, limite)
+    finally:
+        cur.close()
+
+    proximo = None
+    if len(itens) > limite:
+        itens = itens[:limite]
+        proximo = _cursor(itens[-1]["chave"], itens[-1]["id"])
+    for d in itens:
+        d.pop("chave", None)
+
+    pagina = {"itens": itens, "proximo": proximo}
+    _cache.set(chave, ver, pagina)
+    return pagina
@@ -0,0 +1,128 @@
+# pdf_partes.py
+# Relatórios ReportLab grandes montados em PARTES
+#
+# O doc.build() do ReportLab mantém na memória todos os flowables da story e todas as
+# páginas até o save(). Para relatórios que crescem com o histórico da escola:
+#   - RelatorioEmPartes funciona como a lista `story`, mas quando acumula MAX_FLOWABLES
+#     flowables ou MAX_LINHAS linhas de tabela grava o que tem como um PDF parcial em
+#     disco e esvazia a lista;
+#   - tabela_em_lotes() lê o cursor com fetchmany() e monta uma Table por lote;
+#   - finalizar() concatena as partes no arquivo de destino (PyPDF2).
+# Cada parte começa numa página nova, por isso só se corta quando a lista enche (ou
+# num flush() explícito do chamador): um relatório pequeno sai numa parte só.
+# Pico de memória ~ MAX_LINHAS linhas, não o relatório inteiro.
+# Use com `with`: se der erro no meio, as partes temporárias são apagadas (descartar()).
+# Sem PyPDF2 instalado, tudo vira uma parte só (comportamento antigo).
+
+import os
+import shutil
+import tempfile
+
+from reportlab.platypus import Table, TableStyle
+
+try:
+    from PyPDF2 import PdfMerger
+except ImportError:  # sem PyPDF2: monta o relatório de uma vez só
+    PdfMerger = None
+
+LOTE_LINHAS = int(os.environ.get("RFA_PDF_LOTE_LINHAS", "300"))
+MAX_FLOWABLES = 400
+MAX_LINHAS = int(os.environ.get("RFA_PDF_MAX_LINHAS", "5000"))
+
+
+class RelatorioEmPartes:
+    """
+    Substitui a lista `story`:
+        with RelatorioEmPartes(destino, novo_doc) as story:
+            story.append(...); story.flush_se_cheio(); ...; story.finalizar()
+    novo_doc(caminho) deve devolver um SimpleDocTemplate (mesmas margens/página em todas as partes).
+    """
+
+    def __init__(self, destino: str, novo_doc):
+        self.destino = destino
+        self.novo_doc = novo_doc
+        self.em_partes = PdfMerger is not None
+        self._story = []
+        self._linhas = 0
+        self._partes = []
+        self._pasta = tempfile.mkdtemp(prefix="relatorio_")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_exc, _exc, _tb):
+        if tipo_exc is not None:
+            self.descartar()
+        return False
+
+    def append(self, flowable, linhas: int = 0):
+        """`linhas`: quantas linhas de tabela o flowable carrega (conta para MAX_LINHAS)."""
+        self._story.append(flowable)
+        self._linhas += linhas
+
+    def __len__(self):
+        return len(self._story)
+
+    def flush(self):
+        """Grava o que está acumulado como uma parte (nada a fazer se estiver vazio)."""
+        if not self._story or not self.em_partes:
+            return
+        caminho = os.path.join(self._pasta, f"parte_{len(self._partes):05d}.pdf")
+        self.novo_doc(caminho).build(self._story)
+        self._partes.append(caminho)
+        self._story = []
+        self._linhas = 0
+
+    def flush_se_cheio(self):
+        if len(self._story) >= MAX_FLOWABLES or self._linhas >= MAX_LINHAS:
+            self.flush()
+
+    def descartar(self):
+        """Abandona o relatório: apaga as partes já gravadas sem gerar o destino."""
+        self._story = []
+        self._partes = []
+        shutil.rmtree(self._pasta, ignore_errors=True)
+
+    def finalizar(self):
+        """Gera o PDF final em `destino` e apaga as partes."""
+        try:
+            if not self.em_partes:
+                self.novo_doc(self.destino).build(self._story)
+                return
+            self.flush()
+            if len(self._partes) == 1:
+                shutil.move(self._partes[0], self.destino)
+                return
+            merger = PdfMerger()
+            try:
+                for caminho in self._partes:
+                    merger.append(caminho)
+                with open(self.destino, "wb") as f:
+                    merger.write(f)
+            finally:
+                merger.close()
+        finally:
+            self.descartar()
+
+
+def tabela_em_lotes(story, cursor, cabecalho: list, montar_linha, estilo: list, col_widths=None, lote: int = LOTE_LINHAS) -> int:
+    """
+    Lê o cursor (já executado) em lotes e acrescenta uma Table por lote, com o cabeçalho
+    repetido; a story só é cortada em parte quando enche (flush_se_cheio). Devolve o
+    total de linhas.
+    """
+    total = 0
+    while True:
+        rows = cursor.fetchmany(lote)
+        if not rows:
+            break
+        dados_tabela = [cabecalho]
+        for r in rows:
+            dados_tabela.append(montar_linha(r))
+        total += len(rows)
+
+        tabela = Table(dados_tabela, colWidths=col_widths, repeatRows=1)
+        tabela.setStyle(TableStyle(estilo))
+        story.append(tabela, linhas=len(rows))
+        story.flush_se_cheio()
+    return total
@@ -0,0 +1,22 @@
+# processos.py
+# Pool de PROCESSOS para trabalho pesado de CPU (leitura de PDFs, DOCX da escola inteira)
+#
+# - Nunca "fork": o worker do gunicorn já roda várias threads (requisições, agendador,
+#   fila de jobs) e o filho herdaria, travadas para sempre, as locks que alguma delas
+#   estivesse segurando (banco._lock, locks de cache/modelo, stdio, logging).
+# - "forkserver" (Linux): os filhos saem de um processo servidor limpo, sem threads;
+#   onde não existe (Windows/macOS de desenvolvimento), "spawn".
+# - A função enviada ao pool precisa ser de nível de módulo (vai por pickle): o filho
+#   importa o módulo dela do zero, sem app Flask (conectar_bd() abre conexão própria).
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def contexto():
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in metodos else "spawn")
+
+
+def pool_processos(max_workers: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=contexto())
@@ -0,0 +1,214 @@
+# recursos_pdf.py
+# Fontes e logos usados pelos PDFs/DOCX, resolvidos UMA vez por processo
+#
+# Antes, cada PDF procurava as logos no disco (glob em várias pastas), decodificava
+# logo.jpg/logo1.PNG de novo e registrava a fonte TTF a cada requisição. Aqui:
+#   - logos_lista_presenca(): par (esquerda, direita) com as regras de busca da lista de presença;
+#   - imagem(caminho) / logo(nome): ImageReader já decodificado (reaproveitado entre PDFs);
+#   - logo_flowable(nome, w, h): mesma logo como flowable do platypus (relatório geral);
+#   - fonte_sans(): Arial -> DejaVu/Liberation -> Helvetica, registrada uma vez.
+# carregar() roda na subida (app.py); recarregar() descarta tudo (ex.: trocou a logo).
+
+import glob
+import os
+import threading
+
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+
+LOGO_ESQ = "logo.jpg"
+LOGO_DIR = "logo1.PNG"
+
+FONTES_SANS = [
+    # Windows
+    os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts", "arial.ttf"),
+    # Linux comuns (PythonAnywhere costuma ter DejaVu)
+    "/usr/share/fonts/truetype/msttcorefonts/Arial.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+]
+
+_lock = threading.Lock()
+_imagens = {}  # caminho -> ImageReader (ou None se não der para abrir)
+_logos_lista = None
+_fonte_sans = None
+
+
+def _procurar_logos_lista_presenca():
+    """Tenta localizar duas logos no projeto (sem quebrar se não existir)."""
+    # ✅ Prioridade absoluta:
+    #    ESQUERDA = static/logo.jpg
+    #    DIREITA  = static/logo1.PNG
+    # Nota: em Linux (PythonAnywhere) o nome do arquivo é *case-sensitive*.
+    # Então "logo1.PNG" é diferente de "logo1.png".
+    logo_esq_prior = os.path.join(STATIC_DIR, LOGO_ESQ)
+    logo_dir_prior = os.path.join(STATIC_DIR, LOGO_DIR)
+    if os.path.isfile(logo_esq_prior) and os.path.isfile(logo_dir_prior):
+        return logo_esq_prior, logo_dir_prior
+
+    # fallback 1: aceitar variações comuns de maiúsculas/minúsculas
+    for alt_dir in ["logo1.png", "logo1.jpg", "logo1.jpeg", "logo_1.png"]:
+        p_alt = os.path.join(STATIC_DIR, alt_dir)
+        if os.path.isfile(logo_esq_prior) and os.path.isfile(p_alt):
+            return logo_esq_prior, p_alt
+    candidatos = []
+    pastas = [
+        BASE_DIR,
+        STATIC_DIR,
+        os.path.join(STATIC_DIR, "img"),
+        os.path.join(STATIC_DIR, "images"),
+        os.path.join(STATIC_DIR, "assets"),
+    ]
+    padroes = [
+        "logo_left.png", "logo_right.png",
+        "logo_esquerda.png", "logo_direita.png",
+        "logo1.png", "logo2.png",
+        "*logo*.png", "*logo*.jpg", "*logo*.jpeg",
+        "*brasao*.png", "*brasao*.jpg", "*emblema*.png",
+    ]
+    for pasta in pastas:
+        if not os.path.isdir(pasta):
+            continue
+        for pad in padroes:
+            for f in sorted(glob.glob(os.path.join(pasta, pad))):
+                if os.path.isfile(f) and f not in candidatos:
+                    candidatos.append(f)
+
+    # preferir pares explícitos left/right se existirem
+    left = None
+    right = None
+    for nome in ["logo_left.png", "logo_esquerda.png"]:
+        for pasta in pastas:
+            f = os.path.join(pasta, nome)
+            if os.path.isfile(f):
+                left = f
+                break
+        if left:
+            break
+
+    for nome in ["logo_right.png", "logo_direita.png"]:
+        for pasta in pastas:
+            f = os.path.join(pasta, nome)
+            if os.path.isfile(f):
+                right = f
+                break
+        if right:
+            break
+
+    # fallback: pegar as duas primeiras encontradas
+    if left is None and candidatos:
+        left = candidatos[0]
+    if right is None:
+        if len(candidatos) >= 2:
+            right = candidatos[1]
+        elif left is not None:
+            right = left
+
+    return left, right
+
+
+def logos_lista_presenca():
+    """(esquerda, direita) da lista de presença; caminhos ou None."""
+    global _logos_lista
+    if _logos_lista is None:
+        with _lock:
+            if _logos_lista is None:
+                _logos_lista = _procurar_logos_lista_presenca()
+    return _logos_lista
+
+
+def imagem(caminho):
+    """ImageReader decodificado de `caminho` (None se não existir / não abrir)."""
+    if not caminho:
+        return None
+    try:
+        return _imagens[caminho]
+    except KeyError:
+        pass
+
+    with _lock:
+        if caminho not in _imagens:
+            leitor = None
+            if os.path.isfile(caminho):
+                try:
+                    leitor = ImageReader(caminho)
+                    # decodifica agora: o canvas reaproveita os pixels em cache (e a máscara do PNG)
+                    leitor.getRGBData()
+                except Exception:
+                    leitor = None
+            _imagens[caminho] = leitor
+        return _imagens[caminho]
+
+
+def logo(nome):
+    """Logo fixa da pasta static (ex.: LOGO_ESQ, LOGO_DIR)."""
+    return imagem(os.path.join(STATIC_DIR, nome))
+
+
+class _LogoFlowable(Flowable):
+    def __init__(self, leitor, largura, altura):
+        super().__init__()
+        self.leitor = leitor
+        self.largura = largura
+        self.altura = altura
+
+    def wrap(self, *_args):
+        return self.largura, self.altura
+
+    def draw(self):
+        self.canv.drawImage(self.leitor, 0, 0, width=self.largura, height=self.altura, mask="auto")
+
+
+def logo_flowable(nome, largura=52, altura=52):
+    """Logo para tabelas/story do platypus; '' se a logo não existir (célula vazia)."""
+    leitor = logo(nome)
+    if leitor is None:
+        return ""
+    return _LogoFlowable(leitor, largura, altura)
+
+
+def fonte_sans() -> str:
+    """Nome da fonte sans registrada no reportlab (Arial, SansFallback ou Helvetica)."""
+    global _fonte_sans
+    if _fonte_sans is not None:
+        return _fonte_sans
+
+    with _lock:
+        if _fonte_sans is None:
+            nome_fonte = "Helvetica"
+            try:
+                from reportlab.pdfbase import pdfmetrics
+                from reportlab.pdfbase.ttfonts import TTFont
+                for p in FONTES_SANS:
+                    if p and os.path.isfile(p):
+                        nome_reg = "Arial" if os.path.basename(p).lower().startswith("arial") else "SansFallback"
+                        try:
+                            pdfmetrics.registerFont(TTFont(nome_reg, p))
+                            nome_fonte = nome_reg
+                            break
+                        except Exception:
+                            continue
+            except Exception:
+                pass
+            _fonte_sans = nome_fonte
+        return _fonte_sans
+
+
+def carregar():
+    """Resolve fontes e logos de uma vez (chamado na subida)."""
+    fonte_sans()
+    logo(LOGO_ESQ)
+    logo(LOGO_DIR)
+    for caminho in logos_lista_presenca():
+        imagem(caminho)
+
+
+def recarregar():
+    global _logos_lista
+    with _lock:
+        _imagens.clear()
+        _logos_lista = None
+    carregar()
@@ -9,6 +9,8 @@ import sqlite3
 from datetime import datetime, timedelta
 from functools import wraps
 
+import agendador
+
 bp_rotina = Blueprint('rotina', __name__)
 
 # Função auxiliar para pegar a função conectar_bd do app
@@ -356,33 +358,44 @@ def api_eventos_calendario():
 
 # ==================== ATUALIZAÇÃO AUTOMÁTICA DE STATUS ====================
 
-def atualizar_status_eventos():
+@agendador.tarefa('rotina_status_eventos', intervalo_s=900)
+def atualizar_status_eventos(conn=None):
     """
-    Função para ser chamada periodicamente
+    Tarefa do agendador (a cada 15 min)
     Atualiza o status dos eventos baseado na data atual
+    Só grava as linhas que mudaram (status ou dias de atraso)
     """
-    conn = conectar_bd()
+    fechar = conn is None
+    if fechar:
+        conn = conectar_bd()
     cursor = conn.cursor()
-    
+
     # Atualizar eventos atrasados
     cursor.execute('''
         UPDATE eventos_rotina
         SET status = 'atrasado',
-            dias_atraso = CAST(julianday('now') - julianday(data_limite) AS INTEGER),
+            dias_atraso = CAST(julianday(date('now', 'localtime')) - julianday(data_limite) AS INTEGER),
             atualizado_em = CURRENT_TIMESTAMP
-        WHERE data_limite < date('now')
+        WHERE data_limite < date('now', 'localtime')
         AND status NOT IN ('concluido', 'cancelado')
+        AND (status <> 'atrasado'
+             OR dias_atraso IS NOT CAST(julianday(date('now', 'localtime')) - julianday(data_limite) AS INTEGER))
     ''')
-    
+    atrasados = cursor.rowcount
+
     # Atualizar eventos em dia
     cursor.execute('''
         UPDATE eventos_rotina
         SET status = 'em_dia',
             dias_atraso = 0,
             atualizado_em = CURRENT_TIMESTAMP
-        WHERE data_limite >= date('now')
+        WHERE data_limite >= date('now', 'localtime')
         AND status = 'pendente'
     ''')
-    
+    em_dia = cursor.rowcount
+
     conn.commit()
-    conn.close()
+    cursor.close()
+    if fechar:
+        conn.close()
+    print(f"[ROTINA] Status dos eventos: {atrasados} atrasado(s) e {em_dia} em dia atualizados")
@@ -3,20 +3,21 @@ import os
 import sqlite3
 from io import BytesIO
 
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, send_file, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, send_file
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 
+import recursos_pdf
+from banco import conectar_bd
+from busca_alunos import SQL_ALUNOS_DA_TURMA
+
 bp_soe = Blueprint("soe", __name__, template_folder="templates")
 
 
 # =========================
 # Banco (mesmo rfa.db)
 # =========================
-def conectar_bd():
-    conn = sqlite3.connect("rfa.db", check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+# conectar_bd() vem de banco.py (conexão compartilhada da requisição)
 
 
 def ensure_soe_table():
@@ -120,20 +121,19 @@ def _require_soe_full():
 # =========================
 def _draw_header(pdf, titulo: str):
     """
-    Cabeçalho com logos na pasta static:
+    Cabeçalho com logos na pasta static (já decodificadas em recursos_pdf):
       static/logo.jpg
       static/logo1.PNG
     """
-    app = current_app
-    logo_esq = os.path.join(app.root_path, "static", "logo.jpg")
-    logo_dir = os.path.join(app.root_path, "static", "logo1.PNG")
+    logo_esq = recursos_pdf.logo(recursos_pdf.LOGO_ESQ)
+    logo_dir = recursos_pdf.logo(recursos_pdf.LOGO_DIR)
 
     y_top = 770
 
-    if os.path.exists(logo_esq):
+    if logo_esq:
         pdf.drawImage(logo_esq, 40, y_top - 45, width=55, height=55, preserveAspectRatio=True, mask="auto")
 
-    if os.path.exists(logo_dir):
+    if logo_dir:
         pdf.drawImage(logo_dir, 520, y_top - 45, width=55, height=55, preserveAspectRatio=True, mask="auto")
 
     pdf.setFont("Helvetica-Bold", 12)
@@ -201,7 +201,7 @@ def api_alunos_soe():
     try:
         conn = conectar_bd()
         cur = conn.cursor()
-        cur.execute("SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome", (turma_id,))
+        cur.execute(SQL_ALUNOS_DA_TURMA, (turma_id,))
         rows = cur.fetchall()
         cur.close()
         conn.close()
@@ -386,7 +386,7 @@ def soe_historico():
 
     alunos = []
     if turma_id:
-        cur.execute("SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome", (turma_id,))
+        cur.execute(SQL_ALUNOS_DA_TURMA, (turma_id,))
         alunos = cur.fetchall()
 
     where = []
@@ -604,7 +604,7 @@ def soe_editar(atendimento_id):
 
     alunos = []
     if at and at["turma_id"]:
-        cur.execute("SELECT id, nome FROM alunos WHERE turma_id = ? ORDER BY nome", (at["turma_id"],))
+        cur.execute(SQL_ALUNOS_DA_TURMA, (at["turma_id"],))
         alunos = cur.fetchall()
 
     cur.close()
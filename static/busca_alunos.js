@@ -0,0 +1,51 @@
+// busca_alunos.js
+// Seletor de estudantes sem a lista da escola inteira no HTML:
+//   - carregarAlunosTurma(turmaId): alunos de uma turma (GET /api/alunos/buscar?turma_id=);
+//   - ligarBuscaAlunos(input, aoEscolher): campo de busca pelo nome (sem acento) com
+//     sugestões num <datalist>; aoEscolher({id, nome, turma_id, turma, turno}).
+
+const URL_BUSCA_ALUNOS = '/api/alunos/buscar';
+
+async function carregarAlunosTurma(turmaId) {
+    if (!turmaId) return [];
+    const resp = await fetch(`${URL_BUSCA_ALUNOS}?turma_id=${encodeURIComponent(turmaId)}`);
+    return resp.ok ? resp.json() : [];
+}
+
+function rotuloAluno(a) {
+    return a.turma ? `${a.nome} — ${a.turma}${a.turno ? ' (' + a.turno + ')' : ''}` : a.nome;
+}
+
+function ligarBuscaAlunos(input, aoEscolher) {
+    const lista = document.createElement('datalist');
+    lista.id = `${input.id || 'busca'}_sugestoes`;
+    input.setAttribute('list', lista.id);
+    input.setAttribute('autocomplete', 'off');
+    input.after(lista);
+
+    let achados = [];
+    let espera = null;
+
+    input.addEventListener('input', () => {
+        const escolhido = achados.find(a => rotuloAluno(a) === input.value);
+        if (escolhido) {
+            aoEscolher(escolhido);
+            return;
+        }
+
+        clearTimeout(espera);
+        const q = input.value.trim();
+        if (q.length < 2) return;
+
+        espera = setTimeout(async () => {
+            const resp = await fetch(`${URL_BUSCA_ALUNOS}?q=${encodeURIComponent(q)}`);
+            achados = resp.ok ? await resp.json() : [];
+            lista.innerHTML = '';
+            achados.forEach(a => {
+                const opt = document.createElement('option');
+                opt.value = rotuloAluno(a);
+                lista.appendChild(opt);
+            });
+        }, 200);
+    });
+}
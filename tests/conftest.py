@@ -0,0 +1,30 @@
+# conftest.py
+# Os módulos leem RFA_DB_PATH (e as pastas derivadas dele) no import: o banco de teste
+# precisa estar definido antes do primeiro "import app". Um banco novo por sessão,
+# criado pelas próprias migrações do app.
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_TESTE = tempfile.mkdtemp(prefix="rfa_testes_")
+
+os.environ["RFA_DB_PATH"] = os.path.join(PASTA_TESTE, "rfa.db")
+os.environ["RFA_AGENDADOR"] = "0"
+os.environ["RFA_LOGS_ARQUIVO_DIR"] = os.path.join(PASTA_TESTE, "logs_arquivados")
+sys.path.insert(0, RAIZ)
+
+
+@pytest.fixture(scope="session")
+def app():
+    import app as modulo_app
+    modulo_app.app.config["TESTING"] = True
+    return modulo_app.app
+
+
+@pytest.fixture
+def cliente(app):
+    return app.test_client()
@@ -0,0 +1,45 @@
+import banco
+
+
+def _foreign_keys(conn):
+    return conn.execute("PRAGMA foreign_keys").fetchone()[0]
+
+
+def test_foreign_keys_nao_passa_de_uma_requisicao_para_outra(app):
+    with app.app_context():
+        conn = banco.conectar_bd()
+        conn.execute("PRAGMA foreign_keys = ON")
+        assert _foreign_keys(conn) == 1
+        primeira = conn
+
+    with app.app_context():
+        conn = banco.conectar_bd()
+        # a mesma conexão física voltou do pool, mas com o valor do perfil
+        assert conn is primeira
+        assert _foreign_keys(conn) == 0
+
+
+def test_foreign_keys_fora_de_requisicao():
+    conn = banco.conectar_bd()
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.close()
+
+    conn = banco.conectar_bd()
+    try:
+        assert _foreign_keys(conn) == 0
+    finally:
+        conn.close()
+
+
+def test_conexao_devolvida_sem_transacao_pendente(app):
+    with app.app_context():
+        conn = banco.conectar_bd()
+        conn.execute("CREATE TABLE IF NOT EXISTS _teste_pool (x INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO _teste_pool (x) VALUES (1)")
+        assert conn.in_transaction
+
+    with app.app_context():
+        conn = banco.conectar_bd()
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM _teste_pool").fetchone()[0] == 0
@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+import fila_jobs
+
+_liberar = threading.Event()
+
+
+@fila_jobs.tipo_job("_teste_espera")
+def _job_espera(destino, **_parametros):
+    # fica "executando" até o teste liberar: o pedido repetido cai no dedup
+    _liberar.wait(10)
+    with open(destino, "w") as f:
+        f.write("ok")
+
+
+@pytest.fixture
+def job_em_andamento():
+    _liberar.clear()
+    yield
+    _liberar.set()
+
+
+def _enfileirar_como(app, usuario, parametros):
+    with app.test_request_context():
+        from flask import session
+        session["usuario"] = usuario
+        return fila_jobs.enfileirar("_teste_espera", parametros, "teste.txt", criado_por=usuario)
+
+
+def _cliente_de(app, usuario):
+    cliente = app.test_client()
+    with cliente.session_transaction() as sess:
+        sess["usuario"] = usuario
+    return cliente
+
+
+def test_mesmo_usuario_reaproveita_o_job(app, job_em_andamento):
+    job_id, novo = _enfileirar_como(app, "mod_a", {"n": 1})
+    repetido, novo_repetido = _enfileirar_como(app, "mod_a", {"n": 1})
+
+    assert novo and not novo_repetido
+    assert repetido == job_id
+
+
+def test_usuarios_diferentes_tem_jobs_proprios(app, job_em_andamento):
+    job_a, _ = _enfileirar_como(app, "mod_a", {"n": 2})
+    job_b, novo_b = _enfileirar_como(app, "mod_b", {"n": 2})
+
+    assert novo_b
+    assert job_b != job_a
+
+    assert _cliente_de(app, "mod_a").get(f"/jobs/{job_a}").status_code == 200
+    assert _cliente_de(app, "mod_b").get(f"/jobs/{job_b}").status_code == 200
+
+
+def test_job_de_outro_usuario_nao_aparece(app, job_em_andamento):
+    job_a, _ = _enfileirar_como(app, "mod_a", {"n": 3})
+
+    resposta = _cliente_de(app, "mod_b").get(f"/jobs/{job_a}")
+    assert resposta.status_code == 404
+    assert _cliente_de(app, "mod_b").get(f"/jobs/{job_a}/download").status_code == 404
@@ -0,0 +1,63 @@
+import pytest
+
+import indices
+
+
+@pytest.fixture
+def consultas(monkeypatch):
+    """Troca o registro de consultas quentes por uma lista só do teste."""
+    lista = []
+    monkeypatch.setattr(indices, "CONSULTAS_QUENTES", lista)
+    return lista
+
+
+def _status(app):
+    with app.app_context():
+        conn = indices.banco.conectar_bd()
+        try:
+            return {descricao: status for descricao, status, _plano in indices.verificar_planos(conn)}
+        finally:
+            conn.close()
+
+
+def test_consulta_com_indice_passa(app, consultas):
+    indices.consulta_quente("jobs por chave", "jobs", "jobs",
+                            "SELECT id FROM jobs WHERE chave = ? AND status = ?", ("x", "fila"))
+    assert _status(app) == {"jobs por chave": "ok"}
+
+
+def test_tabela_inexistente_e_pulada(app, consultas):
+    indices.consulta_quente("sem tabela", "_nao_existe", "_nao_existe", "SELECT * FROM _nao_existe")
+    assert _status(app) == {"sem tabela": "pulada"}
+
+
+def test_consulta_quebrada_e_erro(app, consultas):
+    indices.consulta_quente("coluna renomeada", "jobs", "jobs", "SELECT coluna_que_nao_existe FROM jobs")
+
+    def montador_quebrado(cur, argumento_novo):
+        cur.execute("SELECT id FROM jobs")
+
+    indices.consulta_quente("montador com outra assinatura", "jobs", "jobs", montador_quebrado)
+
+    assert _status(app) == {
+        "coluna renomeada": "erro",
+        "montador com outra assinatura": "erro",
+    }
+
+
+def test_cli_verificar_sai_com_1_quando_ha_erro(app, consultas):
+    indices.consulta_quente("coluna renomeada", "jobs", "jobs", "SELECT coluna_que_nao_existe FROM jobs")
+
+    resultado = app.test_cli_runner().invoke(args=["indices", "verificar"])
+
+    assert "[ERRO] coluna renomeada" in resultado.output
+    assert resultado.exit_code == 1
+
+
+def test_cli_verificar_passa_sem_regressao(app, consultas):
+    indices.consulta_quente("jobs por chave", "jobs", "jobs",
+                            "SELECT id FROM jobs WHERE chave = ? AND status = ?", ("x", "fila"))
+
+    resultado = app.test_cli_runner().invoke(args=["indices", "verificar"])
+
+    assert resultado.exit_code == 0, resultado.output
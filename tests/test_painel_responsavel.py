@@ -0,0 +1,32 @@
+import pytest
+
+import banco
+import cache_local
+
+
+@pytest.fixture
+def conn(app):
+    with app.app_context():
+        conexao = banco.conectar_bd()
+        conexao.execute("INSERT INTO alunos (nome, turma_id) VALUES ('Aluno Teste', 901)")
+        conexao.commit()
+        aluno_id = conexao.execute("SELECT last_insert_rowid()").fetchone()[0]
+        yield conexao, aluno_id
+        conexao.execute("DELETE FROM alunos WHERE id = ?", (aluno_id,))
+        conexao.commit()
+
+
+@pytest.mark.parametrize("sql", [
+    "UPDATE alunos SET nome = 'Aluno Renomeado' WHERE id = ?",
+    "UPDATE alunos SET turma_id = 902 WHERE id = ?",
+    "DELETE FROM alunos WHERE id = ?",
+])
+def test_troca_do_cabecalho_invalida_a_turma(conn, sql):
+    conexao, aluno_id = conn
+    antes = cache_local.versao(conexao, "turma:901")
+
+    conexao.execute(sql, (aluno_id,))
+    conexao.commit()
+
+    assert cache_local.versao(conexao, "turma:901") > antes
+